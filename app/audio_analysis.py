@@ -0,0 +1,300 @@
+"""
+Análise de áudio vetorizada (NumPy) sobre o PCM dos segmentos capturados
+Landmarks espectrais para identificação local de trechos já reconhecidos
+"""
+
+import io
+import logging
+import wave
+from typing import Dict, Optional, Tuple
+
+try:
+    import numpy as np
+
+    HAS_NUMPY = True
+except ImportError:
+    np = None
+    HAS_NUMPY = False
+
+logger = logging.getLogger(__name__)
+
+# Parâmetros da STFT (a 16 kHz: janelas de 64 ms com salto de 32 ms)
+FFT_SIZE = 1024
+HOP_SIZE = 512
+MAX_FREQ_BIN = 256  # Até ~4 kHz, faixa mais robusta a codecs de baixa taxa
+
+# Parâmetros dos landmarks (pares de picos espectrais)
+PEAK_FREQ_NEIGHBORHOOD = 10  # bins de cada lado
+PEAK_TIME_NEIGHBORHOOD = 5  # frames de cada lado
+PEAKS_PER_FRAME = 3
+PAIR_WINDOW = 10  # picos seguintes considerados para cada âncora
+PAIR_MAX_DT = 40  # frames (~1,3 s)
+PAIR_MAX_DF = 64  # bins
+
+
+def decode_wav(data: bytes) -> Optional[Tuple["np.ndarray", int]]:
+    """Converte um WAV PCM 16 bits em amostras float32 mono e a taxa de amostragem"""
+    if not HAS_NUMPY:
+        return None
+    try:
+        with wave.open(io.BytesIO(data), "rb") as wav_file:
+            if wav_file.getsampwidth() != 2:
+                return None
+            channels = wav_file.getnchannels()
+            sample_rate = wav_file.getframerate()
+            frames = wav_file.readframes(wav_file.getnframes())
+    except (wave.Error, EOFError) as e:
+        logger.debug(f"Segmento não é um WAV PCM válido: {e}")
+        return None
+
+    samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    if channels > 1:
+        samples = samples[: len(samples) - len(samples) % channels]
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples, sample_rate
+
+
+def spectrogram(samples: "np.ndarray") -> "np.ndarray":
+    """Espectrograma de magnitude em dB (frames x bins)"""
+    if len(samples) < FFT_SIZE:
+        return np.zeros((0, MAX_FREQ_BIN), dtype=np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FFT_SIZE)[::HOP_SIZE]
+    window = np.hanning(FFT_SIZE).astype(np.float32)
+    magnitude = np.abs(np.fft.rfft(frames * window, axis=1))[:, 1 : MAX_FREQ_BIN + 1]
+    return (20.0 * np.log10(magnitude + 1e-6)).astype(np.float32)
+
+
+def _max_filter(values: "np.ndarray", size: int, axis: int) -> "np.ndarray":
+    """Filtro de máximo 1D (separável) ao longo de um eixo"""
+    pad = [(0, 0)] * values.ndim
+    pad[axis] = (size, size)
+    padded = np.pad(values, pad, mode="constant", constant_values=-np.inf)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * size + 1, axis=axis)
+    return windows.max(axis=-1)
+
+
+def find_peaks(spec: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+    """Picos locais do espectrograma: retorna (frames, bins) ordenados por tempo"""
+    if spec.size == 0:
+        empty = np.zeros(0, dtype=np.int32)
+        return empty, empty
+    local_max = _max_filter(
+        _max_filter(spec, PEAK_FREQ_NEIGHBORHOOD, axis=1),
+        PEAK_TIME_NEIGHBORHOOD,
+        axis=0,
+    )
+    # Ignorar picos muito abaixo da energia média do segmento
+    candidates = (spec == local_max) & (spec > np.median(spec) + 10.0)
+
+    # Limitar a densidade: manter os picos mais fortes de cada frame
+    masked = np.where(candidates, spec, -np.inf)
+    top = np.argsort(masked, axis=1)[:, -PEAKS_PER_FRAME:]
+    frame_idx = np.repeat(np.arange(spec.shape[0]), PEAKS_PER_FRAME)
+    bin_idx = top.ravel()
+    keep = np.isfinite(masked[frame_idx, bin_idx])
+    return frame_idx[keep].astype(np.int32), bin_idx[keep].astype(np.int32)
+
+
+def landmark_hashes(samples: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    Hashes de landmarks (f1, f2, dt) e o frame da âncora de cada hash
+    Hashes iguais com o mesmo deslocamento temporal indicam o mesmo trecho de áudio
+    """
+    times, freqs = find_peaks(spectrogram(samples))
+    hashes = []
+    anchors = []
+    for shift in range(1, PAIR_WINDOW + 1):
+        if shift >= len(times):
+            break
+        dt = times[shift:] - times[:-shift]
+        df = freqs[shift:] - freqs[:-shift]
+        valid = (dt > 0) & (dt <= PAIR_MAX_DT) & (np.abs(df) <= PAIR_MAX_DF)
+        f1 = freqs[:-shift][valid].astype(np.uint32)
+        f2 = freqs[shift:][valid].astype(np.uint32)
+        hashes.append((f1 << 14) | (f2 << 6) | dt[valid].astype(np.uint32))
+        anchors.append(times[:-shift][valid])
+    if not hashes:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int32)
+    return np.concatenate(hashes), np.concatenate(anchors)
+
+
+# Perfil espectral (detecção de "mesma música ainda tocando")
+PROFILE_BANDS = 24
+PROFILE_MIN_FREQ = 60.0
+CHROMA_MIN_FREQ = 100.0
+
+
+def _bin_frequencies(sample_rate: int) -> "np.ndarray":
+    """Frequência central (Hz) de cada coluna do espectrograma"""
+    return np.arange(1, MAX_FREQ_BIN + 1) * (sample_rate / FFT_SIZE)
+
+
+def spectral_profile(samples: "np.ndarray", sample_rate: int) -> Optional["np.ndarray"]:
+    """
+    Perfil compacto do timbre e da harmonia de um trecho de áudio
+    Energia média e variação por banda (escala log) + cromagrama médio (12 classes)
+    """
+    spec = spectrogram(samples)
+    if spec.shape[0] < 2:
+        return None
+    freqs = _bin_frequencies(sample_rate)
+
+    # Energia por banda em escala logarítmica de frequência
+    edges = np.geomspace(PROFILE_MIN_FREQ, freqs[-1], PROFILE_BANDS + 1)
+    band_of_bin = np.clip(np.searchsorted(edges, freqs) - 1, -1, PROFILE_BANDS - 1)
+    power = 10.0 ** (spec / 10.0)
+    bands = np.zeros((spec.shape[0], PROFILE_BANDS), dtype=np.float64)
+    valid = band_of_bin >= 0
+    np.add.at(bands.T, band_of_bin[valid], power[:, valid].T)
+    bands_db = 10.0 * np.log10(bands + 1e-10)
+
+    # Cromagrama: energia acumulada por classe de altura
+    chroma_bins = freqs >= CHROMA_MIN_FREQ
+    pitch_class = (
+        np.round(12.0 * np.log2(freqs[chroma_bins] / 440.0)).astype(np.int64) + 9
+    ) % 12
+    chroma = np.zeros(12, dtype=np.float64)
+    np.add.at(chroma, pitch_class, power[:, chroma_bins].sum(axis=0))
+    chroma /= chroma.sum() + 1e-12
+
+    return np.concatenate([bands_db.mean(axis=0), bands_db.std(axis=0), chroma]).astype(
+        np.float32
+    )
+
+
+def _correlation(a: "np.ndarray", b: "np.ndarray") -> float:
+    a = a - a.mean()
+    b = b - b.mean()
+    denominator = float(np.linalg.norm(a) * np.linalg.norm(b))
+    if denominator == 0.0:
+        return 0.0
+    return float(np.dot(a, b) / denominator)
+
+
+def profile_similarity(a: "np.ndarray", b: "np.ndarray") -> float:
+    """
+    Similaridade (-1 a 1) entre dois perfis espectrais
+    Exige concordância no timbre, na dinâmica e na harmonia (menor das três correlações)
+    """
+    bands = PROFILE_BANDS
+    return min(
+        _correlation(a[:bands], b[:bands]),
+        _correlation(a[bands : 2 * bands], b[bands : 2 * bands]),
+        _correlation(a[2 * bands :], b[2 * bands :]),
+    )
+
+
+# Ar morto: silêncio (nível muito baixo) ou tom constante (portadora / tom de teste)
+DEAD_AIR_SILENCE = "silence"
+DEAD_AIR_TONE = "tone"
+TONE_ENERGY_RATIO = 0.8  # Fração da energia do frame concentrada no pico dominante
+TONE_FRAME_RATIO = 0.9  # Fração dos frames com o mesmo pico dominante
+
+
+def signal_levels(samples: "np.ndarray") -> Tuple[float, float]:
+    """Nível RMS e de pico em dBFS"""
+    if len(samples) == 0:
+        return -120.0, -120.0
+    rms = float(np.sqrt(np.mean(np.square(samples, dtype=np.float64))))
+    peak = float(np.max(np.abs(samples)))
+    return float(20.0 * np.log10(rms + 1e-6)), float(20.0 * np.log10(peak + 1e-6))
+
+
+def detect_dead_air(
+    samples: "np.ndarray",
+    silence_rms_db: float = -50.0,
+    silence_peak_db: float = -30.0,
+) -> Optional[str]:
+    """
+    Classifica o trecho como ar morto (DEAD_AIR_SILENCE / DEAD_AIR_TONE)
+    Retorna None quando há conteúdo que pode ser reconhecido
+    """
+    rms_db, peak_db = signal_levels(samples)
+    if rms_db < silence_rms_db and peak_db < silence_peak_db:
+        return DEAD_AIR_SILENCE
+
+    spec = spectrogram(samples)
+    if spec.shape[0] < 2:
+        return None
+    power = 10.0 ** (spec / 10.0)
+    dominant = power.argmax(axis=1)
+    # Energia no pico dominante (±1 bin, espalhamento da janela) sobre o total do frame
+    rows = np.arange(power.shape[0])
+    around = sum(
+        power[rows, np.clip(dominant + offset, 0, power.shape[1] - 1)]
+        for offset in (-1, 0, 1)
+    )
+    concentrated = around / (power.sum(axis=1) + 1e-12) >= TONE_ENERGY_RATIO
+    steady = np.abs(dominant - np.median(dominant)) <= 1
+    if np.mean(concentrated & steady) >= TONE_FRAME_RATIO:
+        return DEAD_AIR_TONE
+    return None
+
+
+# Classificador fala x música (quadros de 20 ms com salto de 10 ms)
+SPEECH_FRAME_SECONDS = 0.02
+SPEECH_HOP_SECONDS = 0.01
+SPEECH_MIN_SCORE = 4  # Indicadores de fala necessários (de 4): conservador com música
+
+
+def speech_features(samples: "np.ndarray", sample_rate: int) -> Dict[str, float]:
+    """
+    Indicadores clássicos de fala:
+    - hzcrr: fração de quadros com taxa de cruzamentos por zero muito acima da média
+      (alternância entre vogais e consoantes fricativas)
+    - lster: fração de quadros com energia muito abaixo da média (pausas entre sílabas)
+    - modulation_4hz: parcela da modulação de energia entre 2 e 8 Hz (ritmo silábico)
+    - spectral_flux: mudança típica do espectro entre quadros (mediana da distância
+      cosseno); música sustenta notas, a fala muda de formante a cada fonema
+    """
+    frame = int(SPEECH_FRAME_SECONDS * sample_rate)
+    hop = int(SPEECH_HOP_SECONDS * sample_rate)
+    if len(samples) < frame * 10:
+        return {}
+    frames = np.lib.stride_tricks.sliding_window_view(samples, frame)[::hop]
+
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame
+    energy = np.mean(np.square(frames, dtype=np.float64), axis=1)
+
+    # Modulação do envelope de energia (taxa de quadros = 1 / hop)
+    envelope = np.sqrt(energy)
+    envelope = envelope - envelope.mean()
+    modulation = np.abs(np.fft.rfft(envelope * np.hanning(len(envelope)))) ** 2
+    mod_freqs = np.fft.rfftfreq(len(envelope), d=SPEECH_HOP_SECONDS)
+    audible = (mod_freqs >= 0.5) & (mod_freqs <= 20.0)
+    syllabic = (mod_freqs >= 2.0) & (mod_freqs <= 8.0)
+    modulation_total = modulation[audible].sum()
+
+    spec = 10.0 ** (spectrogram(samples) / 20.0)
+    spec /= np.linalg.norm(spec, axis=1, keepdims=True) + 1e-12
+    flux = 1.0 - np.sum(spec[1:] * spec[:-1], axis=1)
+
+    return {
+        "hzcrr": float(np.mean(zcr > 1.5 * zcr.mean())),
+        "lster": float(np.mean(energy < 0.5 * energy.mean())),
+        "modulation_4hz": (
+            float(modulation[syllabic].sum() / modulation_total)
+            if modulation_total > 0
+            else 0.0
+        ),
+        "spectral_flux": float(np.median(flux)) if len(flux) else 0.0,
+    }
+
+
+def classify_speech(
+    samples: "np.ndarray", sample_rate: int, min_score: int = SPEECH_MIN_SCORE
+) -> Tuple[bool, int]:
+    """Retorna (é fala, número de indicadores de fala presentes)"""
+    features = speech_features(samples, sample_rate)
+    if not features:
+        return False, 0
+    score = sum(
+        (
+            features["hzcrr"] > 0.15,
+            features["lster"] > 0.35,
+            features["modulation_4hz"] > 0.55,
+            features["spectral_flux"] > 0.05,
+        )
+    )
+    return score >= min_score, score
@@ -0,0 +1,156 @@
+"""
+Contabilidade do orçamento de reconhecimento por stream
+Contadores por stream e por hora (capturas, descartes, requisições ao Shazam,
+matches, 429s, envios ao failover) acumulados em memória e gravados
+periodicamente, somando, em uma tabela compacta do PostgreSQL.
+"""
+
+import collections
+import datetime as dt
+import logging
+import threading
+import time
+from typing import Dict, Any, List, Tuple
+
+from recognition import SKIP_SAME_SONG, SKIP_SILENCE, SKIP_SPEECH, SKIP_TONE
+
+logger = logging.getLogger(__name__)
+
+LEDGER_TABLE = "recognition_ledger"
+
+# Colunas de contagem (na ordem da tabela)
+LEDGER_COLUMNS = (
+    "captures",  # Capturas tentadas
+    "capture_failures",  # Capturas que falharam
+    "skipped_silence",  # Ar morto (silêncio ou tom)
+    "skipped_speech",  # Fala
+    "skipped_same_song",  # Continuação da música anterior
+    "skipped_other",  # Demais descartes (simulcast, prazo vencido)
+    "recognitions",  # Requisições enviadas ao Shazam
+    "matches",  # Músicas identificadas (Shazam ou cache local)
+    "new_plays",  # Execuções gravadas no music_log
+    "duplicates",  # Identificações não gravadas (mesma execução)
+    "rate_limited",  # Respostas 429
+    "failover_uploads",  # Segmentos enviados ao failover
+)
+
+_SKIP_COLUMNS = {
+    SKIP_SILENCE: "skipped_silence",
+    SKIP_TONE: "skipped_silence",
+    SKIP_SPEECH: "skipped_speech",
+    SKIP_SAME_SONG: "skipped_same_song",
+}
+
+
+class BudgetLedger:
+    """
+    Contadores por (stream, hora) aguardando gravação
+    `record` é chamado no loop; `flush` (bloqueante) retira o acumulado e o
+    soma às linhas da tabela, devolvendo-o à memória se a gravação falhar
+    """
+
+    def __init__(self, server_id: int, table: str = LEDGER_TABLE):
+        self.server_id = server_id
+        self.table = table
+        self._pending: Dict[Tuple[str, int], collections.Counter] = (
+            collections.defaultdict(collections.Counter)
+        )
+        self._lock = threading.Lock()  # flush roda em thread (asyncio.to_thread)
+        self._table_ready = False
+        self.totals = collections.Counter()
+        self.flushes = 0
+        self.flush_errors = 0
+        self.last_flush = None
+
+    def record(self, stream: str, column: str, count: int = 1):
+        if column not in LEDGER_COLUMNS:
+            raise ValueError(f"Contador desconhecido: {column}")
+        hour = int(time.time() // 3600 * 3600)
+        with self._lock:
+            self._pending[(stream, hour)][column] += count
+        self.totals[column] += count
+
+    def record_skip(self, stream: str, reason: str):
+        """Descarte registrado pelo SkippedSegmentCounter"""
+        self.record(stream, _SKIP_COLUMNS.get(reason, "skipped_other"))
+
+    def _take(self) -> List[Tuple[str, int, collections.Counter]]:
+        with self._lock:
+            pending, self._pending = self._pending, collections.defaultdict(
+                collections.Counter
+            )
+        return [(stream, hour, counts) for (stream, hour), counts in pending.items()]
+
+    def _restore(self, rows: List[Tuple[str, int, collections.Counter]]):
+        with self._lock:
+            for stream, hour, counts in rows:
+                self._pending[(stream, hour)].update(counts)
+
+    def _create_table(self, cursor):
+        counters = ",\n".join(
+            f"    {column} INTEGER NOT NULL DEFAULT 0" for column in LEDGER_COLUMNS
+        )
+        cursor.execute(f"""
+CREATE TABLE IF NOT EXISTS {self.table} (
+    hour TIMESTAMP WITH TIME ZONE NOT NULL,
+    stream VARCHAR(255) NOT NULL,
+    server_id INTEGER NOT NULL,
+{counters},
+    PRIMARY KEY (hour, stream, server_id)
+);
+""")
+        self._table_ready = True
+
+    def flush(self, conn) -> int:
+        """Soma o acumulado às linhas da tabela; retorna o número de linhas gravadas"""
+        rows = self._take()
+        if not rows:
+            return 0
+        columns = ", ".join(LEDGER_COLUMNS)
+        placeholders = ", ".join(["%s"] * (len(LEDGER_COLUMNS) + 3))
+        updates = ", ".join(
+            f"{column} = {self.table}.{column} + EXCLUDED.{column}"
+            for column in LEDGER_COLUMNS
+        )
+        query = (
+            f"INSERT INTO {self.table} (hour, stream, server_id, {columns}) "
+            f"VALUES ({placeholders}) "
+            f"ON CONFLICT (hour, stream, server_id) DO UPDATE SET {updates}"
+        )
+        try:
+            with conn.cursor() as cursor:
+                if not self._table_ready:
+                    self._create_table(cursor)
+                cursor.executemany(
+                    query,
+                    [
+                        (
+                            dt.datetime.fromtimestamp(hour, dt.timezone.utc),
+                            stream,
+                            self.server_id,
+                            *(counts[column] for column in LEDGER_COLUMNS),
+                        )
+                        for stream, hour, counts in rows
+                    ],
+                )
+            conn.commit()
+        except Exception:
+            self.flush_errors += 1
+            self._table_ready = False
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            self._restore(rows)
+            raise
+        self.flushes += 1
+        self.last_flush = time.time()
+        return len(rows)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "pending_rows": len(self._pending),
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "totals": dict(self.totals),
+        }
@@ -0,0 +1,134 @@
+"""
+Divisão do orçamento de reconhecimento entre os streams
+Cada stream atribuído ao servidor recebe uma fatia das requisições por minuto
+ao Shazam proporcional ao seu peso (coluna prioridade ou segmento) e, com ela,
+o intervalo mínimo entre capturas. O plano é refeito sempre que a lista de
+streams muda (inclusão, remoção ou rotação).
+"""
+
+import logging
+import time
+from typing import Callable, Dict, Any, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """Pesos por segmento no formato "Rede:3,Popular:2" (nomes sem diferenciar caixa)"""
+    weights = {}
+    for item in (spec or "").split(","):
+        name, _, value = item.rpartition(":")
+        name = name.strip().lower()
+        try:
+            weight = float(value)
+        except ValueError:
+            continue
+        if name and weight > 0:
+            weights[name] = weight
+    return weights
+
+
+class RecognitionBudgetPlanner:
+    """
+    Intervalo de captura por stream a partir do orçamento total
+
+    - peso do stream: `prioridade` (numérica, > 0) ou o peso do `segmento`;
+      sem nenhum dos dois, `default_weight`
+    - fatia = orçamento * peso / soma dos pesos; intervalo = 60 / fatia
+    - streams cuja fatia exigiria capturas mais frequentes que `min_interval`
+      ficam no mínimo e a sobra é redistribuída aos demais
+    - nenhum intervalo passa de `max_interval` (garantia de cobertura); se
+      isso exceder o orçamento, o plano é marcado como sobrecarregado
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        min_interval: float = 30.0,
+        max_interval: float = 900.0,
+        segment_weights: Optional[Dict[str, float]] = None,
+        default_weight: float = 1.0,
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.segment_weights = {
+            k.lower(): v for k, v in (segment_weights or {}).items()
+        }
+        self.default_weight = default_weight
+        self.weights: Dict[str, float] = {}
+        self.intervals: Dict[str, float] = {}
+        self.planned_at: Optional[float] = None
+        self.plans = 0
+
+    def weight(self, stream: Dict[str, Any]) -> float:
+        priority = stream.get("prioridade")
+        if priority not in (None, ""):
+            try:
+                if float(priority) > 0:
+                    return float(priority)
+            except (TypeError, ValueError):
+                pass
+        segment = str(stream.get("segmento") or "").strip().lower()
+        return self.segment_weights.get(segment, self.default_weight)
+
+    def plan(
+        self,
+        streams: Iterable[Dict[str, Any]],
+        key_fn: Callable[[Dict[str, Any]], str],
+    ) -> Dict[str, float]:
+        """Recalcula o intervalo de cada stream; retorna {chave: segundos}"""
+        weights = {key_fn(stream): self.weight(stream) for stream in streams}
+        max_rate = 60.0 / self.min_interval  # Capturas por minuto no intervalo mínimo
+        intervals = {}
+        budget = self.requests_per_minute
+        remaining = dict(weights)
+        # Preenchimento progressivo: quem atinge o mínimo libera a sobra aos demais
+        while remaining:
+            total = sum(remaining.values())
+            capped = [k for k, w in remaining.items() if budget * w / total >= max_rate]
+            if not capped:
+                break
+            for key in capped:
+                intervals[key] = self.min_interval
+                budget -= max_rate
+                del remaining[key]
+        total = sum(remaining.values())
+        for key, weight in remaining.items():
+            rate = budget * weight / total if budget > 0 else 0.0
+            interval = 60.0 / rate if rate > 0 else self.max_interval
+            intervals[key] = min(interval, self.max_interval)
+
+        self.weights = weights
+        self.intervals = intervals
+        self.planned_at = time.time()
+        self.plans += 1
+        stats = self.get_stats()
+        log = logger.warning if stats["oversubscribed"] else logger.info
+        log(
+            f"Orçamento de {self.requests_per_minute} req/min dividido entre {len(intervals)} streams: "
+            f"intervalos de {stats['min_interval']}s a {stats['max_interval']}s "
+            f"({stats['planned_per_minute']} capturas/min planejadas)"
+        )
+        return intervals
+
+    def interval(self, key: str) -> Optional[float]:
+        """Intervalo planejado para o stream (None se ele não está no plano)"""
+        return self.intervals.get(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        intervals = list(self.intervals.values())
+        planned = sum(60.0 / i for i in intervals)
+        by_weight: Dict[float, float] = {}
+        for key, weight in self.weights.items():
+            by_weight[weight] = round(self.intervals[key], 1)
+        return {
+            "streams": len(intervals),
+            "budget_per_minute": self.requests_per_minute,
+            "planned_per_minute": round(planned, 2),
+            "oversubscribed": planned > self.requests_per_minute * 1.001,
+            "min_interval": round(min(intervals), 1) if intervals else None,
+            "max_interval": round(max(intervals), 1) if intervals else None,
+            "interval_by_weight": {str(w): i for w, i in sorted(by_weight.items())},
+            "plans": self.plans,
+        }
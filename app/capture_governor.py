@@ -0,0 +1,177 @@
+"""
+Controle de concorrência das capturas ffmpeg
+Limita quantos processos de captura rodam ao mesmo tempo, espaça os
+lançamentos e reduz o limite quando a CPU ou a carga da máquina passam do
+limiar configurado (aumentando-o de volta aos poucos quando normalizam)
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+import shutil
+import sys
+import time
+from typing import Dict, Any, List
+
+try:
+    import psutil
+
+    HAS_PSUTIL = True
+except ImportError:
+    psutil = None
+    HAS_PSUTIL = False
+
+logger = logging.getLogger(__name__)
+
+
+def ffmpeg_command_prefix(nice_level: int = 0) -> List[str]:
+    """Prefixo `nice -n N` para os processos ffmpeg (vazio se indisponível)"""
+    if nice_level <= 0 or sys.platform == "win32" or not shutil.which("nice"):
+        return []
+    return ["nice", "-n", str(nice_level)]
+
+
+class CaptureGovernor:
+    """
+    Semáforo de limite variável para capturas
+
+    - `max_concurrency`: teto de capturas simultâneas
+    - `min_start_interval`: espaçamento mínimo entre lançamentos (evita rajadas)
+    - admissão: acima de `cpu_threshold` (%) ou `load_threshold` (load average
+      de 1 min por CPU) o limite cai 25%; abaixo de 80% dos limiares sobe 1
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 20,
+        min_concurrency: int = 2,
+        min_start_interval: float = 0.1,
+        cpu_threshold: float = 85.0,
+        load_threshold: float = 1.5,
+        check_interval: float = 5.0,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.min_start_interval = min_start_interval
+        self.cpu_threshold = cpu_threshold
+        self.load_threshold = load_threshold
+        self.check_interval = check_interval
+        self.limit = self.max_concurrency
+        self.active = 0
+        self._condition = asyncio.Condition()
+        self._next_start = 0.0
+        self._last_check = 0.0
+        self.cpu_percent = None
+        self.load_per_cpu = None
+        self.admitted = 0
+        self.throttle_events = 0
+        self._wait_total = 0.0
+        self.max_wait = 0.0
+
+    def _measure(self):
+        """Atualiza CPU e carga (leituras não bloqueantes)"""
+        if HAS_PSUTIL:
+            try:
+                # interval=None: uso desde a última chamada, sem bloquear o loop
+                self.cpu_percent = psutil.cpu_percent(interval=None)
+            except Exception:
+                self.cpu_percent = None
+        if hasattr(os, "getloadavg"):
+            try:
+                self.load_per_cpu = os.getloadavg()[0] / (os.cpu_count() or 1)
+            except OSError:
+                self.load_per_cpu = None
+
+    def _adjust_limit(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        self._measure()
+
+        overloaded = (
+            self.cpu_percent is not None and self.cpu_percent >= self.cpu_threshold
+        ) or (
+            self.load_per_cpu is not None and self.load_per_cpu >= self.load_threshold
+        )
+        relaxed = (
+            self.cpu_percent is None or self.cpu_percent < 0.8 * self.cpu_threshold
+        ) and (
+            self.load_per_cpu is None or self.load_per_cpu < 0.8 * self.load_threshold
+        )
+
+        previous = self.limit
+        if overloaded:
+            self.limit = max(self.min_concurrency, int(self.limit * 0.75))
+        elif relaxed:
+            self.limit = min(self.max_concurrency, self.limit + 1)
+        if self.limit < previous:
+            self.throttle_events += 1
+            logger.warning(
+                f"Carga alta (CPU {self.cpu_percent}%, load/CPU {self.load_per_cpu}); "
+                f"limite de capturas simultâneas reduzido de {previous} para {self.limit}"
+            )
+        elif self.limit > previous:
+            logger.debug(f"Limite de capturas simultâneas: {previous} -> {self.limit}")
+
+    async def acquire(self):
+        started = time.monotonic()
+        async with self._condition:
+            while True:
+                self._adjust_limit()
+                if self.active < self.limit:
+                    break
+                try:
+                    # Reavaliar o limite periodicamente mesmo sem liberações
+                    await asyncio.wait_for(
+                        self._condition.wait(), timeout=self.check_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+            self.active += 1
+            # Espaçar os lançamentos: cada captura reserva o próximo horário livre
+            now = time.monotonic()
+            start_at = max(now, self._next_start)
+            self._next_start = start_at + self.min_start_interval
+        if start_at > now:
+            try:
+                await asyncio.sleep(start_at - now)
+            except asyncio.CancelledError:
+                await self.release()
+                raise
+        waited = time.monotonic() - started
+        self.admitted += 1
+        self._wait_total += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    async def release(self):
+        async with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Reserva uma vaga de captura durante o bloco"""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            await self.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "limit": self.limit,
+            "max_concurrency": self.max_concurrency,
+            "cpu_percent": self.cpu_percent,
+            "load_per_cpu": (
+                round(self.load_per_cpu, 2) if self.load_per_cpu is not None else None
+            ),
+            "admitted": self.admitted,
+            "throttle_events": self.throttle_events,
+            "avg_wait": (
+                round(self._wait_total / self.admitted, 2) if self.admitted else 0.0
+            ),
+            "max_wait": round(self.max_wait, 2),
+        }
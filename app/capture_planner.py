@@ -0,0 +1,135 @@
+"""
+Planejamento adaptativo do intervalo de captura por stream
+Usa a proporção de músicas novas nas últimas capturas e a duração típica da
+faixa no ar para agendar a próxima amostra perto do fim previsto da música
+"""
+
+import collections
+import logging
+import time
+from typing import Dict, Any, Optional
+
+from recognition import OUTCOME_DUPLICATE, OUTCOME_NEW_SONG, OUTCOME_NO_MATCH
+
+logger = logging.getLogger(__name__)
+
+# Resultados que entram no cálculo da proporção de músicas novas
+COUNTED_OUTCOMES = (OUTCOME_NEW_SONG, OUTCOME_DUPLICATE, OUTCOME_NO_MATCH)
+
+
+class _StreamState:
+    def __init__(self, history: int):
+        self.outcomes = collections.deque(maxlen=history)
+        self.last_capture_at: Optional[float] = None
+        self.predicted_end: Optional[float] = None
+        self.last_delay: Optional[float] = None
+
+
+class CaptureIntervalPlanner:
+    """
+    Calcula o atraso até a próxima captura de cada stream
+
+    - Após uma música nova com duração conhecida, agenda a captura para logo
+      depois do fim previsto (início estimado + duração típica + margem)
+    - Caso contrário, ajusta o intervalo base pela proporção de músicas novas:
+      muitas duplicatas/sem match (mesma música, locução) alongam o intervalo,
+      muitas músicas novas o encurtam
+    """
+
+    def __init__(
+        self,
+        base_interval: float = 60.0,
+        min_interval: float = 30.0,
+        max_interval: float = 300.0,
+        target_new_ratio: float = 0.5,
+        history: int = 20,
+        end_margin: float = 20.0,
+        max_song_wait: float = 480.0,
+    ):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_new_ratio = target_new_ratio
+        self.history = history
+        self.end_margin = end_margin
+        # O fim previsto da música também respeita o intervalo máximo configurado
+        self.max_song_wait = min(max_song_wait, max_interval)
+        self.streams: Dict[str, _StreamState] = {}
+
+    def _state(self, stream_key: str) -> _StreamState:
+        state = self.streams.get(stream_key)
+        if state is None:
+            state = _StreamState(self.history)
+            self.streams[stream_key] = state
+        return state
+
+    def new_song_ratio(self, stream_key: str) -> float:
+        """Proporção suavizada (prior de 1 nova em 2) de músicas novas recentes"""
+        outcomes = self._state(stream_key).outcomes
+        new_songs = sum(1 for outcome in outcomes if outcome == OUTCOME_NEW_SONG)
+        return (new_songs + 1) / (len(outcomes) + 2)
+
+    def record_outcome(
+        self,
+        stream_key: str,
+        outcome: str,
+        captured_at: Optional[float] = None,
+        track_duration: Optional[float] = None,
+    ):
+        """
+        Registra o resultado de uma captura
+        `track_duration` (segundos) é a duração típica no ar da música nova, se conhecida
+        """
+        if outcome not in COUNTED_OUTCOMES:
+            return
+        captured_at = captured_at or time.time()
+        state = self._state(stream_key)
+        state.outcomes.append(outcome)
+
+        if outcome == OUTCOME_NEW_SONG:
+            state.predicted_end = None
+            if track_duration:
+                # A música começou entre a captura anterior e esta: estimar pelo ponto médio
+                elapsed = 0.0
+                if state.last_capture_at is not None:
+                    elapsed = min(
+                        (captured_at - state.last_capture_at) / 2, track_duration / 2
+                    )
+                state.predicted_end = captured_at - elapsed + track_duration
+        elif outcome == OUTCOME_NO_MATCH:
+            state.predicted_end = None
+        state.last_capture_at = captured_at
+
+    def next_delay(self, stream_key: str, now: Optional[float] = None) -> float:
+        """Segundos até a próxima captura do stream"""
+        now = now or time.time()
+        state = self._state(stream_key)
+
+        if (
+            state.predicted_end is not None
+            and state.predicted_end + self.end_margin > now
+        ):
+            delay = state.predicted_end + self.end_margin - now
+            delay = max(self.min_interval, min(delay, self.max_song_wait))
+            # Previsão usada uma vez; se a música ainda estiver tocando, volta ao intervalo adaptativo
+            state.predicted_end = None
+        else:
+            state.predicted_end = None
+            ratio = self.new_song_ratio(stream_key)
+            delay = self.base_interval * self.target_new_ratio / ratio
+            delay = max(self.min_interval, min(delay, self.max_interval))
+
+        state.last_delay = delay
+        return delay
+
+    def remove_stream(self, stream_key: str):
+        self.streams.pop(stream_key, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        delays = [s.last_delay for s in self.streams.values() if s.last_delay]
+        return {
+            "streams": len(self.streams),
+            "avg_delay": round(sum(delays) / len(delays), 1) if delays else None,
+            "min_delay": round(min(delays), 1) if delays else None,
+            "max_delay": round(max(delays), 1) if delays else None,
+        }
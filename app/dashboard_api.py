@@ -7,6 +7,7 @@ from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
 
 import psycopg2
+import psycopg2.errors
 import psycopg2.extras
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
@@ -64,6 +65,23 @@ DB_TABLE_NAME = os.getenv("DB_TABLE_NAME", "music_log")
 # Online/offline threshold: mantenha igual ao app
 OFFLINE_THRESHOLD_SECS = int(os.getenv("OFFLINE_THRESHOLD_SECS", "600"))
 
+# Tabela de contadores do orçamento gravada pelo app (budget_ledger.py)
+BUDGET_LEDGER_TABLE = "recognition_ledger"
+LEDGER_COUNTERS = (
+    "captures",
+    "capture_failures",
+    "skipped_silence",
+    "skipped_speech",
+    "skipped_same_song",
+    "skipped_other",
+    "recognitions",
+    "matches",
+    "new_plays",
+    "duplicates",
+    "rate_limited",
+    "failover_uploads",
+)
+
 
 def connect_db():
     try:
@@ -144,6 +162,7 @@ def _row_to_instance(row: Dict[str, Any]) -> Dict[str, Any]:
             "processing_stream_names": processing_stream_names,
             "vpn": vpn_info,
             "recent_errors": recent_errors,
+            "skipped_segments": info.get("skipped_segments", {}),
         },
     }
 
@@ -354,3 +373,47 @@ def last_errors(server_id: int) -> Dict[str, Any]:
     finally:
         if conn:
             db_pool.putconn(conn)
+
+
+@app.get("/api/ledger/cost-per-play")
+def ledger_cost_per_play(
+    hours: int = Query(24, ge=1, le=24 * 90), server_id: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Custo por execução nova de cada stream nas últimas `hours` horas:
+    requisições ao Shazam / execuções gravadas, com os demais contadores do ledger.
+    Ordenado pelos streams que mais consomem requisições.
+    """
+    sums = ", ".join(f"SUM({c})::int AS {c}" for c in LEDGER_COUNTERS)
+    query = f"""
+        SELECT stream, {sums}
+        FROM {BUDGET_LEDGER_TABLE}
+        WHERE hour >= NOW() - %s * INTERVAL '1 hour'
+    """
+    params: List[Any] = [hours]
+    if server_id is not None:
+        query += " AND server_id = %s"
+        params.append(server_id)
+    query += " GROUP BY stream ORDER BY recognitions DESC, stream ASC"
+
+    conn = None
+    try:
+        conn = db_pool.get_connection_sync()
+        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+            cur.execute(query, params)
+            rows = [dict(r) for r in cur.fetchall()]
+    except psycopg2.errors.UndefinedTable:
+        return []  # Nenhum worker gravou o ledger ainda
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn:
+            db_pool.putconn(conn)
+
+    for row in rows:
+        row["cost_per_new_play"] = (
+            round(row["recognitions"] / row["new_plays"], 2)
+            if row["new_plays"]
+            else None
+        )
+    return rows
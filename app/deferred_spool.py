@@ -0,0 +1,171 @@
+"""
+Fila de reconhecimento adiado
+Segmentos que chegam durante a pausa do Shazam (erro 429) são guardados com o
+horário da captura, em disco ou em memória comprimida, com limite de itens,
+de bytes e de idade. Um worker os reconhece depois, com a sobra do orçamento.
+"""
+
+import collections
+import logging
+import os
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Tuple
+
+from stream_capture import CapturedSegment
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _SpoolEntry:
+    stream: Dict[str, Any]
+    extension: str
+    captured_at: float
+    size: int
+    path: Optional[str] = None  # Modo disco
+    data: Optional[bytes] = None  # Modo memória (zlib)
+
+
+class DeferredRecognitionSpool:
+    """
+    FIFO limitada de segmentos aguardando reconhecimento
+    Com `directory` os segmentos ficam em arquivos; sem ele, em memória
+    comprimidos. Ao exceder `max_items` ou `max_bytes` os mais antigos são
+    descartados; itens com mais de `max_age` segundos são ignorados na retirada.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_items: int = 500,
+        max_bytes: int = 100 * 1024 * 1024,
+        max_age: float = 6 * 3600,
+    ):
+        self.directory = directory
+        self.max_items = max(1, max_items)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._entries: "collections.deque[_SpoolEntry]" = collections.deque()
+        self._lock = threading.Lock()  # add roda em threads (asyncio.to_thread)
+        self.bytes = 0
+        self.stats = {"spooled": 0, "drained": 0, "evicted": 0, "expired": 0}
+        if directory:
+            self._clear_leftovers()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _clear_leftovers(self):
+        """Arquivos de uma execução anterior não têm metadados; removê-los"""
+        if not os.path.isdir(self.directory):
+            return
+        leftovers = [name for name in os.listdir(self.directory) if "_segment." in name]
+        for name in leftovers:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+        if leftovers:
+            logger.info(
+                f"{len(leftovers)} segmentos adiados de uma execução anterior removidos de {self.directory}"
+            )
+
+    def _drop(self, entry: _SpoolEntry):
+        self.bytes -= entry.size
+        if entry.path and os.path.exists(entry.path):
+            try:
+                os.remove(entry.path)
+            except OSError as e:
+                logger.error(f"Erro ao remover segmento adiado {entry.path}: {e}")
+
+    def add(self, segment: CapturedSegment, stream: Dict[str, Any]) -> bool:
+        """
+        Guarda uma cópia do segmento (o chamador continua dono do original,
+        exceto de arquivos em disco, que são movidos para o spool)
+        Bloqueante (E/S e compressão): chamar via asyncio.to_thread
+        """
+        try:
+            if self.directory:
+                path = segment.spool(self.directory)
+                entry = _SpoolEntry(
+                    dict(stream),
+                    segment.extension,
+                    segment.captured_at,
+                    os.path.getsize(path),
+                    path=path,
+                )
+            else:
+                raw = segment.data
+                if raw is None:
+                    with open(segment.path, "rb") as f:
+                        raw = f.read()
+                data = zlib.compress(raw, 6)
+                entry = _SpoolEntry(
+                    dict(stream),
+                    segment.extension,
+                    segment.captured_at,
+                    len(data),
+                    data=data,
+                )
+        except Exception as e:
+            logger.error(f"Erro ao adiar o segmento {segment.label}: {e}")
+            return False
+
+        with self._lock:
+            self._entries.append(entry)
+            self.bytes += entry.size
+            self.stats["spooled"] += 1
+            while len(self._entries) > self.max_items or (
+                self.bytes > self.max_bytes and len(self._entries) > 1
+            ):
+                self._drop(self._entries.popleft())
+                self.stats["evicted"] += 1
+        return True
+
+    def pop(self) -> Optional[Tuple[CapturedSegment, Dict[str, Any]]]:
+        """
+        Retira o segmento mais antigo ainda dentro de `max_age`
+        Retorna (segmento com o horário original da captura, stream) ou None
+        """
+        while True:
+            with self._lock:
+                if not self._entries:
+                    return None
+                entry = self._entries.popleft()
+                if self.max_age and time.time() - entry.captured_at > self.max_age:
+                    self._drop(entry)
+                    self.stats["expired"] += 1
+                    continue
+                self.bytes -= entry.size
+                self.stats["drained"] += 1
+            name = entry.stream.get("name", "")
+            if entry.path:
+                segment = CapturedSegment(
+                    name,
+                    entry.extension,
+                    path=entry.path,
+                    captured_at=entry.captured_at,
+                )
+            else:
+                segment = CapturedSegment(
+                    name,
+                    entry.extension,
+                    data=zlib.decompress(entry.data),
+                    captured_at=entry.captured_at,
+                )
+            return segment, entry.stream
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._entries),
+            "bytes": self.bytes,
+            "oldest_age": (
+                round(time.time() - self._entries[0].captured_at)
+                if self._entries
+                else None
+            ),
+            **self.stats,
+        }
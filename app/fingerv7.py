@@ -13,6 +13,7 @@ from aiohttp import (
     ClientError,
 )
 import asyncio
+import functools
 import json
 import logging
 from logging.handlers import TimedRotatingFileHandler
@@ -45,6 +46,63 @@ import psycopg2.errors  # Para capturar UniqueViolation
 import psycopg2.extras  # Para DictCursor
 from db_pool import get_db_pool
 from async_queue import insert_queue
+from recognition import (
+    OUTCOME_DUPLICATE,
+    OUTCOME_FAILED,
+    OUTCOME_NEW_SONG,
+    OUTCOME_NO_MATCH,
+    OUTCOME_PAUSED,
+    OUTCOME_RETRY,
+    OUTCOME_SKIPPED,
+    OUTCOME_STALE,
+    RecognitionCache,
+    RecognitionJob,
+    RecognitionRetryQueue,
+    SKIP_SAME_SONG,
+    SKIP_SIMULCAST,
+    SKIP_SPEECH,
+    SKIP_STALE,
+    ShazamRateLimiter,
+    SignaturePool,
+    SkippedSegmentCounter,
+    available_cpus,
+)
+from audio_analysis import (
+    HAS_NUMPY,
+    classify_speech,
+    decode_wav,
+    landmark_hashes,
+    detect_dead_air,
+    profile_similarity,
+    spectral_profile,
+)
+from capture_governor import CaptureGovernor, ffmpeg_command_prefix
+from capture_planner import CaptureIntervalPlanner
+from budget_planner import RecognitionBudgetPlanner, parse_weights
+from stream_scheduler import StreamScheduler
+from icy_metadata import IcyMetadataManager
+from http_capture import HttpCapture, UnsupportedStreamError
+from stream_resolver import StreamResolver
+from stream_health import StreamHealthMonitor
+from simulcast import SimulcastDetector
+from deferred_spool import DeferredRecognitionSpool
+from budget_ledger import BudgetLedger
+from recognizer_client import RecognizerHttpClient
+from recognizers import (
+    MockRecognizerBackend,
+    RateLimitedError,
+    ShazamBackend,
+    load_catalog,
+)
+from stream_capture import (
+    CAPTURE_FORMATS,
+    PCM_BYTES_PER_SECOND,
+    CapturedSegment,
+    StreamReaderManager,
+    ffmpeg_output_args,
+    pcm_to_wav_bytes,
+    segment_from_output,
+)
 
 # Definir diretório de segmentos global
 SEGMENTS_DIR = os.getenv("SEGMENTS_DIR", "C:/DATARADIO/segments")
@@ -165,6 +223,178 @@ DUPLICATE_PREVENTION_WINDOW_SECONDS = int(
     os.getenv("DUPLICATE_PREVENTION_WINDOW_SECONDS", "900")
 )  # Nova janela de 15 min
 
+# Reconhecimento progressivo: amostra curta primeiro; captura completa só se não houver match
+# (requer CAPTURE_MODE=persistent: a extensão é lida do buffer em memória)
+PROGRESSIVE_RECOGNITION = (
+    os.getenv("PROGRESSIVE_RECOGNITION", "False").lower() == "true"
+)
+PROGRESSIVE_SAMPLE_SECONDS = min(
+    int(os.getenv("PROGRESSIVE_SAMPLE_SECONDS", "6")), IDENTIFICATION_DURATION
+)  # Duração da primeira amostra
+
+# Modo de captura: "spawn" (um ffmpeg por ciclo) ou "persistent" (leitor contínuo com buffer em memória)
+CAPTURE_MODE = os.getenv("CAPTURE_MODE", "spawn").lower()
+if CAPTURE_MODE not in ("spawn", "persistent"):
+    print(f"AVISO: CAPTURE_MODE inválido ({CAPTURE_MODE}). Usando 'spawn'.")
+    CAPTURE_MODE = "spawn"
+if PROGRESSIVE_RECOGNITION and CAPTURE_MODE != "persistent":
+    # No modo spawn a extensão seria uma nova conexão e uma captura completa
+    # (amostra curta + duração inteira), mais cara que capturar a duração inteira
+    print(
+        "AVISO: PROGRESSIVE_RECOGNITION requer CAPTURE_MODE=persistent. Desativando."
+    )
+    PROGRESSIVE_RECOGNITION = False
+STREAM_BUFFER_SECONDS = int(
+    os.getenv("STREAM_BUFFER_SECONDS", str(IDENTIFICATION_DURATION + 5))
+)  # Segundos de áudio mantidos em memória por stream no modo persistente
+# Manter os segmentos em memória (ffmpeg -> stdout) em vez de gravar em SEGMENTS_DIR
+CAPTURE_IN_MEMORY = os.getenv("CAPTURE_IN_MEMORY", "False").lower() == "true"
+# Formato do segmento no modo spawn: "mp3" (reencode 192k), "pcm" (s16le 16 kHz mono) ou "copy"
+CAPTURE_FORMAT = os.getenv("CAPTURE_FORMAT", "mp3").lower()
+if CAPTURE_FORMAT not in CAPTURE_FORMATS:
+    print(f"AVISO: CAPTURE_FORMAT inválido ({CAPTURE_FORMAT}). Usando 'mp3'.")
+    CAPTURE_FORMAT = "mp3"
+# Backend de captura no modo spawn: "ffmpeg" (um processo por captura) ou "http"
+# (leitura nativa de streams MP3/AAC via aiohttp; HLS e outros codecs voltam ao ffmpeg)
+CAPTURE_BACKEND = os.getenv("CAPTURE_BACKEND", "ffmpeg").lower()
+if CAPTURE_BACKEND not in ("ffmpeg", "http"):
+    print(f"AVISO: CAPTURE_BACKEND inválido ({CAPTURE_BACKEND}). Usando 'ffmpeg'.")
+    CAPTURE_BACKEND = "ffmpeg"
+HTTP_CAPTURE_MAX_CONNECTIONS = int(os.getenv("HTTP_CAPTURE_MAX_CONNECTIONS", "1000"))
+# Cache de resolução das URLs (playlists, redirecionamentos, Content-Type, DNS)
+STREAM_RESOLVER = os.getenv("STREAM_RESOLVER", "True").lower() == "true"
+STREAM_RESOLVER_TTL = int(os.getenv("STREAM_RESOLVER_TTL", "3600"))  # segundos
+# Após uma falha de resolução, usar a URL original por este período (dobra a cada falha)
+STREAM_RESOLVER_FAILURE_BACKOFF = int(
+    os.getenv("STREAM_RESOLVER_FAILURE_BACKOFF", "300")
+)
+# Passar ao ffmpeg o endereço já resolvido (streams HTTP MP3/AAC, com cabeçalho Host)
+STREAM_RESOLVER_PIN_DNS = (
+    os.getenv("STREAM_RESOLVER_PIN_DNS", "True").lower() == "true"
+)
+
+# Reconhecimento adiado: segmentos capturados durante a pausa do Shazam (429)
+# ficam em uma fila limitada e são reconhecidos depois, com o horário original
+DEFERRED_RECOGNITION = os.getenv("DEFERRED_RECOGNITION", "False").lower() == "true"
+DEFERRED_SPOOL_DIR = os.getenv("DEFERRED_SPOOL_DIR", "")  # Vazio = memória (zlib)
+DEFERRED_SPOOL_MAX_ITEMS = int(os.getenv("DEFERRED_SPOOL_MAX_ITEMS", "500"))
+DEFERRED_SPOOL_MAX_MB = int(os.getenv("DEFERRED_SPOOL_MAX_MB", "100"))
+DEFERRED_MAX_AGE_HOURS = float(os.getenv("DEFERRED_MAX_AGE_HOURS", "6"))
+
+# Contabilidade por stream e hora (capturas, descartes, requisições, matches, 429s)
+# Desativada por padrão: cria e grava a tabela recognition_ledger no banco
+BUDGET_LEDGER = os.getenv("BUDGET_LEDGER", "False").lower() == "true"
+BUDGET_LEDGER_FLUSH_INTERVAL = int(os.getenv("BUDGET_LEDGER_FLUSH_INTERVAL", "60"))
+
+# Número de workers de reconhecimento consumindo a shazam_queue em paralelo
+RECOGNITION_WORKERS = max(1, int(os.getenv("RECOGNITION_WORKERS", "2")))
+# Tempo máximo que um stream aguarda o resultado do próprio segmento
+RECOGNITION_WAIT_TIMEOUT = int(os.getenv("RECOGNITION_WAIT_TIMEOUT", "300"))
+# Tentativas por segmento em falhas transitórias (reagendadas sem bloquear o worker)
+RECOGNITION_MAX_ATTEMPTS = max(1, int(os.getenv("RECOGNITION_MAX_ATTEMPTS", "5")))
+# Idade máxima do segmento (desde a captura) para ainda ser reconhecido (0 = sem prazo)
+RECOGNITION_SEGMENT_DEADLINE = float(os.getenv("RECOGNITION_SEGMENT_DEADLINE", "120"))
+# Processos dedicados à geração de assinaturas (0 = gerar no próprio loop asyncio)
+SIGNATURE_PROCESSES = int(os.getenv("SIGNATURE_PROCESSES", str(available_cpus())))
+# Orçamento de requisições ao Shazam (compartilhado por todos os workers)
+SHAZAM_MAX_REQUESTS_PER_MINUTE = float(
+    os.getenv("SHAZAM_MAX_REQUESTS_PER_MINUTE", "15")
+)
+SHAZAM_BURST = int(os.getenv("SHAZAM_BURST", "3"))  # Requisições permitidas em rajada
+# Backend de reconhecimento: "shazam" ou "mock" (catálogo local, sem rede, para testes de carga)
+RECOGNIZER_BACKEND = os.getenv("RECOGNIZER_BACKEND", "shazam").lower()
+if RECOGNIZER_BACKEND not in ("shazam", "mock"):
+    RECOGNIZER_BACKEND = "shazam"
+RECOGNIZER_MOCK_CATALOG = os.getenv("RECOGNIZER_MOCK_CATALOG", "")  # Vazio = sintético
+RECOGNIZER_MOCK_LATENCY = float(os.getenv("RECOGNIZER_MOCK_LATENCY", "0.2"))
+RECOGNIZER_MOCK_429_RATE = float(os.getenv("RECOGNIZER_MOCK_429_RATE", "0"))
+RECOGNIZER_MOCK_NO_MATCH_RATE = float(
+    os.getenv("RECOGNIZER_MOCK_NO_MATCH_RATE", "0.2")
+)
+# Sessão HTTP compartilhada com o Shazam: conexões mantidas (keep-alive) entre requisições
+SHAZAM_HTTP_MAX_CONNECTIONS = int(os.getenv("SHAZAM_HTTP_MAX_CONNECTIONS", "10"))
+SHAZAM_KEEPALIVE_SECONDS = float(os.getenv("SHAZAM_KEEPALIVE_SECONDS", "60"))
+# Cache local de reconhecimentos por landmarks de áudio (0 = desativado; requer numpy e segmentos PCM)
+RECOGNITION_CACHE_SIZE = int(os.getenv("RECOGNITION_CACHE_SIZE", "2000"))
+RECOGNITION_CACHE_TTL_HOURS = float(os.getenv("RECOGNITION_CACHE_TTL_HOURS", "24"))
+# Pular o reconhecimento quando a captura continua a música anterior (requer numpy e segmentos PCM)
+SAME_SONG_DETECTION = os.getenv("SAME_SONG_DETECTION", "True").lower() == "true"
+SAME_SONG_SIMILARITY = float(os.getenv("SAME_SONG_SIMILARITY", "0.85"))
+# Descartar segmentos de ar morto (silêncio / tom constante) antes do reconhecimento
+DEAD_AIR_DETECTION = os.getenv("DEAD_AIR_DETECTION", "True").lower() == "true"
+DEAD_AIR_SILENCE_DB = float(
+    os.getenv("DEAD_AIR_SILENCE_DB", "-50")
+)  # Nível RMS (dBFS) abaixo do qual o segmento é silêncio
+# Descartar segmentos de fala (locução, noticiário, comerciais) e adiar a próxima captura
+SPEECH_DETECTION = os.getenv("SPEECH_DETECTION", "True").lower() == "true"
+SPEECH_DEFER_SECONDS = int(
+    os.getenv("SPEECH_DEFER_SECONDS", "60")
+)  # Atraso extra da próxima captura após detectar fala
+# Workers do agendador central que executam os ciclos de captura dos streams
+CAPTURE_WORKERS = int(os.getenv("CAPTURE_WORKERS", "50"))
+# Controle de concorrência das capturas ffmpeg
+CAPTURE_MAX_CONCURRENCY = int(os.getenv("CAPTURE_MAX_CONCURRENCY", "20"))
+CAPTURE_START_JITTER = float(
+    os.getenv("CAPTURE_START_JITTER", "30")
+)  # Espalhar a primeira captura dos streams em até N segundos
+CAPTURE_CPU_THRESHOLD = float(os.getenv("CAPTURE_CPU_THRESHOLD", "85"))
+CAPTURE_LOAD_THRESHOLD = float(
+    os.getenv("CAPTURE_LOAD_THRESHOLD", "1.5")
+)  # Load average de 1 minuto por CPU
+FFMPEG_NICE = int(os.getenv("FFMPEG_NICE", "10"))  # 0 = sem nice
+# Intervalo de captura adaptativo por stream (proporção de músicas novas + duração no ar)
+ADAPTIVE_CAPTURE = os.getenv("ADAPTIVE_CAPTURE", "True").lower() == "true"
+CAPTURE_MIN_INTERVAL = int(os.getenv("CAPTURE_MIN_INTERVAL", "30"))
+CAPTURE_MAX_INTERVAL = int(os.getenv("CAPTURE_MAX_INTERVAL", "300"))
+# Divisão do orçamento do Shazam entre os streams por peso (coluna prioridade ou segmento)
+RECOGNITION_BUDGET_PLANNER = (
+    os.getenv("RECOGNITION_BUDGET_PLANNER", "True").lower() == "true"
+)
+STREAM_SEGMENT_WEIGHTS = parse_weights(
+    os.getenv("STREAM_SEGMENT_WEIGHTS", "")
+)  # Ex.: "Rede:3,Popular:2" (demais segmentos: peso 1)
+BUDGET_MAX_INTERVAL = int(
+    os.getenv("BUDGET_MAX_INTERVAL", "900")
+)  # Cobertura mínima garantida: ao menos uma captura a cada N segundos
+AIRPLAY_HISTORY_DAYS = int(
+    os.getenv("AIRPLAY_HISTORY_DAYS", "7")
+)  # Janela do music_log usada para estimar a duração das faixas
+AIRPLAY_MIN_SAMPLES = 3  # Execuções mínimas para confiar na duração estimada
+AIRPLAY_DURATION_CACHE_TTL = 6 * 3600
+# Gatilho de captura: "timer" (a cada 60s) ou "metadata" (troca de StreamTitle ICY)
+CAPTURE_TRIGGER = os.getenv("CAPTURE_TRIGGER", "timer").lower()
+if CAPTURE_TRIGGER not in ("timer", "metadata"):
+    CAPTURE_TRIGGER = "timer"
+ICY_FALLBACK_INTERVAL = int(
+    os.getenv("ICY_FALLBACK_INTERVAL", "300")
+)  # Captura mesmo sem troca de título após N segundos
+ICY_CHANGE_DELAY = float(
+    os.getenv("ICY_CHANGE_DELAY", "5")
+)  # Espera após a troca de título antes de capturar
+# Pré-verificação dos streams e circuit breaker por stream
+STREAM_HEALTH_CHECK = os.getenv("STREAM_HEALTH_CHECK", "True").lower() == "true"
+HEALTH_PROBE_INTERVAL = int(
+    os.getenv("HEALTH_PROBE_INTERVAL", "600")
+)  # Segundos entre sondagens de todos os streams
+BREAKER_FAILURE_THRESHOLD = int(
+    os.getenv("BREAKER_FAILURE_THRESHOLD", "3")
+)  # Falhas seguidas que abrem o circuito
+BREAKER_BASE_OPEN = int(
+    os.getenv("BREAKER_BASE_OPEN", "60")
+)  # Primeira espera com o circuito aberto (dobra a cada reabertura)
+BREAKER_MAX_OPEN = int(os.getenv("BREAKER_MAX_OPEN", "3600"))
+# Simulcast: streams com o mesmo áudio são reconhecidos uma vez (pelo líder do grupo)
+SIMULCAST_DETECTION = os.getenv("SIMULCAST_DETECTION", "False").lower() == "true"
+SIMULCAST_CONFIRMATIONS = int(
+    os.getenv("SIMULCAST_CONFIRMATIONS", "3")
+)  # Coincidências seguidas de áudio para agrupar dois streams
+SIMULCAST_VERIFY_EVERY = int(
+    os.getenv("SIMULCAST_VERIFY_EVERY", "5")
+)  # Membros não líderes capturam 1 a cada N ciclos para confirmar o grupo
+SAME_SONG_MAX_SKIPS = int(
+    os.getenv("SAME_SONG_MAX_SKIPS", "3")
+)  # Reconhecer novamente após N capturas puladas seguidas
+
 # Configurações do banco de dados PostgreSQL
 DB_HOST = os.getenv("POSTGRES_HOST")  # Removido default para forçar configuração
 DB_USER = os.getenv("POSTGRES_USER")
@@ -220,27 +450,135 @@ logger.info(f"FAILOVER_PORT: {FAILOVER_PORT}")
 logger.info(f"FAILOVER_USER: {FAILOVER_USER}")
 logger.info(f"FAILOVER_REMOTE_DIR: {FAILOVER_REMOTE_DIR}")
 logger.info(f"FAILOVER_SSH_KEY_PATH: {FAILOVER_SSH_KEY_PATH}")
+logger.info(f"CAPTURE_MODE: {CAPTURE_MODE}")
+logger.info(
+    f"PROGRESSIVE_RECOGNITION: {PROGRESSIVE_RECOGNITION} (apenas com CAPTURE_MODE=persistent; amostra de {PROGRESSIVE_SAMPLE_SECONDS}s, estendida para {IDENTIFICATION_DURATION}s do buffer sem match)"
+)
+logger.info(f"STREAM_BUFFER_SECONDS: {STREAM_BUFFER_SECONDS}")
+logger.info(f"CAPTURE_IN_MEMORY: {CAPTURE_IN_MEMORY}")
+logger.info(f"CAPTURE_FORMAT: {CAPTURE_FORMAT}")
+logger.info(
+    f"CAPTURE_BACKEND: {CAPTURE_BACKEND} (máx. {HTTP_CAPTURE_MAX_CONNECTIONS} conexões HTTP)"
+)
+logger.info(
+    f"STREAM_RESOLVER: {STREAM_RESOLVER} (TTL {STREAM_RESOLVER_TTL}s, falhas em cache por {STREAM_RESOLVER_FAILURE_BACKOFF}s, fixar DNS {STREAM_RESOLVER_PIN_DNS})"
+)
+logger.info(
+    f"STREAM_HEALTH_CHECK: {STREAM_HEALTH_CHECK} (sondagem a cada {HEALTH_PROBE_INTERVAL}s, circuito abre após {BREAKER_FAILURE_THRESHOLD} falhas por {BREAKER_BASE_OPEN}s a {BREAKER_MAX_OPEN}s)"
+)
+logger.info(f"RECOGNITION_WORKERS: {RECOGNITION_WORKERS}")
+logger.info(
+    f"RECOGNITION_MAX_ATTEMPTS: {RECOGNITION_MAX_ATTEMPTS} (prazo do segmento {RECOGNITION_SEGMENT_DEADLINE or 'ilimitado'}s)"
+)
+logger.info(
+    f"DEFERRED_RECOGNITION: {DEFERRED_RECOGNITION} ({DEFERRED_SPOOL_DIR or 'memória'}, até {DEFERRED_SPOOL_MAX_ITEMS} segmentos/{DEFERRED_SPOOL_MAX_MB} MB, {DEFERRED_MAX_AGE_HOURS}h)"
+)
+logger.info(
+    f"BUDGET_LEDGER: {BUDGET_LEDGER} (gravação a cada {BUDGET_LEDGER_FLUSH_INTERVAL}s)"
+)
+logger.info(f"SIGNATURE_PROCESSES: {SIGNATURE_PROCESSES}")
+logger.info(f"SHAZAM_MAX_REQUESTS_PER_MINUTE: {SHAZAM_MAX_REQUESTS_PER_MINUTE}")
+logger.info(f"SHAZAM_BURST: {SHAZAM_BURST}")
+logger.info(
+    f"SHAZAM_HTTP_MAX_CONNECTIONS: {SHAZAM_HTTP_MAX_CONNECTIONS} (keep-alive {SHAZAM_KEEPALIVE_SECONDS}s)"
+)
+logger.info(f"RECOGNIZER_BACKEND: {RECOGNIZER_BACKEND}")
+if RECOGNIZER_BACKEND == "mock":
+    logger.warning(
+        f"Backend de reconhecimento MOCK: respostas simuladas ({RECOGNIZER_MOCK_CATALOG or 'catálogo sintético'}, "
+        f"latência {RECOGNIZER_MOCK_LATENCY}s, 429 em {RECOGNIZER_MOCK_429_RATE:.0%}, sem match em {RECOGNIZER_MOCK_NO_MATCH_RATE:.0%})"
+    )
+logger.info(f"RECOGNITION_CACHE_SIZE: {RECOGNITION_CACHE_SIZE}")
+logger.info(
+    f"DEAD_AIR_DETECTION: {DEAD_AIR_DETECTION} (silêncio < {DEAD_AIR_SILENCE_DB} dBFS)"
+)
+logger.info(
+    f"SPEECH_DETECTION: {SPEECH_DETECTION} (adiamento {SPEECH_DEFER_SECONDS}s)"
+)
+logger.info(
+    f"SIMULCAST_DETECTION: {SIMULCAST_DETECTION} ({SIMULCAST_CONFIRMATIONS} coincidências, verificação a cada {SIMULCAST_VERIFY_EVERY} ciclos)"
+)
+logger.info(f"CAPTURE_WORKERS: {CAPTURE_WORKERS}")
+logger.info(
+    f"CAPTURE_MAX_CONCURRENCY: {CAPTURE_MAX_CONCURRENCY} (CPU < {CAPTURE_CPU_THRESHOLD}%, load/CPU < {CAPTURE_LOAD_THRESHOLD}, jitter inicial {CAPTURE_START_JITTER}s, nice {FFMPEG_NICE})"
+)
+logger.info(
+    f"ADAPTIVE_CAPTURE: {ADAPTIVE_CAPTURE} ({CAPTURE_MIN_INTERVAL}s a {CAPTURE_MAX_INTERVAL}s)"
+)
+logger.info(
+    f"RECOGNITION_BUDGET_PLANNER: {RECOGNITION_BUDGET_PLANNER} (pesos {STREAM_SEGMENT_WEIGHTS or 'iguais'}, intervalo máximo {BUDGET_MAX_INTERVAL}s)"
+)
+logger.info(
+    f"CAPTURE_TRIGGER: {CAPTURE_TRIGGER} (fallback {ICY_FALLBACK_INTERVAL}s, atraso {ICY_CHANGE_DELAY}s)"
+)
+logger.info(
+    f"SAME_SONG_DETECTION: {SAME_SONG_DETECTION} (similaridade >= {SAME_SONG_SIMILARITY}, máx. {SAME_SONG_MAX_SKIPS} seguidas)"
+)
+if (
+    RECOGNITION_CACHE_SIZE > 0
+    or SIMULCAST_DETECTION
+    or SAME_SONG_DETECTION
+    or DEAD_AIR_DETECTION
+    or SPEECH_DETECTION
+) and not HAS_NUMPY:
+    logger.warning(
+        "Pacote 'numpy' não encontrado. Cache local e análise de áudio (mesma música, ar morto, fala) ficarão desativados."
+    )
+# A análise de áudio recebe PCM apenas no modo persistente ou com CAPTURE_FORMAT=pcm
+pcm_analysis_features = [
+    name
+    for name, enabled in (
+        ("DEAD_AIR_DETECTION", DEAD_AIR_DETECTION),
+        ("SPEECH_DETECTION", SPEECH_DETECTION),
+        ("SAME_SONG_DETECTION", SAME_SONG_DETECTION),
+    )
+    if enabled
+]
+if (
+    HAS_NUMPY
+    and pcm_analysis_features
+    and CAPTURE_MODE != "persistent"
+    and CAPTURE_FORMATS[CAPTURE_FORMAT]["extension"] != "wav"
+):
+    logger.warning(
+        f"{', '.join(pcm_analysis_features)} sem efeito: a análise de áudio requer segmentos PCM "
+        f"(CAPTURE_MODE=persistent ou CAPTURE_FORMAT=pcm); com CAPTURE_FORMAT={CAPTURE_FORMAT} "
+        "os segmentos não são analisados."
+    )
+if CAPTURE_FORMAT == "copy":
+    logger.warning(
+        "CAPTURE_FORMAT=copy mantém o codec original do stream; o reconhecimento depende "
+        "do decodificador do Shazam suportar esse codec (indicado para segmentos enviados ao failover)."
+    )
+if CAPTURE_BACKEND == "http" and CAPTURE_MODE == "spawn":
+    logger.info(
+        "CAPTURE_BACKEND=http: segmentos MP3/AAC mantêm o codec original (CAPTURE_FORMAT "
+        "vale apenas para streams capturados pelo ffmpeg) e não passam pela análise de áudio."
+    )
 logger.info("======================================================")
 
 
 # --- Função para Envio de Arquivo via Failover (FTP/SFTP) ---
 async def send_file_via_failover(local_file_path, stream_index):
-    """Envia um arquivo para o servidor de failover configurado (FTP ou SFTP)."""
+    """
+    Envia um arquivo para o servidor de failover configurado (FTP ou SFTP).
+    Retorna True se o arquivo foi enviado.
+    """
     if not ENABLE_FAILOVER_SEND:
         logger.debug("Envio para failover desabilitado nas configurações.")
-        return
+        return False
 
     if not all([FAILOVER_HOST, FAILOVER_USER, FAILOVER_PASSWORD, FAILOVER_REMOTE_DIR]):
         logger.error(
             "Configurações de failover incompletas no .env. Impossível enviar arquivo."
         )
-        return
+        return False
 
     if stream_index is None:
         logger.error(
             "Índice do stream não fornecido. Não é possível nomear o arquivo de failover."
         )
-        return
+        return False
 
     # Criar um nome de arquivo único no servidor remoto
     timestamp_str = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -261,7 +599,7 @@ async def send_file_via_failover(local_file_path, stream_index):
                 logger.error(
                     "SFTP selecionado, mas a biblioteca pysftp não está instalada."
                 )
-                return
+                return False
 
             cnopts = pysftpCnOpts()
             # Ignorar verificação da chave do host (menos seguro, mas evita problemas de configuração inicial)
@@ -298,12 +636,67 @@ async def send_file_via_failover(local_file_path, stream_index):
             logger.error(
                 f"Método de failover desconhecido: {FAILOVER_METHOD}. Use 'FTP' ou 'SFTP'."
             )
+            return False
 
     except Exception as e:
         logger.error(
             f"Erro ao enviar arquivo via {FAILOVER_METHOD} para {FAILOVER_HOST}: {e}",
             exc_info=True,
         )
+        return False
+    return True
+
+
+def record_ledger(stream_name, column):
+    """Contabiliza um evento do stream no ledger do orçamento (se ativo)"""
+    if budget_ledger is not None:
+        budget_ledger.record(stream_name, column)
+
+
+# Segmento não reconhecido pela pausa do Shazam: adiar ou enviar ao failover
+async def handle_paused_segment(segment, stream):
+    if deferred_spool is not None and await asyncio.to_thread(
+        deferred_spool.add, segment, stream
+    ):
+        logger.info(
+            f"Segmento {segment.label} adiado para depois da pausa ({len(deferred_spool)} na fila)."
+        )
+        return
+    if ENABLE_FAILOVER_SEND:
+        await send_segment_via_failover(
+            segment, stream.get("index"), stream_name=stream["name"]
+        )
+
+
+# Envia um segmento capturado para o failover, gravando-o em disco apenas neste momento
+async def send_segment_via_failover(segment, stream_index, stream_name=None):
+    """Grava o segmento em um arquivo único e agenda o envio em segundo plano."""
+    if not ENABLE_FAILOVER_SEND:
+        logger.debug("Envio para failover desabilitado nas configurações.")
+        return
+
+    try:
+        spool_path = await asyncio.to_thread(segment.spool, SEGMENTS_DIR)
+    except Exception as e:
+        logger.error(f"Erro ao preparar segmento {segment.label} para failover: {e}")
+        return
+
+    asyncio.create_task(_upload_spooled_segment(spool_path, stream_index, stream_name))
+
+
+async def _upload_spooled_segment(spool_path, stream_index, stream_name=None):
+    try:
+        if await send_file_via_failover(spool_path, stream_index) and stream_name:
+            record_ledger(stream_name, "failover_uploads")
+    finally:
+        if os.path.exists(spool_path):
+            try:
+                await asyncio.to_thread(os.remove, spool_path)
+                logger.debug(f"Arquivo de failover {spool_path} removido.")
+            except Exception as e_remove:
+                logger.error(
+                    f"Erro ao remover arquivo de failover {spool_path}: {e_remove}"
+                )
 
 
 # Função auxiliar bloqueante para SFTP (para ser usada com asyncio.to_thread)
@@ -602,19 +995,59 @@ shazam_pause_until_timestamp = 0.0
 class StreamConnectionTracker:
     def __init__(self):
         self.connection_errors = {}  # Stores stream_name: error_timestamp
+        self.error_counts = {}  # Stores stream_name: consecutive error count
+        self.dead_air = {}  # Stores stream_name: (kind, first_detection_timestamp)
 
     def record_error(self, stream_name):
         """Records the timestamp of the first consecutive error for a stream."""
+        self.error_counts[stream_name] = self.error_counts.get(stream_name, 0) + 1
         if stream_name not in self.connection_errors:
             self.connection_errors[stream_name] = time.time()
             logger.debug(f"Registrado primeiro erro de conexão para: {stream_name}")
 
     def clear_error(self, stream_name):
         """Clears the error status for a stream if it was previously recorded."""
+        self.error_counts.pop(stream_name, None)
         if stream_name in self.connection_errors:
             del self.connection_errors[stream_name]
             logger.debug(f"Erro de conexão limpo para: {stream_name}")
 
+    def get_error_count(self, stream_name):
+        """Returns the number of consecutive errors recorded for a stream."""
+        return self.error_counts.get(stream_name, 0)
+
+    def record_dead_air(self, stream_name, kind):
+        """Marks a stream as connected but airing silence or a constant tone."""
+        previous = self.dead_air.get(stream_name)
+        if previous is None or previous[0] != kind:
+            self.dead_air[stream_name] = (kind, time.time())
+            logger.debug(f"Ar morto ({kind}) registrado para: {stream_name}")
+
+    def clear_dead_air(self, stream_name):
+        """Clears the dead air state once a stream carries real audio again."""
+        if self.dead_air.pop(stream_name, None) is not None:
+            logger.info(f"Stream {stream_name} voltou a transmitir áudio")
+
+    def is_dead_air(self, stream_name):
+        return stream_name in self.dead_air
+
+    def get_dead_air_streams(self):
+        """Returns {stream_name: {"kind": ..., "seconds": ...}} for streams in dead air."""
+        now = time.time()
+        return {
+            stream_name: {"kind": kind, "seconds": int(now - since)}
+            for stream_name, (kind, since) in self.dead_air.items()
+        }
+
+    def check_persistent_dead_air(self, threshold_minutes=10):
+        """Checks for streams airing dead air for longer than the threshold."""
+        threshold_seconds = threshold_minutes * 60
+        return [
+            stream_name
+            for stream_name, state in self.get_dead_air_streams().items()
+            if state["seconds"] > threshold_seconds
+        ]
+
     def check_persistent_errors(self, threshold_minutes=10):
         """Checks for streams that have been failing for longer than the threshold."""
         current_time = time.time()
@@ -636,6 +1069,115 @@ class StreamConnectionTracker:
 
 connection_tracker = StreamConnectionTracker()  # Instanciar o tracker (RESTAURADO)
 
+# Leitores persistentes por stream (usados apenas quando CAPTURE_MODE=persistent)
+stream_readers = StreamReaderManager(buffer_seconds=STREAM_BUFFER_SECONDS)
+
+# Intervalo adaptativo entre capturas de cada stream
+capture_planner = CaptureIntervalPlanner(
+    base_interval=60,
+    min_interval=CAPTURE_MIN_INTERVAL,
+    max_interval=CAPTURE_MAX_INTERVAL,
+)
+# Intervalo mínimo por stream segundo a fatia do orçamento do Shazam (None = desativado)
+budget_planner = (
+    RecognitionBudgetPlanner(
+        SHAZAM_MAX_REQUESTS_PER_MINUTE,
+        min_interval=CAPTURE_MIN_INTERVAL,
+        max_interval=BUDGET_MAX_INTERVAL,
+        segment_weights=STREAM_SEGMENT_WEIGHTS,
+    )
+    if RECOGNITION_BUDGET_PLANNER
+    else None
+)
+# Duração típica no ar por stream: nome -> ({(title, artist): segundos}, consultado em)
+airplay_duration_cache = {}
+
+# Reconhecimento progressivo: amostras curtas enviadas e quantas precisaram ser estendidas
+progressive_stats = {"short_samples": 0, "short_matches": 0, "extended": 0}
+
+# Contadores do orçamento por stream e hora (None = desativado)
+budget_ledger = BudgetLedger(SERVER_ID) if BUDGET_LEDGER else None
+
+# Segmentos descartados antes do reconhecimento (por stream e motivo)
+skipped_segments = SkippedSegmentCounter(
+    on_record=budget_ledger.record_skip if budget_ledger is not None else None
+)
+
+# Limite de capturas ffmpeg simultâneas (ajustado pela carga da máquina)
+capture_governor = CaptureGovernor(
+    max_concurrency=CAPTURE_MAX_CONCURRENCY,
+    cpu_threshold=CAPTURE_CPU_THRESHOLD,
+    load_threshold=CAPTURE_LOAD_THRESHOLD,
+)
+
+# Captura HTTP nativa (usada com CAPTURE_BACKEND=http)
+http_capture = HttpCapture(max_connections=HTTP_CAPTURE_MAX_CONNECTIONS)
+
+# Cache de resolução das URLs dos streams (usado com STREAM_RESOLVER=True)
+stream_resolver = StreamResolver(
+    ttl=STREAM_RESOLVER_TTL, failure_backoff=STREAM_RESOLVER_FAILURE_BACKOFF
+)
+
+# Pré-verificação e circuit breakers dos streams (usados com STREAM_HEALTH_CHECK=True)
+stream_health = StreamHealthMonitor(
+    failure_threshold=BREAKER_FAILURE_THRESHOLD,
+    base_open=BREAKER_BASE_OPEN,
+    max_open=BREAKER_MAX_OPEN,
+)
+
+# Agendador central de capturas (criado em main())
+stream_scheduler = None
+
+# Backend usado pelos workers de reconhecimento (criado em main())
+recognizer_backend = None
+
+# Monitores de metadados ICY (usados com CAPTURE_TRIGGER=metadata)
+icy_watchers = IcyMetadataManager()
+
+# Rate limiter único (token bucket), compartilhado por todos os workers de reconhecimento
+shazam_rate_limiter = ShazamRateLimiter(
+    max_requests_per_minute=SHAZAM_MAX_REQUESTS_PER_MINUTE,
+    burst=SHAZAM_BURST,
+    pause_duration=120,
+)
+
+# Cliente HTTP de longa duração usado pelo Shazam em todos os workers
+recognizer_http_client = RecognizerHttpClient(
+    max_connections=SHAZAM_HTTP_MAX_CONNECTIONS,
+    keepalive_timeout=SHAZAM_KEEPALIVE_SECONDS,
+)
+
+# Cache local de reconhecimentos (None = desativado)
+recognition_cache = (
+    RecognitionCache(
+        max_entries=RECOGNITION_CACHE_SIZE,
+        ttl_seconds=int(RECOGNITION_CACHE_TTL_HOURS * 3600),
+    )
+    if RECOGNITION_CACHE_SIZE > 0 and HAS_NUMPY
+    else None
+)
+
+# Retentativas de reconhecimento aguardando o backoff fora dos workers
+recognition_retry_queue = RecognitionRetryQueue(max_attempts=RECOGNITION_MAX_ATTEMPTS)
+
+# Grupos de streams em simulcast (usados com SIMULCAST_DETECTION=True)
+simulcast_detector = SimulcastDetector(confirmations=SIMULCAST_CONFIRMATIONS)
+
+# Segmentos aguardando o fim da pausa do Shazam (None = desativado)
+deferred_spool = (
+    DeferredRecognitionSpool(
+        directory=DEFERRED_SPOOL_DIR or None,
+        max_items=DEFERRED_SPOOL_MAX_ITEMS,
+        max_bytes=DEFERRED_SPOOL_MAX_MB * 1024 * 1024,
+        max_age=DEFERRED_MAX_AGE_HOURS * 3600,
+    )
+    if DEFERRED_RECOGNITION
+    else None
+)
+
+# Pool de processos para geração de assinaturas (None = geração no loop principal)
+signature_pool = SignaturePool(SIGNATURE_PROCESSES) if SIGNATURE_PROCESSES > 0 else None
+
 
 # Função para conectar ao banco de dados PostgreSQL usando pool
 def connect_db():
@@ -737,9 +1279,17 @@ def fetch_streams_from_db():
                     logger.error("A tabela 'streams' não existe no banco de dados!")
                     return None
 
+                # Coluna opcional com o peso do stream na divisão do orçamento do Shazam
+                cursor.execute(
+                    "SELECT EXISTS (SELECT FROM information_schema.columns WHERE table_name = 'streams' AND column_name = 'prioridade')"
+                )
+                has_priority = cursor.fetchone()[0]
+
                 # Buscar todos os streams ordenados por index
                 cursor.execute(
-                    "SELECT url, name, sheet, cidade, estado, regiao, segmento, index FROM streams ORDER BY index"
+                    "SELECT url, name, sheet, cidade, estado, regiao, segmento, index"
+                    + (", prioridade" if has_priority else "")
+                    + " FROM streams ORDER BY index"
                 )
                 rows = cursor.fetchall()
 
@@ -757,6 +1307,8 @@ def fetch_streams_from_db():
                         "id": str(row[7]),  # Adicionar campo 'id' baseado no index
                         "metadata": {},  # Adicionar campo metadata vazio
                     }
+                    if has_priority and row[8] is not None:
+                        stream["prioridade"] = float(row[8])
                     streams.append(stream)
 
                 logger.info(f"Carregados {len(streams)} streams do banco de dados.")
@@ -1018,31 +1570,60 @@ async def capture_stream_segment(name, url, duration=None, processed_by_server=T
     if duration is None:
         duration = IDENTIFICATION_DURATION
 
-    output_dir = SEGMENTS_DIR
-    os.makedirs(output_dir, exist_ok=True)
-    output_path = os.path.join(
-        output_dir, f"{name}_segment.mp3"
-    )  # Sempre o mesmo arquivo
+    record_ledger(name, "captures")
+    if CAPTURE_MODE == "persistent":
+        segment = await capture_from_reader(name, url, duration)
+    else:
+        # Playlist, redirecionamentos e DNS resolvidos uma vez e reaproveitados até o TTL
+        resolved = await stream_resolver.resolve(url) if STREAM_RESOLVER else None
+        segment = await _capture_segment(name, url, duration, resolved)
+        if segment is None and resolved is not None:
+            stream_resolver.invalidate(url)  # Resolver de novo na próxima captura
+    if segment is None:
+        record_ledger(name, "capture_failures")
+    return segment
+
+
+# Captura efetiva (HTTP nativo ou ffmpeg) a partir da URL já resolvida
+async def _capture_segment(name, url, duration, resolved=None):
+    media_url = resolved.media_url if resolved is not None else url
+    if CAPTURE_BACKEND == "http" and http_capture.is_supported(media_url):
+        try:
+            return await capture_via_http(name, media_url, duration)
+        except UnsupportedStreamError as e:
+            logger.info(
+                f"Stream {name} sem suporte à captura HTTP nativa ({e}); usando ffmpeg."
+            )
+
+    if CAPTURE_IN_MEMORY:
+        # ffmpeg escreve no stdout; nenhum arquivo é criado
+        output_path = None
+    else:
+        output_dir = SEGMENTS_DIR
+        os.makedirs(output_dir, exist_ok=True)
+        # Nome único para que uma nova captura não sobrescreva um segmento ainda na fila
+        extension = CAPTURE_FORMATS[CAPTURE_FORMAT]["extension"]
+        output_path = os.path.join(
+            output_dir, f"{name}_{uuid.uuid4().hex[:8]}_segment.{extension}"
+        )
     try:
         logger.debug(f"URL do stream: {url}")
         # Remover a verificação prévia da URL com requests
         # Remover o parâmetro -headers
         command = [
+            *ffmpeg_command_prefix(FFMPEG_NICE),
             "ffmpeg",
             "-y",
-            "-i",
-            url,
+            "-threads",
+            "1",
+            *(
+                resolved.ffmpeg_input(STREAM_RESOLVER_PIN_DNS)
+                if resolved is not None
+                else ["-i", url]
+            ),
             "-t",
             str(duration),
-            "-ac",
-            "1",
-            "-ar",
-            "44100",
-            "-b:a",
-            "192k",
-            "-acodec",
-            "libmp3lame",
-            output_path,
+            *ffmpeg_output_args(CAPTURE_FORMAT, output_path),
         ]
         logger.info(f"Capturando segmento de {duration} segundos do stream {name}...")
         logger.debug(f"Comando FFmpeg: {' '.join(command)}")
@@ -1050,12 +1631,20 @@ async def capture_stream_segment(name, url, duration=None, processed_by_server=T
         # Usar o timeout aumentado
         capture_timeout = duration + 30  # 30 segundos a mais do que a duração desejada
 
-        process = await asyncio.create_subprocess_exec(
-            *command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-        )
-        stdout, stderr = await asyncio.wait_for(
-            process.communicate(), timeout=capture_timeout
-        )
+        # Aguardar uma vaga no controle de concorrência antes de lançar o ffmpeg
+        async with capture_governor.slot():
+            process = await asyncio.create_subprocess_exec(
+                *command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(
+                    process.communicate(), timeout=capture_timeout
+                )
+            finally:
+                # Timeout, erro ou cancelamento: encerrar o ffmpeg antes de liberar a vaga
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
 
         if process.returncode != 0:
             stderr_text = (
@@ -1063,21 +1652,24 @@ async def capture_stream_segment(name, url, duration=None, processed_by_server=T
             )
             logger.error(f"Erro ao capturar o stream {url}: {stderr_text}")
             connection_tracker.record_error(name)  # Registra o erro
+            await asyncio.to_thread(remove_partial_output, output_path)
             return None
         else:
-            # Verificar se o arquivo foi criado e tem um tamanho razoável
-            if (
-                os.path.exists(output_path) and os.path.getsize(output_path) > 1000
-            ):  # Mais de 1KB
+            segment = segment_from_output(
+                name, CAPTURE_FORMAT, stdout=stdout, output_path=output_path
+            )
+            # Verificar se o segmento tem um tamanho razoável
+            if segment.size > 1000:  # Mais de 1KB
                 logger.info(
                     f"Segmento de {duration} segundos capturado com sucesso para {name}."
                 )
                 connection_tracker.clear_error(
                     name
                 )  # Limpa o erro se a captura for bem-sucedida
-                return output_path
+                return segment
             else:
                 logger.error(f"Arquivo de saída vazio ou muito pequeno para {name}.")
+                segment.discard()
                 connection_tracker.record_error(name)
                 return None
     except asyncio.TimeoutError:
@@ -1085,8 +1677,7 @@ async def capture_stream_segment(name, url, duration=None, processed_by_server=T
             f"Tempo esgotado para capturar o stream {url} após {capture_timeout}s"
         )
         connection_tracker.record_error(name)  # Registra o erro
-        if "process" in locals():
-            process.kill()
+        await asyncio.to_thread(remove_partial_output, output_path)
         return None
     except Exception as e:
         logger.error(f"Erro ao capturar o stream {url}: {str(e)}")
@@ -1095,8 +1686,87 @@ async def capture_stream_segment(name, url, duration=None, processed_by_server=T
 
         logger.error(f"Traceback: {traceback.format_exc()}")
         connection_tracker.record_error(name)  # Registra o erro
+        await asyncio.to_thread(remove_partial_output, output_path)
+        return None
+
+
+def remove_partial_output(output_path):
+    """Remove o arquivo deixado por uma captura que falhou (se houver)"""
+    if output_path and os.path.exists(output_path):
+        try:
+            os.remove(output_path)
+        except OSError as e:
+            logger.error(f"Erro ao remover arquivo parcial {output_path}: {e}")
+
+
+# Função para capturar um segmento lendo o stream MP3/AAC direto do socket (sem ffmpeg)
+async def capture_via_http(name, url, duration):
+    logger.info(
+        f"Capturando segmento de {duration} segundos do stream {name} (HTTP nativo)..."
+    )
+    try:
+        data, codec, seconds = await asyncio.wait_for(
+            http_capture.capture(url, duration), timeout=duration + 30
+        )
+    except UnsupportedStreamError:
+        raise
+    except asyncio.TimeoutError:
+        logger.error(f"Tempo esgotado para capturar o stream {url} após {duration + 30}s")
+        connection_tracker.record_error(name)
+        return None
+    except Exception as e:
+        logger.error(f"Erro ao capturar o stream {url}: {type(e).__name__}: {e}")
+        connection_tracker.record_error(name)
         return None
 
+    segment = CapturedSegment(name, codec, data=data)
+    if not CAPTURE_IN_MEMORY:
+        try:
+            output_path = await asyncio.to_thread(segment.spool, SEGMENTS_DIR)
+            segment = CapturedSegment(name, codec, path=output_path)
+        except Exception as e:
+            logger.error(f"Erro ao gravar segmento HTTP de {name}: {e}")
+            connection_tracker.record_error(name)
+            return None
+
+    logger.info(
+        f"Segmento de {seconds:.1f} segundos ({codec}, {len(data)} bytes) capturado com sucesso para {name}."
+    )
+    connection_tracker.clear_error(name)
+    return segment
+
+
+# Função para obter um segmento a partir do leitor persistente do stream
+async def capture_from_reader(name, url, duration):
+    reader = stream_readers.get_reader(name, url)
+    # Na primeira captura o leitor pode estar conectando; aguardar o buffer encher
+    pcm = await reader.snapshot(duration, timeout=duration + 30)
+    if not pcm:
+        logger.error(
+            f"Leitor persistente de {name} sem áudio suficiente "
+            f"({reader.buffered_seconds:.1f}s em buffer, último erro: {reader.last_error})"
+        )
+        connection_tracker.record_error(name)
+        return None
+
+    segment = CapturedSegment(name, "wav", data=pcm_to_wav_bytes(pcm))
+    if not CAPTURE_IN_MEMORY:
+        try:
+            output_path = await asyncio.to_thread(segment.spool, SEGMENTS_DIR)
+            segment = CapturedSegment(name, "wav", path=output_path)
+        except Exception as e:
+            logger.error(
+                f"Erro ao gravar segmento do leitor persistente de {name}: {e}"
+            )
+            connection_tracker.record_error(name)
+            return None
+
+    logger.info(
+        f"Segmento de {len(pcm) / PCM_BYTES_PER_SECOND:.1f} segundos obtido do buffer do stream {name}."
+    )
+    connection_tracker.clear_error(name)
+    return segment
+
 
 # Função para verificar duplicatas no banco de dados (MODIFICADA)
 async def _internal_is_duplicate_in_db(cursor, now_tz, name, artist, song_title):
@@ -1318,56 +1988,445 @@ async def update_local_log(
         return False
 
 
-# Função para processar um único stream
-async def process_stream(stream, last_songs):
-    logger.debug("Iniciando a função process_stream()")
+# Função para processar um ciclo de um stream (executada pelo agendador central)
+# `state` é preservado entre os ciclos do stream; retorna os segundos até o próximo ciclo
+async def process_stream_cycle(stream, state, last_songs):
     url = stream["url"]
     name = stream["name"]
     # Use stream index or name as the key for tracking
     stream_key = stream.get("index", name)
     processed_by_server = stream.get("processed_by_server", True)
-    previous_segment = None
+    # Captura disparada por troca de título ICY (modo CAPTURE_TRIGGER=metadata)
+    title_changed = state.pop("title_changed", False)
+    # Extensão progressiva pedida pelo ciclo anterior (amostra curta sem match)
+    extend = state.pop("extend", False)
 
-    while True:
-        logger.info(f"Processando streaming: {name}")
-        # Verificar se este stream está sendo processado por este servidor
-        if not processed_by_server:
+    logger.info(f"Processando streaming: {name}")
+    # Verificar se este stream está sendo processado por este servidor
+    if not processed_by_server:
+        logger.info(
+            f"Stream {name} ({stream_key}) não é processado por este servidor. Verificando novamente em 60 segundos."
+        )
+        return 60  # Aguardar antes de verificar novamente
+
+    if (
+        SIMULCAST_DETECTION
+        and not extend
+        and simulcast_detector.leader(name) != name
+    ):
+        # Membro de um grupo em simulcast: o líder reconhece e grava por ele;
+        # capturar apenas periodicamente para confirmar que o áudio ainda coincide
+        state["simulcast_skips"] = state.get("simulcast_skips", 0) + 1
+        if state["simulcast_skips"] < SIMULCAST_VERIFY_EVERY:
+            skipped_segments.record(name, SKIP_SIMULCAST)
             logger.info(
-                f"Stream {name} ({stream_key}) não é processado por este servidor. Verificando novamente em 60 segundos."
+                f"Stream {name} em simulcast com {simulcast_detector.leader(name)}; captura dispensada."
             )
-            await asyncio.sleep(60)  # Aguardar antes de verificar novamente
-            continue
+            return capture_planner.next_delay(stream_key) if ADAPTIVE_CAPTURE else 60
+    state["simulcast_skips"] = 0
+
+    if STREAM_HEALTH_CHECK:
+        # Circuito aberto: não gastar uma captura com um stream que está fora do ar
+        # (vencida a espera, esta captura é a tentativa do meio-aberto)
+        retry_after = stream_health.gate(name)
+        if retry_after is not None:
+            logger.info(
+                f"Circuito do stream {name} aberto; próxima tentativa em {retry_after:.0f}s"
+            )
+            return max(retry_after, 1)
+
+    # No modo progressivo a primeira captura é curta (estendida apenas sem match)
+    current_segment = await capture_stream_segment(
+        name,
+        url,
+        duration=(
+            PROGRESSIVE_SAMPLE_SECONDS
+            if PROGRESSIVE_RECOGNITION and not extend
+            else None
+        ),
+        processed_by_server=processed_by_server,
+    )
+
+    if current_segment is None:
+        # Registrar erro no tracker
+        connection_tracker.record_error(stream_key)
+        failure_count = connection_tracker.get_error_count(stream_key)
+
+        wait_time = 10  # Default wait time
+        if failure_count > 3:
+            wait_time = 30  # Increased wait time after 3 failures
+
+        if STREAM_HEALTH_CHECK:
+            retry_after = stream_health.record_failure(name, "falha na captura")
+            if retry_after is not None:
+                return retry_after
 
-        current_segment_path = await capture_stream_segment(
-            name, url, duration=None, processed_by_server=processed_by_server
+        logger.error(
+            f"Falha ao capturar segmento do streaming {name} ({stream_key}). Falha #{failure_count}. Tentando novamente em {wait_time} segundos..."
         )
+        return wait_time
+    else:
+        # Limpar erros no tracker em caso de sucesso
+        connection_tracker.clear_error(stream_key)
+        state["captured_at"] = current_segment.captured_at
+        if STREAM_HEALTH_CHECK:
+            stream_health.record_success(name)
+        if SIMULCAST_DETECTION:
+            request_simulcast_verification(name)
+
+    analysis = await analyze_segment(current_segment)
+    dead_air = analysis["dead_air"] if analysis else None
+    speech = analysis["speech"] if analysis else False
+    defer_seconds = 0
+    planned_outcome = None  # Resultado considerado no planejamento do intervalo
+    if dead_air is None:
+        connection_tracker.clear_dead_air(stream_key)
+
+    # Comparar com a captura anterior: a mesma música ainda está tocando?
+    profile = analysis["profile"] if analysis else None
+    previous_profile = state.get("previous_profile")
+    same_song_skips = state.get("same_song_skips", 0)
+    similarity = None
+    if (
+        profile is not None
+        and previous_profile is not None
+        and state.get("last_outcome") in (OUTCOME_NEW_SONG, OUTCOME_DUPLICATE)
+        and same_song_skips < SAME_SONG_MAX_SKIPS
+        and not title_changed
+    ):
+        similarity = profile_similarity(previous_profile, profile)
+    state["previous_profile"] = profile
+
+    if dead_air is not None:
+        # Silêncio ou tom constante: não gastar uma requisição de reconhecimento
+        connection_tracker.record_dead_air(stream_key, dead_air)
+        skipped_segments.record(name, dead_air)
+        logger.warning(
+            f"Ar morto em {name} ({stream_key}): {dead_air}. Segmento descartado sem reconhecimento."
+        )
+        await asyncio.to_thread(current_segment.discard)
+    elif speech and not title_changed:
+        # Locução/comerciais: sem chance de match; adiar a próxima captura
+        skipped_segments.record(name, SKIP_SPEECH)
+        planned_outcome = OUTCOME_NO_MATCH
+        defer_seconds = SPEECH_DEFER_SECONDS
+        logger.info(
+            f"Fala detectada em {name} ({stream_key}); segmento descartado e próxima captura adiada em {defer_seconds}s."
+        )
+        await asyncio.to_thread(current_segment.discard)
+    elif similarity is not None and similarity >= SAME_SONG_SIMILARITY:
+        state["same_song_skips"] = same_song_skips + 1
+        skipped_segments.record(name, SKIP_SAME_SONG)
+        planned_outcome = OUTCOME_DUPLICATE
+        logger.info(
+            f"Mesma música ainda tocando em {name} ({stream_key}) (similaridade {similarity:.2f}); reconhecimento ignorado ({same_song_skips + 1}/{SAME_SONG_MAX_SKIPS})."
+        )
+        await asyncio.to_thread(current_segment.discard)
+    else:
+        # Se a captura foi bem-sucedida, prosseguir com o Shazam; o worker de
+        # captura não espera o resultado (complete_recognition_cycle reagenda o stream)
+        if extend:
+            progressive_stats["extended"] += 1
+        job = await submit_recognition(current_segment, stream, last_songs)
+        wait_timeout = recognition_wait_timeout(job)
+        register_task(
+            asyncio.create_task(
+                complete_recognition_cycle(job, state, last_songs, wait_timeout, extend)
+            )
+        )
+        # Vale apenas se a continuação não reagendar (ela o faz ao fim da espera)
+        return wait_timeout + 1
+
+    return await finish_stream_cycle(
+        stream,
+        state,
+        last_songs,
+        planned_outcome,
+        current_segment.captured_at,
+        defer_seconds,
+    )
 
-        if current_segment_path is None:
-            # Registrar erro no tracker
-            connection_tracker.record_error(stream_key)
-            failure_count = connection_tracker.get_error_count(stream_key)
 
-            wait_time = 10  # Default wait time
-            if failure_count > 3:
-                wait_time = 30  # Increased wait time after 3 failures
+async def complete_recognition_cycle(job, state, last_songs, wait_timeout, extended):
+    """
+    Conclui o ciclo do stream quando o reconhecimento termina, fora do worker
+    de captura, e reagenda o stream conforme o resultado
+    """
+    stream = job.stream
+    name = stream["name"]
+    delay = 60
+    try:
+        outcome = await job.wait(timeout=wait_timeout)
+        if outcome is None:
+            logger.warning(
+                f"Reconhecimento do segmento de {name} não concluído em {wait_timeout:.0f}s; seguindo para o próximo ciclo."
+            )
+        else:
+            logger.debug(f"Resultado do reconhecimento para {name}: {outcome}")
 
-            logger.error(
-                f"Falha ao capturar segmento do streaming {name} ({stream_key}). Falha #{failure_count}. Tentando novamente em {wait_time} segundos..."
+        progressive = (
+            PROGRESSIVE_RECOGNITION
+            and PROGRESSIVE_SAMPLE_SECONDS < IDENTIFICATION_DURATION
+            and not extended
+        )
+        if progressive:
+            progressive_stats["short_samples"] += 1
+            if outcome in (OUTCOME_NEW_SONG, OUTCOME_DUPLICATE):
+                progressive_stats["short_matches"] += 1
+        if progressive and outcome == OUTCOME_NO_MATCH:
+            # Amostra curta sem match: o próximo ciclo, imediato, lê a duração
+            # completa do buffer do leitor persistente (sem reconectar)
+            logger.info(
+                f"Sem match na amostra de {PROGRESSIVE_SAMPLE_SECONDS}s de {name}; estendendo para {IDENTIFICATION_DURATION}s."
             )
-            await asyncio.sleep(wait_time)
-            continue
+            state["extend"] = True
+            delay = 0
         else:
-            # Limpar erros no tracker em caso de sucesso
-            connection_tracker.clear_error(stream_key)
+            state["last_outcome"] = outcome
+            state["same_song_skips"] = 0
+            delay = await finish_stream_cycle(
+                stream, state, last_songs, outcome, job.segment.captured_at
+            )
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao concluir o ciclo do stream {name}: {e}", exc_info=True)
+    if stream_scheduler is not None:
+        stream_scheduler.reschedule(stream_schedule_key(stream), delay)
 
-        # Se a captura foi bem-sucedida, prosseguir com o Shazam
-        await shazam_queue.put((current_segment_path, stream, last_songs))
-        await shazam_queue.join()  # Esperar o item ser processado antes do próximo ciclo? (Verificar necessidade)
 
-        logger.info(
-            f"Aguardando 60 segundos para o próximo ciclo do stream {name} ({stream_key})..."
+async def finish_stream_cycle(
+    stream, state, last_songs, planned_outcome, captured_at, defer_seconds=0
+):
+    """Registra o resultado no planejador e retorna os segundos até o próximo ciclo"""
+    name = stream["name"]
+    url = stream["url"]
+    stream_key = stream.get("index", name)
+    if ADAPTIVE_CAPTURE and planned_outcome is not None:
+        track_duration = None
+        if planned_outcome == OUTCOME_NEW_SONG and name in last_songs:
+            title, artist = last_songs[name]
+            track_duration = await get_airplay_duration(name, title, artist)
+        capture_planner.record_outcome(
+            stream_key,
+            planned_outcome,
+            captured_at=captured_at,
+            track_duration=track_duration,
+        )
+
+    interval = capture_planner.next_delay(stream_key) if ADAPTIVE_CAPTURE else 60
+    planned_interval = budget_planner and budget_planner.interval(
+        stream_schedule_key(stream)
+    )
+    if planned_interval:
+        # A fatia do orçamento limita a frequência; sem adaptação, define a cadência
+        interval = (
+            max(interval, planned_interval) if ADAPTIVE_CAPTURE else planned_interval
+        )
+    if CAPTURE_TRIGGER == "metadata":
+        # A troca de título antecipa o ciclo (on_icy_title_change); sem troca,
+        # capturar mesmo assim após ICY_FALLBACK_INTERVAL. Streams sem metadados
+        # ou com o monitor desconectado mantêm o intervalo normal
+        watcher = icy_watchers.get_watcher(name, url)
+        if watcher.supported and watcher.connected:
+            interval = ICY_FALLBACK_INTERVAL
+    logger.info(
+        f"Próximo ciclo do stream {name} ({stream_key}) em {interval + defer_seconds:.0f} segundos."
+    )
+    return interval + defer_seconds
+
+
+def request_simulcast_verification(leader):
+    """
+    Antecipa a captura de verificação dos membros do grupo para logo após a do
+    líder, para que os dois segmentos cubram o mesmo trecho de áudio
+    """
+    if stream_scheduler is None:
+        return
+    for member in simulcast_detector.followers(leader):
+        state = stream_scheduler.get_state(member)
+        if state is not None and (
+            state.get("simulcast_skips", 0) >= SIMULCAST_VERIFY_EVERY - 1
+        ):
+            state["simulcast_skips"] = SIMULCAST_VERIFY_EVERY
+            stream_scheduler.reschedule(member, 0)
+
+
+async def share_simulcast_result(stream, entry_base, now_tz, last_songs):
+    """Grava o resultado do líder para os demais membros do grupo em simulcast"""
+    followers = simulcast_detector.followers(stream["name"])
+    if not followers:
+        return
+    title_artist = (entry_base["song_title"], entry_base["artist"])
+    streams_by_name = {s["name"]: s for s in STREAMS}
+    changed = False
+    for member in followers:
+        member_stream = streams_by_name.get(member)
+        previous_song = last_songs.get(member)
+        if member_stream is None or (
+            previous_song and tuple(previous_song) == title_artist
+        ):
+            continue
+        entry = dict(
+            entry_base,
+            name=member,
+            cidade=member_stream.get("cidade", ""),
+            estado=member_stream.get("estado", ""),
+            regiao=member_stream.get("regiao", ""),
+            segmento=member_stream.get("segmento", ""),
+        )
+        if await insert_data_to_db(entry, now_tz):
+            record_ledger(member, "new_plays")
+            logger.info(
+                f"Resultado de {stream['name']} replicado para {member} (simulcast)."
+            )
+            last_songs[member] = title_artist
+            changed = True
+    if changed:
+        save_last_songs(last_songs)
+
+
+async def submit_recognition(segment, stream, last_songs):
+    """Envia o segmento à fila de reconhecimento; retorna a tarefa sem aguardá-la"""
+    job = RecognitionJob(segment, stream, last_songs)
+    if segment is not None and RECOGNITION_SEGMENT_DEADLINE > 0:
+        job.deadline = segment.captured_at + RECOGNITION_SEGMENT_DEADLINE
+    await shazam_queue.put(job)
+    return job
+
+
+def recognition_wait_timeout(job):
+    """Espera máxima pelo resultado: RECOGNITION_WAIT_TIMEOUT, limitada ao prazo do segmento"""
+    timeout = RECOGNITION_WAIT_TIMEOUT
+    if job.deadline is not None:
+        timeout = min(timeout, max(job.deadline - time.time(), 0))
+    return timeout
+
+
+def stream_schedule_key(stream):
+    """Chave do stream no agendador (a mesma dos leitores e monitores ICY)"""
+    return stream["name"]
+
+
+async def budget_ledger_loop():
+    """Grava periodicamente os contadores do orçamento no banco"""
+    while True:
+        await asyncio.sleep(BUDGET_LEDGER_FLUSH_INTERVAL)
+        await flush_budget_ledger()
+
+
+async def flush_budget_ledger():
+    def db_flush():
+        with get_db_pool().get_connection_sync() as conn:
+            return budget_ledger.flush(conn)
+
+    try:
+        rows = await asyncio.to_thread(db_flush)
+        if rows:
+            logger.debug(f"Ledger do orçamento: {rows} linhas gravadas")
+    except Exception as e:
+        logger.error(f"Erro ao gravar o ledger do orçamento: {e}")
+
+
+def plan_recognition_budget():
+    """Redivide o orçamento do Shazam entre os streams atribuídos a este servidor"""
+    if budget_planner is None:
+        return
+    budget_planner.plan(
+        (s for s in STREAMS if s.get("processed_by_server", True)),
+        key_fn=stream_schedule_key,
+    )
+
+
+def on_stream_circuit_open(name, retry_after):
+    """Adia o próximo ciclo do stream até o fim da espera do circuito"""
+    if stream_scheduler is not None:
+        stream_scheduler.reschedule(name, retry_after)
+
+
+async def stream_health_loop():
+    """Sonda periodicamente, em paralelo, todos os streams atribuídos a este servidor"""
+    while True:
+        try:
+            await stream_health.sweep(
+                (s["name"], s["url"])
+                for s in STREAMS
+                if s.get("processed_by_server", True)
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Erro na pré-verificação dos streams: {e}")
+        await asyncio.sleep(HEALTH_PROBE_INTERVAL)
+
+
+def on_icy_title_change(name, title):
+    """Antecipa o próximo ciclo do stream quando o título ICY muda"""
+    state = stream_scheduler.get_state(name) if stream_scheduler else None
+    if state is None:
+        return
+    state["title_changed"] = True
+    delay = ICY_CHANGE_DELAY
+    planned_interval = budget_planner and budget_planner.interval(name)
+    if planned_interval and state.get("captured_at"):
+        # Respeitar a fatia do orçamento: não capturar antes do intervalo planejado
+        delay = max(delay, state["captured_at"] + planned_interval - time.time())
+    stream_scheduler.reschedule(name, delay)
+
+
+async def get_airplay_duration(stream_name, title, artist):
+    """
+    Duração típica (mediana, em segundos) de uma música no ar do stream, estimada
+    pelo intervalo entre sua identificação e a identificação seguinte
+    Retorna None sem histórico suficiente. Uma única consulta calcula as durações
+    de todas as músicas do stream, mantidas em cache por stream.
+    """
+    cached = airplay_duration_cache.get(stream_name)
+    if cached is None or time.time() - cached[1] >= AIRPLAY_DURATION_CACHE_TTL:
+        durations = await _load_airplay_durations(stream_name)
+        if durations is not None:
+            cached = (durations, time.time())
+            airplay_duration_cache[stream_name] = cached
+        elif cached is None:
+            return None  # Falha na consulta: tentar de novo na próxima música
+    duration = cached[0].get((title, artist))
+    logger.debug(f"Duração típica no ar de '{title}' - '{artist}' em {stream_name}: {duration}")
+    return duration
+
+
+async def _load_airplay_durations(stream_name):
+    """{(título, artista): duração mediana} das músicas do stream (None se a consulta falhar)"""
+    query = f"""
+        WITH plays AS (
+            SELECT song_title, artist, (date + time) AS played_at,
+                   LEAD(date + time) OVER (ORDER BY date, time) AS next_at
+            FROM {DB_TABLE_NAME}
+            WHERE name = %s AND date >= CURRENT_DATE - %s
         )
-        await asyncio.sleep(60)  # Intervalo de captura de segmentos
+        SELECT song_title, artist,
+               percentile_cont(0.5) WITHIN GROUP (
+                   ORDER BY EXTRACT(EPOCH FROM next_at - played_at)
+               )
+        FROM plays
+        WHERE next_at - played_at BETWEEN INTERVAL '90 seconds' AND INTERVAL '12 minutes'
+        GROUP BY song_title, artist
+        HAVING COUNT(*) >= %s
+    """
+
+    def run_query():
+        with get_db_pool().get_connection_sync() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    query, (stream_name, AIRPLAY_HISTORY_DAYS, AIRPLAY_MIN_SAMPLES)
+                )
+                return cursor.fetchall()
+
+    try:
+        rows = await asyncio.to_thread(run_query)
+    except Exception as e:
+        logger.debug(f"Erro ao consultar durações no ar de {stream_name}: {e}")
+        return None
+    return {(title, artist): float(duration) for title, artist, duration in rows}
 
 
 def send_email_alert(subject, body):
@@ -1408,6 +2467,16 @@ async def check_and_alert_persistent_errors():
             logger.warning(
                 f"Alerta enviado para erros persistentes: {persistent_errors}"
             )
+        persistent_dead_air = connection_tracker.check_persistent_dead_air()
+        if persistent_dead_air:
+            subject = "Alerta: Streams de Rádio Fora do Ar (Silêncio/Tom)"
+            body = "Os seguintes streams estão transmitindo silêncio ou tom constante há mais de 10 minutos:\n\n"
+            for stream in persistent_dead_air:
+                body += f"- {stream}\n"
+            send_email_alert(subject, body)
+            logger.warning(
+                f"Alerta enviado para ar morto persistente: {persistent_dead_air}"
+            )
 
 
 # Função para sincronizar o arquivo JSON local com o banco de dados
@@ -1498,7 +2567,8 @@ async def schedule_json_sync():
 
 
 # Função para verificar se é hora de recarregar os streams devido à rotação
-async def check_rotation_schedule():
+async def check_rotation_schedule(on_rotation):
+    # `on_rotation` aplica a nova atribuição (agendador e plano do orçamento)
     if not (DISTRIBUTE_LOAD and ENABLE_ROTATION):
         return False  # Não fazer nada se a rotação não estiver ativada
 
@@ -1516,86 +2586,15 @@ async def check_rotation_schedule():
             last_rotation_offset = current_rotation_offset
 
             # Recarregar streams com a nova rotação
-            global STREAMS
-            STREAMS = load_streams()
+            on_rotation()
             logger.info(
                 f"Streams recarregados devido à rotação. Agora processando {len(STREAMS)} streams."
             )
 
-            # Atualizar as tarefas (isso será chamado na função main)
-            return True
-
-        return False
-
-
-# Classe para gerenciar rate limiting do Shazam
-class ShazamRateLimiter:
-    def __init__(self, max_requests_per_minute=20, pause_duration=120):
-        self.max_requests_per_minute = max_requests_per_minute
-        self.pause_duration = pause_duration  # em segundos
-        self.request_timestamps = []
-        self.pause_until_timestamp = 0.0
-        self.consecutive_429_count = 0
-        self.lock = asyncio.Lock()
-
-    async def wait_if_needed(self):
-        async with self.lock:
-            current_time = time.time()
-
-            # Verificar se está em pausa
-            if current_time < self.pause_until_timestamp:
-                remaining_pause = self.pause_until_timestamp - current_time
-                return False, dt.datetime.fromtimestamp(
-                    self.pause_until_timestamp
-                ).strftime("%H:%M:%S")
-
-            # Limpar timestamps antigos (mais de 60 segundos)
-            self.request_timestamps = [
-                ts for ts in self.request_timestamps if current_time - ts < 60
-            ]
-
-            # Verificar se excedeu o limite de requisições por minuto
-            if len(self.request_timestamps) >= self.max_requests_per_minute:
-                # Calcular tempo até que uma requisição saia da janela de 1 minuto
-                oldest_timestamp = min(self.request_timestamps)
-                wait_time = (
-                    60 - (current_time - oldest_timestamp) + 0.1
-                )  # +0.1s de margem
-
-                if wait_time > 0:
-                    logger.info(
-                        f"Rate limit preventivo: aguardando {wait_time:.2f}s antes da próxima requisição Shazam"
-                    )
-                    await asyncio.sleep(wait_time)
-
-            # Registrar nova requisição
-            self.request_timestamps.append(time.time())
-            return True, None
-
-    def record_success(self):
-        self.consecutive_429_count = 0  # Resetar contador de erros 429 consecutivos
-
-    def record_429_error(self):
-        self.consecutive_429_count += 1
-        current_time = time.time()
-
-        # Aumentar o tempo de pausa exponencialmente com base no número de erros 429 consecutivos
-        pause_time = min(
-            self.pause_duration * (2 ** (self.consecutive_429_count - 1)), 1800
-        )  # Máximo de 30 minutos
-        self.pause_until_timestamp = current_time + pause_time
-
-        logger.warning(
-            f"Erro 429 consecutivo #{self.consecutive_429_count}. Pausando Shazam por {pause_time}s (até {dt.datetime.fromtimestamp(self.pause_until_timestamp).strftime('%H:%M:%S')})"
-        )
-        return pause_time
-
 
 # Função worker para identificar música usando Shazamio (MODIFICADA)
-async def identify_song_shazamio(shazam):
-    global last_request_time
-    # Criar instância do rate limiter
-    rate_limiter = ShazamRateLimiter(max_requests_per_minute=15, pause_duration=120)
+async def identify_song_shazamio(recognizer, rate_limiter, worker_id=1):
+    # O rate limiter é compartilhado entre todos os workers (orçamento global)
 
     # Definir o fuso horário uma vez fora do loop usando pytz
     target_tz = None
@@ -1622,109 +2621,246 @@ async def identify_song_shazamio(shazam):
         )
         sys.exit(1)
 
-    while True:
-        file_path, stream, last_songs = await shazam_queue.get()
-        stream_index = stream.get("index")  # Obter índice aqui para uso posterior
+    logger.info(f"Worker de reconhecimento #{worker_id} iniciado")
 
-        # Verificar se o arquivo existe (pode ter sido pulado na captura)
-        if file_path is None:
-            logger.info(
-                f"Arquivo de segmento para o stream {stream['name']} não foi capturado. Pulando identificação."
+    while True:
+        job = await shazam_queue.get()
+        outcome = OUTCOME_FAILED
+        try:
+            outcome = await _recognize_job(recognizer, rate_limiter, target_tz, job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(
+                f"Worker de reconhecimento #{worker_id}: erro ao processar segmento de {job.stream.get('name')}: {e}",
+                exc_info=True,
             )
+        finally:
+            # O produtor aguarda apenas o resultado da própria tarefa
+            # (tarefas reagendadas são resolvidas na última tentativa)
+            if outcome != OUTCOME_RETRY:
+                job.resolve(outcome)
             shazam_queue.task_done()
-            continue
 
-        identification_attempted = False
-        out = None  # Inicializar fora do loop de retentativa
+
+# Calcula os landmarks do segmento para o cache local (None se indisponível)
+async def compute_segment_landmarks(segment):
+    if not HAS_NUMPY or (recognition_cache is None and not SIMULCAST_DETECTION):
+        return None
+    wav_data = await asyncio.to_thread(segment.wav_data)
+    if not wav_data:
+        return None  # Cache disponível apenas para segmentos PCM/WAV
+
+    def compute():
+        decoded = decode_wav(wav_data)
+        if decoded is None:
+            return None
+        return landmark_hashes(decoded[0])
+
+    try:
+        return await asyncio.to_thread(compute)
+    except Exception as e:
+        logger.error(f"Erro ao calcular landmarks do segmento {segment.label}: {e}")
+        return None
+
+
+# Analisa o PCM do segmento antes do reconhecimento (None se indisponível)
+# Retorna {"dead_air": DEAD_AIR_* ou None, "speech": bool, "profile": perfil espectral ou None}
+async def analyze_segment(segment):
+    if not HAS_NUMPY or not (
+        DEAD_AIR_DETECTION or SPEECH_DETECTION or SAME_SONG_DETECTION
+    ):
+        return None
+    wav_data = await asyncio.to_thread(segment.wav_data)
+    if not wav_data:
+        return None  # Análise disponível apenas para segmentos PCM/WAV
+
+    def compute():
+        decoded = decode_wav(wav_data)
+        if decoded is None:
+            return None
+        samples, sample_rate = decoded
+        dead_air = None
+        if DEAD_AIR_DETECTION:
+            dead_air = detect_dead_air(samples, silence_rms_db=DEAD_AIR_SILENCE_DB)
+        speech = False
+        if SPEECH_DETECTION and dead_air is None:
+            speech, _ = classify_speech(samples, sample_rate)
+        profile = None
+        if SAME_SONG_DETECTION and dead_air is None:
+            profile = spectral_profile(samples, sample_rate)
+        return {"dead_air": dead_air, "speech": speech, "profile": profile}
+
+    try:
+        return await asyncio.to_thread(compute)
+    except Exception as e:
+        logger.error(f"Erro ao analisar o segmento {segment.label}: {e}")
+        return None
+
+
+# Reconhece um único segmento; retorna o resultado (OUTCOME_*)
+async def _recognize_job(recognizer, rate_limiter, target_tz, job):
+    global last_request_time
+    segment = job.segment
+    stream = job.stream
+    last_songs = job.last_songs
+    stream_index = stream.get("index")  # Obter índice aqui para uso posterior
+
+    # Verificar se o segmento existe (pode ter sido pulado na captura)
+    if segment is None:
+        logger.info(
+            f"Arquivo de segmento para o stream {stream['name']} não foi capturado. Pulando identificação."
+        )
+        return OUTCOME_SKIPPED
+
+    try:
+        responded = False  # O backend respondeu (com ou sem música)
+        match = None
+        outcome = OUTCOME_FAILED
+
+        if job.expired():
+            # Segmento antigo demais (fila cheia ou retentativas): resultado já não é útil
+            skipped_segments.record(stream["name"], SKIP_STALE)
+            logger.warning(
+                f"Segmento {segment.label} descartado: capturado há {time.time() - segment.captured_at:.0f}s, além do prazo de {RECOGNITION_SEGMENT_DEADLINE:.0f}s."
+            )
+            outcome = OUTCOME_STALE
+            return outcome
+
+        # --- Consultar o cache local antes de gastar uma requisição ---
+        track_metadata = None
+        first_attempt = job.attempt == 0
+        if first_attempt:
+            job.fingerprint = await compute_segment_landmarks(segment)
+        fingerprint = job.fingerprint
+        if fingerprint is not None and SIMULCAST_DETECTION and first_attempt:
+            matched = await asyncio.to_thread(
+                simulcast_detector.observe,
+                stream["name"],
+                *fingerprint,
+                segment.captured_at,
+            )
+            leader = simulcast_detector.leader(stream["name"])
+            if leader != stream["name"] and leader in matched:
+                # Verificação confirmou o grupo: o líder já reconheceu este áudio
+                skipped_segments.record(stream["name"], SKIP_SIMULCAST)
+                logger.info(
+                    f"Segmento {segment.label} coincide com o de {leader} (simulcast); reconhecimento dispensado."
+                )
+                return OUTCOME_SKIPPED
+        if fingerprint is not None and recognition_cache is not None:
+            track_metadata = recognition_cache.lookup(*fingerprint)
 
         # --- Verificar com o rate limiter se podemos prosseguir ---
-        can_proceed, pause_until = await rate_limiter.wait_if_needed()
-        if not can_proceed:
+        can_proceed, pause_until = True, None
+        # Segmentos adiados já reservaram o token da primeira tentativa
+        if track_metadata is None and not (job.deferred and first_attempt):
+            can_proceed, pause_until = await rate_limiter.wait_if_needed()
+        if track_metadata is not None:
             logger.info(
-                f"Shazam em pausa devido a erro 429 anterior (até {pause_until}). Enviando {os.path.basename(file_path)} diretamente para failover."
+                f"Segmento {segment.label} reconhecido pelo cache local; Shazam não consultado."
             )
-            if ENABLE_FAILOVER_SEND:
-                asyncio.create_task(send_file_via_failover(file_path, stream_index))
+        elif not can_proceed:
+            logger.info(
+                f"Shazam em pausa devido a erro 429 anterior (até {pause_until}); segmento {segment.label} não reconhecido agora."
+            )
+            await handle_paused_segment(segment, stream)
+            outcome = OUTCOME_PAUSED
         else:
             # --- Tentar identificação se não estiver em pausa ---
-            identification_attempted = True
-            max_retries = 5
-            for attempt in range(max_retries):
-                try:
-                    logger.info(
-                        f"Identificando música no arquivo {file_path} (tentativa {attempt + 1}/{max_retries})..."
-                    )
-                    out = await asyncio.wait_for(
-                        shazam.recognize(file_path), timeout=10
-                    )
-                    last_request_time = time.time()
-                    rate_limiter.record_success()  # Registrar sucesso para o rate limiter
+            attempt = job.attempt + 1
+            max_attempts = RECOGNITION_MAX_ATTEMPTS
+            transient_error = False
+            try:
+                logger.info(
+                    f"Identificando música no segmento {segment.label} (tentativa {attempt}/{max_attempts})..."
+                )
+                record_ledger(stream["name"], "recognitions")
+                match = await asyncio.wait_for(
+                    recognizer.recognize(segment.recognize_input()), timeout=10
+                )
+                responded = True
+                last_request_time = time.time()
+                rate_limiter.record_success()  # Registrar sucesso para o rate limiter
+
+                if match is None:
+                    logger.info("Nenhuma música identificada (resposta vazia do Shazam).")
+
+            except RateLimitedError:
+                # Usar o rate limiter para gerenciar a pausa
+                rate_limiter.record_429_error()
+                record_ledger(stream["name"], "rate_limited")
+                outcome = OUTCOME_PAUSED
+                await handle_paused_segment(segment, stream)
+            except ClientResponseError as e_resp:
+                transient_error = True
+                logger.error(
+                    f"Erro HTTP {e_resp.status} do Shazam (tentativa {attempt}/{max_attempts}): {e_resp}."
+                )
+            except (ClientConnectorError, asyncio.TimeoutError) as e_conn:
+                transient_error = True
+                logger.error(
+                    f"Erro de conexão/timeout com Shazam (tentativa {attempt}/{max_attempts}): {e_conn}."
+                )
+            except Exception as e_gen:
+                # Demais erros do backend também são tratados como transitórios
+                transient_error = True
+                logger.error(
+                    f"Erro inesperado ao identificar a música (tentativa {attempt}/{max_attempts}): {e_gen}",
+                    exc_info=True,
+                )
 
-                    if "track" in out:
-                        break
-                    else:
-                        logger.info(
-                            "Nenhuma música identificada (resposta vazia do Shazam)."
-                        )
-                        break
-
-                except ClientResponseError as e_resp:
-                    if e_resp.status == 429:
-                        # Usar o rate limiter para gerenciar a pausa
-                        rate_limiter.record_429_error()
-                        if ENABLE_FAILOVER_SEND:
-                            asyncio.create_task(
-                                send_file_via_failover(file_path, stream_index)
-                            )
-                        break
-                    else:
-                        wait_time = 2**attempt
-                        logger.error(
-                            f"Erro HTTP {e_resp.status} do Shazam (tentativa {attempt + 1}/{max_retries}): {e_resp}. Esperando {wait_time}s..."
-                        )
-                        await asyncio.sleep(wait_time)
-                except (ClientConnectorError, asyncio.TimeoutError) as e_conn:
-                    wait_time = 2**attempt
-                    logger.error(
-                        f"Erro de conexão/timeout com Shazam (tentativa {attempt + 1}/{max_retries}): {e_conn}. Esperando {wait_time}s..."
+            if transient_error:
+                # Reagendar sem bloquear o worker; ele segue para o próximo segmento
+                delay = recognition_retry_queue.schedule(job)
+                if delay is not None:
+                    logger.info(
+                        f"Segmento {segment.label} reagendado para nova tentativa em {delay:.0f}s."
                     )
-                    await asyncio.sleep(wait_time)
-                except Exception as e_gen:
+                    outcome = OUTCOME_RETRY
+                    return outcome
+                if job.attempt + 1 >= max_attempts:
                     logger.error(
-                        f"Erro inesperado ao identificar a música (tentativa {attempt + 1}/{max_retries}): {e_gen}",
-                        exc_info=True,
+                        f"Falha na identificação de {segment.label} após {attempt} tentativas."
                     )
-                    break
-            else:
-                if identification_attempted:
-                    logger.error(
-                        f"Falha na identificação de {os.path.basename(file_path)} após {max_retries} tentativas (sem erro 429 ou erro genérico)."
+                else:
+                    skipped_segments.record(stream["name"], SKIP_STALE)
+                    logger.warning(
+                        f"Segmento {segment.label} descartado: nova tentativa ultrapassaria o prazo de {RECOGNITION_SEGMENT_DEADLINE:.0f}s."
                     )
-
-        # --- Processar resultado (se houve identificação e não estava em pausa) ---
-        if identification_attempted and out and "track" in out:
-            track = out["track"]
-            title = track["title"]
-            artist = track["subtitle"]
-            isrc = track.get("isrc", "ISRC não disponível")
-            label = None
-            genre = None
-            # ... (extração de label/genre) ...
-            if "sections" in track:
-                for section in track["sections"]:
-                    if section["type"] == "SONG":
-                        for metadata in section["metadata"]:
-                            if metadata["title"] == "Label":
-                                label = metadata["text"]
-            if "genres" in track:
-                genre = track["genres"].get("primary", None)
+                    outcome = OUTCOME_STALE
+
+        # --- Extrair metadados (se houve identificação e não estava em pausa) ---
+        if match is not None:
+            track_metadata = match.as_metadata()
+            if fingerprint is not None and recognition_cache is not None:
+                recognition_cache.store(track_metadata, *fingerprint)
+        elif responded:
+            outcome = OUTCOME_NO_MATCH
+
+        # --- Processar resultado (Shazam ou cache local) ---
+        if track_metadata is not None:
+            title = track_metadata["title"]
+            artist = track_metadata["artist"]
+            isrc = track_metadata["isrc"]
+            label = track_metadata["label"]
+            genre = track_metadata["genre"]
 
             logger.info(
                 f"Música identificada: {title} por {artist} (ISRC: {isrc}, Gravadora: {label}, Gênero: {genre})"
             )
+            previous_song = last_songs.get(stream["name"])
+            if previous_song and tuple(previous_song) == (title, artist):
+                outcome = OUTCOME_DUPLICATE
+            else:
+                outcome = OUTCOME_NEW_SONG
 
             # Obter timestamp atual COM FUSO HORÁRIO
-            now_tz = dt.datetime.now(target_tz)
+            # Segmentos adiados são gravados com o horário original da captura
+            if job.deferred:
+                now_tz = dt.datetime.fromtimestamp(segment.captured_at, target_tz)
+            else:
+                now_tz = dt.datetime.now(target_tz)
 
             # Criar dicionário base SEM date/time
             entry_base = {
@@ -1743,25 +2879,53 @@ async def identify_song_shazamio(shazam):
 
             # Chamar insert_data_to_db, que fará a verificação e a inserção
             inserted = await insert_data_to_db(entry_base, now_tz)
+            record_ledger(stream["name"], "matches")
+            record_ledger(stream["name"], "new_plays" if inserted else "duplicates")
 
             if (
-                inserted
+                inserted and not job.deferred
             ):  # Salvar last_songs apenas se a inserção foi BEM-SUCEDIDA (não duplicata)
                 last_songs[stream["name"]] = (title, artist)
                 save_last_songs(last_songs)
 
-        # --- Limpeza do arquivo local ---
-        # ... (código de limpeza existente) ...
-        if os.path.exists(file_path):
+            if SIMULCAST_DETECTION and not job.deferred:
+                await share_simulcast_result(stream, entry_base, now_tz, last_songs)
+
+    finally:
+        # --- Liberação do segmento (remove o arquivo local, se houver) ---
+        # Segmentos reagendados continuam em uso pela próxima tentativa
+        segment_label = segment.label
+        if outcome != OUTCOME_RETRY:
             try:
-                await asyncio.to_thread(os.remove, file_path)
-                logger.debug(f"Arquivo de segmento local {file_path} removido.")
+                await asyncio.to_thread(segment.discard)
+                logger.debug(f"Segmento {segment_label} liberado.")
             except Exception as e_remove:
-                logger.error(
-                    f"Erro ao remover arquivo de segmento {file_path}: {e_remove}"
-                )
+                logger.error(f"Erro ao remover segmento {segment_label}: {e_remove}")
 
-        shazam_queue.task_done()
+    return outcome
+
+
+# Reconhece os segmentos adiados quando a pausa termina, usando apenas a sobra do orçamento
+async def deferred_backfill_worker(rate_limiter, last_songs, poll_interval=5):
+    while True:
+        if (
+            not len(deferred_spool)
+            or rate_limiter.is_paused()
+            or not shazam_queue.empty()  # Capturas ao vivo têm prioridade
+            or not rate_limiter.try_acquire()
+        ):
+            await asyncio.sleep(poll_interval)
+            continue
+        item = deferred_spool.pop()
+        if item is None:
+            continue
+        segment, stream = item
+        logger.info(
+            f"Reconhecendo segmento adiado de {stream['name']} capturado há {time.time() - segment.captured_at:.0f}s."
+        )
+        job = RecognitionJob(segment, stream, last_songs, deferred=True)
+        await shazam_queue.put(job)
+        await job.wait(timeout=RECOGNITION_WAIT_TIMEOUT)
 
 
 # Variáveis globais para controle de finalização
@@ -1787,6 +2951,22 @@ async def monitor_shutdown():
     await shutdown_event.wait()
     logger.info("Cancelando todas as tarefas ativas...")
 
+    # Encerrar leitores persistentes (finaliza os processos ffmpeg)
+    stream_readers.stop_all()
+    icy_watchers.stop_all()
+    await http_capture.close()
+    await stream_resolver.close()
+    await stream_health.close()
+    await recognizer_http_client.close()
+    if stream_scheduler is not None:
+        stream_scheduler.stop()
+    # Gravar os contadores ainda em memória
+    if budget_ledger is not None:
+        await flush_budget_ledger()
+    # Encerrar o pool de assinaturas
+    if signature_pool is not None:
+        signature_pool.shutdown()
+
     # Cancelar todas as tarefas ativas
     for task in active_tasks:
         if not task.done():
@@ -1807,9 +2987,8 @@ async def monitor_shutdown():
 # Função para adicionar uma tarefa ao conjunto de tarefas ativas
 def register_task(task):
     active_tasks.add(task)
-    # Remover tarefas concluídas para evitar vazamentos de memória
-    done_tasks = {t for t in active_tasks if t.done()}
-    active_tasks.difference_update(done_tasks)
+    # Remover a tarefa ao concluir, sem varrer o conjunto a cada registro
+    task.add_done_callback(active_tasks.discard)
     return task
 
 
@@ -1856,7 +3035,46 @@ async def send_heartbeat():
             ),
             "total_streams": len(STREAMS),
             "python_version": platform.python_version(),
+            "capture_mode": CAPTURE_MODE,
         }
+        if CAPTURE_MODE == "persistent":
+            info["stream_readers"] = stream_readers.get_stats()
+        if CAPTURE_TRIGGER == "metadata":
+            info["icy_metadata"] = icy_watchers.get_stats()
+        if stream_scheduler is not None:
+            info["scheduler"] = stream_scheduler.get_stats()
+        info["capture_governor"] = capture_governor.get_stats()
+        if CAPTURE_BACKEND == "http":
+            info["http_capture"] = http_capture.get_stats()
+        if STREAM_RESOLVER:
+            info["stream_resolver"] = stream_resolver.get_stats()
+        if STREAM_HEALTH_CHECK:
+            info["stream_health"] = stream_health.get_stats()
+        if signature_pool is not None:
+            info["signature_pool"] = signature_pool.get_stats()
+        info["shazam_rate_limiter"] = shazam_rate_limiter.get_metrics()
+        info["shazam_http"] = recognizer_http_client.get_stats()
+        if recognizer_backend is not None:
+            info["recognizer"] = recognizer_backend.get_stats()
+        info["recognition_retries"] = recognition_retry_queue.get_stats()
+        if budget_ledger is not None:
+            info["budget_ledger"] = budget_ledger.get_stats()
+        if deferred_spool is not None:
+            info["deferred_spool"] = deferred_spool.get_stats()
+        info["skipped_segments"] = skipped_segments.get_stats()
+        if PROGRESSIVE_RECOGNITION:
+            info["progressive_recognition"] = dict(progressive_stats)
+        if SIMULCAST_DETECTION:
+            info["simulcast"] = simulcast_detector.get_stats()
+        if ADAPTIVE_CAPTURE:
+            info["capture_planner"] = capture_planner.get_stats()
+        if budget_planner is not None:
+            info["recognition_budget"] = budget_planner.get_stats()
+        dead_air_streams = connection_tracker.get_dead_air_streams()
+        if dead_air_streams:
+            info["dead_air_streams"] = dead_air_streams
+        if recognition_cache is not None:
+            info["recognition_cache"] = recognition_cache.get_stats()
         info_json = json.dumps(info)
 
         # --- Operações de DB em thread separada ---
@@ -2060,6 +3278,17 @@ Este é um alerta automático enviado pelo servidor {SERVER_ID}.
 last_request_time = 0
 
 
+# Thread para verificar o schedule
+def run_schedule():
+    while True:
+        try:  # try precisa do bloco indentado
+            schedule.run_pending()
+        except Exception as e:
+            logger.error(f"Erro no thread de schedule: {e}")
+        # Mover sleep para fora do try/except para sempre ocorrer
+        time.sleep(60)  # Verificar a cada minuto
+
+
 # Função principal para processar todos os streams
 async def main():
     logger.debug("Iniciando a função main()")
@@ -2070,6 +3299,43 @@ async def main():
         f"Distribuição de carga: {DISTRIBUTE_LOAD}, Rotação: {ENABLE_ROTATION}, Horas de rotação: {ROTATION_HOURS}"
     )
 
+    # Criar o backend de reconhecimento usado por todos os workers
+    # O pool de assinaturas usa fork: precisa ser iniciado antes de qualquer thread
+    # (schedule, asyncio.to_thread, executores) existir no processo
+    global signature_pool, recognizer_backend
+    if RECOGNIZER_BACKEND == "mock":
+        recognizer_backend = MockRecognizerBackend(
+            catalog=(
+                load_catalog(RECOGNIZER_MOCK_CATALOG)
+                if RECOGNIZER_MOCK_CATALOG
+                else None
+            ),
+            latency=RECOGNIZER_MOCK_LATENCY,
+            rate_limit_rate=RECOGNIZER_MOCK_429_RATE,
+            no_match_rate=RECOGNIZER_MOCK_NO_MATCH_RATE,
+        )
+        signature_pool = None  # O mock não gera assinaturas
+    else:
+        # Instância do Shazam com a sessão HTTP compartilhada pelos workers
+        shazam = Shazam(http_client=recognizer_http_client)
+        if signature_pool is not None:
+            try:
+                await signature_pool.start()
+            except Exception as e_pool:
+                logger.error(
+                    f"Erro ao iniciar pool de assinaturas: {e_pool}. Gerando assinaturas no loop principal."
+                )
+                signature_pool.shutdown()
+                signature_pool = None
+        recognizer_backend = ShazamBackend(shazam, signature_pool)
+
+    # Iniciar thread para verificar o schedule (somente depois do fork do pool)
+    schedule_thread = threading.Thread(target=run_schedule)
+    schedule_thread.daemon = (
+        True  # Thread será encerrada quando o programa principal terminar
+    )
+    schedule_thread.start()
+
     # Inicializar a fila assíncrona de inserções
     try:
         await insert_queue.start_worker()
@@ -2089,9 +3355,6 @@ async def main():
         logger.error(f"Erro ao executar check_log_table em thread: {e_check_table}")
         logger.warning("Prosseguindo sem verificação da tabela de logs.")
 
-    # Criar instância do Shazam para reconhecimento
-    shazam = Shazam()
-
     global STREAMS
     STREAMS = load_streams()
 
@@ -2104,6 +3367,15 @@ async def main():
     last_songs = load_last_songs()
     tasks = []
 
+    # Agendador central: um heap de prazos e um pool limitado de workers de captura
+    global stream_scheduler
+    stream_scheduler = StreamScheduler(
+        functools.partial(process_stream_cycle, last_songs=last_songs),
+        workers=CAPTURE_WORKERS,
+    )
+    icy_watchers.on_change = on_icy_title_change
+    stream_health.on_open = on_stream_circuit_open
+
     # Inicializar fila para processamento
     global shazam_queue
     shazam_queue = asyncio.Queue()
@@ -2151,24 +3423,50 @@ async def main():
             update_streams_in_db(
                 STREAMS
             )  # Atualiza o banco de dados com as rádios do arquivo
-        # Cancelar todas as tarefas existentes
-        for task in tasks:
-            if not task.done():
-                task.cancel()
-        # Criar novas tarefas para os streams recarregados
-        tasks.clear()
-        # Apenas adicionar tarefas para streams que devem ser processados por este servidor
-        for stream in STREAMS:
-            task = asyncio.create_task(process_stream(stream, last_songs))
-            register_task(task)  # Registrar para controle de finalização
-            tasks.append(task)
-        logger.info(f"{len(tasks)} tasks criadas para os novos streams.")
+        # Encerrar leitores persistentes e monitores ICY de streams que saíram da lista
+        stream_readers.sync_streams(s["name"] for s in STREAMS)
+        icy_watchers.sync_streams(s["name"] for s in STREAMS)
+        stream_resolver.sync_streams(s["url"] for s in STREAMS)
+        stream_health.sync_streams(s["name"] for s in STREAMS)
+        # Sincronizar o agendador: streams existentes mantêm prazo e estado
+        added, removed = stream_scheduler.sync(
+            STREAMS, key_fn=stream_schedule_key, jitter=CAPTURE_START_JITTER
+        )
+        for stream in removed:
+            capture_planner.remove_stream(stream.get("index", stream["name"]))
+            simulcast_detector.remove_stream(stream["name"])
+            airplay_duration_cache.pop(stream["name"], None)
+        plan_recognition_budget()
+        logger.info(
+            f"Agendador sincronizado: {added} streams adicionados, {len(removed)} removidos, {len(stream_scheduler)} no total."
+        )
 
     # Criar e registrar todas as tarefas necessárias
     monitor_task = register_task(
         asyncio.create_task(monitor_streams_file(reload_streams))
     )
-    shazam_task = register_task(asyncio.create_task(identify_song_shazamio(shazam)))
+    shazam_tasks = [
+        register_task(
+            asyncio.create_task(
+                identify_song_shazamio(
+                    recognizer_backend, shazam_rate_limiter, worker_id=worker_id
+                )
+            )
+        )
+        for worker_id in range(1, RECOGNITION_WORKERS + 1)
+    ]
+    logger.info(f"{RECOGNITION_WORKERS} workers de reconhecimento iniciados")
+    shazam_tasks.append(
+        register_task(asyncio.create_task(recognition_retry_queue.run(shazam_queue)))
+    )
+    if deferred_spool is not None:
+        shazam_tasks.append(
+            register_task(
+                asyncio.create_task(
+                    deferred_backfill_worker(shazam_rate_limiter, last_songs)
+                )
+            )
+        )
     shutdown_monitor_task = register_task(asyncio.create_task(monitor_shutdown()))
 
     # Adicionar tarefas de heartbeat e monitoramento de servidores
@@ -2179,7 +3477,7 @@ async def main():
         send_data_task = register_task(asyncio.create_task(send_data_to_db()))
         tasks_to_gather = [
             monitor_task,
-            shazam_task,
+            *shazam_tasks,
             send_data_task,
             shutdown_monitor_task,
             heartbeat_task,
@@ -2188,7 +3486,7 @@ async def main():
     else:
         tasks_to_gather = [
             monitor_task,
-            shazam_task,
+            *shazam_tasks,
             shutdown_monitor_task,
             heartbeat_task,
             server_monitor_task,
@@ -2201,15 +3499,27 @@ async def main():
 
     # Adicionar tarefa para verificar a rotação de streams
     if DISTRIBUTE_LOAD and ENABLE_ROTATION:
-        rotation_task = register_task(asyncio.create_task(check_rotation_schedule()))
+        rotation_task = register_task(
+            asyncio.create_task(check_rotation_schedule(reload_streams))
+        )
         tasks.append(rotation_task)
 
-    # Adicionar tarefas para processar os streams
-    for stream in STREAMS:
-        stream_task = register_task(
-            asyncio.create_task(process_stream(stream, last_songs))
-        )
-        tasks.append(stream_task)
+    if budget_ledger is not None:
+        tasks.append(register_task(asyncio.create_task(budget_ledger_loop())))
+
+    # Sondar todos os streams em paralelo antes (e durante) as capturas
+    if STREAM_HEALTH_CHECK:
+        tasks.append(register_task(asyncio.create_task(stream_health_loop())))
+
+    # Registrar os streams no agendador e iniciar seus workers
+    stream_scheduler.sync(
+        STREAMS, key_fn=stream_schedule_key, jitter=CAPTURE_START_JITTER
+    )
+    plan_recognition_budget()
+    tasks.extend(register_task(task) for task in stream_scheduler.start())
+    logger.info(
+        f"{len(stream_scheduler)} streams agendados para {CAPTURE_WORKERS} workers de captura"
+    )
 
     tasks_to_gather.extend(tasks)
 
@@ -2247,21 +3557,7 @@ if __name__ == "__main__":
     # Configurar temporizador para reinício a cada 30 minutos
     schedule.every(30).minutes.do(stop_and_restart)
 
-    # Iniciar thread para verificar o schedule
-    def run_schedule():
-        while True:
-            try:  # try precisa do bloco indentado
-                schedule.run_pending()
-            except Exception as e:
-                logger.error(f"Erro no thread de schedule: {e}")
-            # Mover sleep para fora do try/except para sempre ocorrer
-            time.sleep(60)  # Verificar a cada minuto
-
-    schedule_thread = threading.Thread(target=run_schedule)
-    schedule_thread.daemon = (
-        True  # Thread será encerrada quando o programa principal terminar
-    )
-    schedule_thread.start()
+    # A thread do schedule é iniciada em main(), depois do pool de assinaturas
 
     # Bloco try/except/finally principal corretamente indentado
     try:
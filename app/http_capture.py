@@ -0,0 +1,310 @@
+"""
+Captura nativa (aiohttp) de streams HTTP MP3/AAC
+Lê N segundos do stream comprimido direto do socket, cortando nos limites de
+frame, sem processo ffmpeg. HLS, playlists e codecs não reconhecidos são
+marcados como não suportados para que a captura volte ao ffmpeg.
+"""
+
+import logging
+from typing import Dict, Any, Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+CODEC_MP3 = "mp3"  # MPEG-1/2/2.5 Layer II/III
+CODEC_AAC = "aac"  # AAC em frames ADTS
+
+# Content-Type -> codec; tipos conhecidos que exigem ffmpeg ficam em UNSUPPORTED_CONTENT_TYPES
+CONTENT_TYPE_CODECS = {
+    "audio/mpeg": CODEC_MP3,
+    "audio/mp3": CODEC_MP3,
+    "audio/mpeg3": CODEC_MP3,
+    "audio/x-mpeg": CODEC_MP3,
+    "audio/aac": CODEC_AAC,
+    "audio/aacp": CODEC_AAC,
+    "audio/x-aac": CODEC_AAC,
+    "audio/x-hx-aac-adts": CODEC_AAC,
+}
+UNSUPPORTED_CONTENT_TYPES = (
+    "mpegurl",  # HLS / m3u
+    "scpls",  # .pls
+    "ogg",
+    "opus",
+    "flac",
+    "video/",
+    "text/html",
+)
+PLAYLIST_EXTENSIONS = (".m3u8", ".m3u", ".pls", ".asx", ".xspf")
+
+# Tabelas do cabeçalho MPEG áudio (kbps por índice; 0 = livre/inválido)
+_MPEG_BITRATES = {
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MPEG_SAMPLE_RATES = {
+    1: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    2.5: [11025, 12000, 8000],
+}
+_ADTS_SAMPLE_RATES = [
+    96000,
+    88200,
+    64000,
+    48000,
+    44100,
+    32000,
+    24000,
+    22050,
+    16000,
+    12000,
+    11025,
+    8000,
+    7350,
+]
+
+MAX_SYNC_SEARCH_BYTES = 256 * 1024  # Sem frames válidos após isso: codec não suportado
+
+
+class UnsupportedStreamError(Exception):
+    """O stream precisa do ffmpeg (HLS, playlist, codec não reconhecido)"""
+
+
+def parse_mp3_header(header: bytes) -> Optional[Tuple[int, int, int]]:
+    """Cabeçalho MPEG áudio Layer II/III: (tamanho do frame, amostras, taxa) ou None"""
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+    version_bits = (header[1] >> 3) & 0x03
+    layer_bits = (header[1] >> 1) & 0x03
+    if version_bits == 1 or layer_bits not in (1, 2):
+        return None  # Versão reservada, Layer I ou reservado
+    version = {0: 2.5, 2: 2, 3: 1}[version_bits]
+    layer = 3 if layer_bits == 1 else 2
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 0x03
+    if bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = _MPEG_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _MPEG_SAMPLE_RATES[version][rate_index]
+    padding = (header[2] >> 1) & 0x01
+    if layer == 3 and version != 1:
+        samples = 576
+        frame_length = 72 * bitrate // sample_rate + padding
+    else:
+        samples = 1152
+        frame_length = 144 * bitrate // sample_rate + padding
+    return frame_length, samples, sample_rate
+
+
+def parse_adts_header(header: bytes) -> Optional[Tuple[int, int, int]]:
+    """Cabeçalho ADTS (AAC): (tamanho do frame, amostras, taxa) ou None"""
+    if len(header) < 7 or header[0] != 0xFF or (header[1] & 0xF6) != 0xF0:
+        return None
+    rate_index = (header[2] >> 2) & 0x0F
+    if rate_index >= len(_ADTS_SAMPLE_RATES):
+        return None
+    frame_length = ((header[3] & 0x03) << 11) | (header[4] << 3) | (header[5] >> 5)
+    if frame_length < 7:
+        return None
+    samples = 1024 * ((header[6] & 0x03) + 1)
+    return frame_length, samples, _ADTS_SAMPLE_RATES[rate_index]
+
+
+_HEADER_PARSERS = {CODEC_MP3: parse_mp3_header, CODEC_AAC: parse_adts_header}
+
+
+def codec_from_content_type(content_type: str) -> Optional[str]:
+    """Codec pelo Content-Type; UnsupportedStreamError para tipos que exigem ffmpeg"""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in CONTENT_TYPE_CODECS:
+        return CONTENT_TYPE_CODECS[content_type]
+    if any(marker in content_type for marker in UNSUPPORTED_CONTENT_TYPES):
+        raise UnsupportedStreamError(f"Content-Type {content_type}")
+    return None  # Desconhecido (ex.: application/octet-stream): detectar pelos bytes
+
+
+class FrameAccumulator:
+    """
+    Acumula frames completos até atingir a duração pedida
+    A sincronização exige dois cabeçalhos válidos consecutivos; bytes entre
+    frames (ID3, lixo após reconexão) são descartados
+    """
+
+    def __init__(self, duration: float, codec: Optional[str] = None):
+        self.duration = duration
+        self.codec = codec
+        self._buffer = bytearray()
+        self._synced = False
+        self.output = bytearray()
+        self.samples = 0
+        self.sample_rate: Optional[int] = None
+        self.frames = 0
+        self.skipped_bytes = 0
+
+    @property
+    def seconds(self) -> float:
+        return self.samples / self.sample_rate if self.sample_rate else 0.0
+
+    def _parse(self, offset: int, codec: str) -> Optional[Tuple[int, int, int]]:
+        return _HEADER_PARSERS[codec](bytes(self._buffer[offset : offset + 7]))
+
+    def _find_sync(self) -> bool:
+        """Procura dois frames consecutivos válidos; descarta os bytes anteriores"""
+        codecs = [self.codec] if self.codec else list(_HEADER_PARSERS)
+        buffer = self._buffer
+        offset = buffer.find(b"\xff")
+        while offset != -1 and offset + 7 <= len(buffer):
+            for codec in codecs:
+                parsed = self._parse(offset, codec)
+                if parsed is None:
+                    continue
+                following = offset + parsed[0]
+                if following + 7 > len(buffer):
+                    return False  # Dados insuficientes para confirmar; aguardar
+                confirm = self._parse(following, codec)
+                if confirm is not None and confirm[2] == parsed[2]:
+                    self.codec = codec
+                    self.skipped_bytes += offset
+                    del buffer[:offset]
+                    self._synced = True
+                    return True
+            offset = buffer.find(b"\xff", offset + 1)
+        # Manter apenas a cauda (um cabeçalho pode estar cortado entre blocos)
+        keep = min(len(buffer), 6)
+        self.skipped_bytes += len(buffer) - keep
+        del buffer[: len(buffer) - keep]
+        return False
+
+    def feed(self, chunk: bytes) -> bool:
+        """Adiciona bytes do stream; retorna True quando a duração foi atingida"""
+        self._buffer.extend(chunk)
+        offset = 0
+        while True:
+            if not self._synced:
+                del self._buffer[:offset]
+                offset = 0
+                if not self._find_sync():
+                    return False
+            parsed = self._parse(offset, self.codec)
+            if parsed is None:
+                self._synced = False  # Perda de sincronismo: procurar o próximo frame
+                offset += 1
+                continue
+            frame_length, samples, sample_rate = parsed
+            if offset + frame_length > len(self._buffer):
+                break  # Frame incompleto: aguardar mais dados
+            self.output.extend(self._buffer[offset : offset + frame_length])
+            offset += frame_length
+            self.samples += samples
+            self.sample_rate = sample_rate
+            self.frames += 1
+            if self.seconds >= self.duration:
+                del self._buffer[:offset]
+                return True
+        del self._buffer[:offset]
+        return False
+
+
+class HttpCapture:
+    """
+    Cliente de captura com uma sessão aiohttp compartilhada
+    URLs sem suporte são lembradas para ir direto ao ffmpeg nas próximas capturas
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 1000,
+        connect_timeout: float = 15.0,
+        read_timeout: float = 30.0,
+        chunk_size: int = 16384,
+    ):
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.chunk_size = chunk_size
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.unsupported: Dict[str, str] = {}  # url -> motivo
+        self.captures = 0
+        self.failures = 0
+        self.bytes_read = 0
+
+    def is_supported(self, url: str) -> bool:
+        if url in self.unsupported:
+            return False
+        path = url.split("?")[0].lower()
+        return path.startswith(("http://", "https://")) and not path.endswith(
+            PLAYLIST_EXTENSIONS
+        )
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_connections, ttl_dns_cache=300
+                ),
+                timeout=aiohttp.ClientTimeout(
+                    total=None,
+                    sock_connect=self.connect_timeout,
+                    sock_read=self.read_timeout,
+                ),
+                headers={"User-Agent": "Mozilla/5.0"},
+            )
+        return self._session
+
+    def _mark_unsupported(self, url: str, reason: str):
+        self.unsupported[url] = reason
+        raise UnsupportedStreamError(reason)
+
+    async def capture(self, url: str, duration: float) -> Tuple[bytes, str, float]:
+        """
+        Lê `duration` segundos de frames completos do stream
+        Retorna (bytes, codec, segundos capturados); UnsupportedStreamError se o
+        stream exigir ffmpeg; outras exceções indicam falha de rede/servidor
+        """
+        session = self._get_session()
+        try:
+            async with session.get(url) as response:
+                response.raise_for_status()
+                try:
+                    codec = codec_from_content_type(
+                        response.headers.get("Content-Type", "")
+                    )
+                except UnsupportedStreamError as e:
+                    self._mark_unsupported(url, str(e))
+
+                accumulator = FrameAccumulator(duration, codec)
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    self.bytes_read += len(chunk)
+                    if accumulator.feed(chunk):
+                        break
+                    if (
+                        accumulator.frames == 0
+                        and accumulator.skipped_bytes > MAX_SYNC_SEARCH_BYTES
+                    ):
+                        self._mark_unsupported(url, "nenhum frame MP3/ADTS encontrado")
+                else:
+                    raise ConnectionError(
+                        f"Stream encerrado após {accumulator.seconds:.1f}s de áudio"
+                    )
+        except UnsupportedStreamError:
+            raise
+        except Exception:
+            self.failures += 1
+            raise
+
+        self.captures += 1
+        return bytes(accumulator.output), accumulator.codec, accumulator.seconds
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "captures": self.captures,
+            "failures": self.failures,
+            "bytes_read": self.bytes_read,
+            "unsupported_urls": len(self.unsupported),
+        }
@@ -0,0 +1,222 @@
+"""
+Monitoramento de metadados ICY (Icecast/Shoutcast) dos streams
+Lê o StreamTitle enviado junto com o áudio e sinaliza as trocas de faixa,
+permitindo capturar o segmento logo após a mudança de música
+"""
+
+import asyncio
+import logging
+import re
+import time
+from typing import Dict, Any, Optional, Iterable, Callable
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+STREAM_TITLE_PATTERN = re.compile(rb"StreamTitle='(.*?)';", re.DOTALL)
+
+
+def parse_stream_title(block: bytes) -> Optional[str]:
+    """Extrai o StreamTitle de um bloco de metadados ICY (None se ausente)"""
+    match = STREAM_TITLE_PATTERN.search(block.rstrip(b"\x00"))
+    if not match:
+        return None
+    raw = match.group(1)
+    try:
+        title = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        title = raw.decode("latin-1")
+    return title.strip()
+
+
+class IcyMetadataWatcher:
+    """
+    Conexão HTTP com `Icy-MetaData: 1` que acompanha o título atual do stream
+    O áudio recebido é descartado; apenas os blocos de metadados são lidos.
+    Streams sem `icy-metaint` são marcados como não suportados e a conexão encerrada.
+    `on_change(name, title)` é chamado a cada troca de faixa.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        stall_timeout: float = 30.0,
+        reconnect_delay: float = 5.0,
+        max_reconnect_delay: float = 120.0,
+        on_change: Optional[Callable[[str, str], None]] = None,
+    ):
+        self.name = name
+        self.url = url
+        self.stall_timeout = stall_timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.on_change = on_change
+        self._task: Optional[asyncio.Task] = None
+        self.supported: Optional[bool] = None  # None = ainda não verificado
+        self.connected = False  # Lendo metadados agora (trocas de título chegam)
+        self.title: Optional[str] = None
+        self.title_changed_at: Optional[float] = None
+        self.change_count = 0
+        self.reconnect_count = 0
+        self.last_error: Optional[str] = None
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Inicia o monitoramento (idempotente; não reinicia streams sem suporte)"""
+        if self.is_running() or self.supported is False:
+            return
+        self._task = asyncio.create_task(self._run(), name=f"icy:{self.name}")
+
+    def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    def _set_title(self, title: str):
+        if title == self.title:
+            return
+        previous = self.title
+        self.title = title
+        if previous is None:
+            # Primeiro título após iniciar: não é uma troca de faixa
+            logger.info(f"Título ICY inicial de {self.name}: {title!r}")
+            return
+        self.title_changed_at = time.time()
+        self.change_count += 1
+        logger.info(f"Troca de faixa em {self.name} (ICY): {previous!r} -> {title!r}")
+        if self.on_change is not None:
+            try:
+                self.on_change(self.name, title)
+            except Exception as e:
+                logger.error(f"Erro ao notificar troca de faixa de {self.name}: {e}")
+
+    async def _read_metadata(self, response: aiohttp.ClientResponse, metaint: int):
+        """Consome o stream alternando blocos de áudio e de metadados"""
+        content = response.content
+        while True:
+            await asyncio.wait_for(
+                content.readexactly(metaint), timeout=self.stall_timeout
+            )
+            length_byte = await asyncio.wait_for(
+                content.readexactly(1), timeout=self.stall_timeout
+            )
+            length = length_byte[0] * 16
+            if length == 0:
+                continue  # Sem alteração de metadados neste intervalo
+            block = await asyncio.wait_for(
+                content.readexactly(length), timeout=self.stall_timeout
+            )
+            title = parse_stream_title(block)
+            if title:
+                self._set_title(title)
+
+    async def _run(self):
+        delay = self.reconnect_delay
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=15)
+        headers = {"Icy-MetaData": "1", "User-Agent": "Mozilla/5.0"}
+        while True:
+            try:
+                async with aiohttp.ClientSession(timeout=timeout) as session:
+                    async with session.get(self.url, headers=headers) as response:
+                        response.raise_for_status()
+                        metaint = response.headers.get("icy-metaint")
+                        if not metaint or not metaint.isdigit() or int(metaint) <= 0:
+                            self.supported = False
+                            logger.info(
+                                f"Stream {self.name} não envia metadados ICY; usando o intervalo fixo de captura"
+                            )
+                            return
+                        self.supported = True
+                        self.last_error = None
+                        delay = self.reconnect_delay
+                        logger.debug(
+                            f"Metadados ICY de {self.name} a cada {metaint} bytes"
+                        )
+                        self.connected = True
+                        await self._read_metadata(response, int(metaint))
+            except asyncio.CancelledError:
+                self.connected = False
+                raise
+            except asyncio.IncompleteReadError:
+                self.last_error = "Stream encerrado (EOF)"
+            except asyncio.TimeoutError:
+                self.last_error = f"Sem dados há {self.stall_timeout}s"
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+
+            self.connected = False
+            self.reconnect_count += 1
+            logger.warning(
+                f"Monitor ICY de {self.name} desconectado ({self.last_error}). "
+                f"Reconectando em {delay:.0f}s"
+            )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "supported": self.supported,
+            "connected": self.connected,
+            "title": self.title,
+            "changes": self.change_count,
+            "last_change_age": (
+                round(time.time() - self.title_changed_at, 1)
+                if self.title_changed_at
+                else None
+            ),
+            "reconnect_count": self.reconnect_count,
+            "last_error": self.last_error,
+        }
+
+
+class IcyMetadataManager:
+    """Gerencia um monitor de metadados ICY por stream"""
+
+    def __init__(
+        self,
+        stall_timeout: float = 30.0,
+        on_change: Optional[Callable[[str, str], None]] = None,
+    ):
+        self.stall_timeout = stall_timeout
+        self.on_change = on_change
+        self.watchers: Dict[str, IcyMetadataWatcher] = {}
+
+    def get_watcher(self, name: str, url: str) -> IcyMetadataWatcher:
+        """Retorna o monitor do stream, criando-o (ou recriando se a URL mudou)"""
+        watcher = self.watchers.get(name)
+        if watcher is not None and watcher.url != url:
+            logger.info(f"URL do stream {name} mudou; recriando monitor ICY")
+            watcher.stop()
+            watcher = None
+        if watcher is None:
+            watcher = IcyMetadataWatcher(
+                name, url, stall_timeout=self.stall_timeout, on_change=self.on_change
+            )
+            self.watchers[name] = watcher
+        watcher.start()
+        return watcher
+
+    def sync_streams(self, active_names: Iterable[str]):
+        """Encerra monitores de streams que não estão mais atribuídos a este servidor"""
+        active = set(active_names)
+        for name in list(self.watchers):
+            if name not in active:
+                self.watchers.pop(name).stop()
+                logger.info(f"Monitor ICY de {name} removido (stream não atribuído)")
+
+    def stop_all(self):
+        for watcher in self.watchers.values():
+            watcher.stop()
+        self.watchers.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        watchers = self.watchers.values()
+        return {
+            "watchers": len(self.watchers),
+            "with_metadata": sum(1 for w in watchers if w.supported),
+            "without_metadata": sum(1 for w in watchers if w.supported is False),
+            "title_changes": sum(w.change_count for w in watchers),
+        }
@@ -0,0 +1,622 @@
+"""
+Componentes do estágio de reconhecimento
+Tarefas enviadas aos workers de identificação, sinal de conclusão por tarefa e
+geração de assinaturas em um pool de processos
+"""
+
+import asyncio
+import collections
+import datetime as dt
+import heapq
+import itertools
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Callable, Dict, Any, Optional, Tuple, Union, List
+
+logger = logging.getLogger(__name__)
+
+# Resultados possíveis de uma tarefa de reconhecimento
+OUTCOME_NEW_SONG = "new_song"  # Música identificada e diferente da anterior do stream
+OUTCOME_DUPLICATE = "duplicate"  # Mesma música da última identificação do stream
+OUTCOME_NO_MATCH = "no_match"  # Shazam respondeu sem música
+OUTCOME_PAUSED = "paused"  # Shazam em pausa (429); segmento não foi reconhecido
+OUTCOME_SKIPPED = "skipped"  # Nada a reconhecer
+OUTCOME_FAILED = "failed"  # Erro ou retentativas esgotadas
+OUTCOME_STALE = "stale"  # Segmento passou do prazo antes de ser reconhecido
+OUTCOME_RETRY = "retry"  # Interno: tarefa reagendada na fila de retentativas
+
+# Motivos para descartar um segmento antes do reconhecimento
+SKIP_SILENCE = "silence"  # Ar morto: silêncio
+SKIP_TONE = "tone"  # Ar morto: tom constante
+SKIP_SPEECH = "speech"  # Fala (locução, noticiário, comerciais)
+SKIP_SAME_SONG = "same_song"  # Continuação da música já identificada
+SKIP_STALE = "stale"  # Passou do prazo na fila (ex.: retentativas)
+SKIP_SIMULCAST = (
+    "simulcast"  # Mesmo áudio de outro stream (reconhecido pelo líder do grupo)
+)
+
+
+@dataclass
+class RecognitionJob:
+    """
+    Segmento capturado aguardando reconhecimento
+    O produtor aguarda apenas `done`, que é resolvido quando esta tarefa termina
+    """
+
+    segment: Any  # CapturedSegment ou None
+    stream: Dict[str, Any]
+    last_songs: Dict[str, Any]
+    enqueued_at: float = field(default_factory=time.time)
+    done: Optional[asyncio.Future] = None
+    deferred: bool = False  # Retirado da fila de adiados (token do Shazam já reservado)
+    deadline: Optional[float] = None  # Após este instante o segmento é descartado
+    attempt: int = 0  # Tentativas de reconhecimento já feitas
+    fingerprint: Any = None  # Landmarks calculados na primeira tentativa
+
+    def __post_init__(self):
+        if self.done is None:
+            self.done = asyncio.get_running_loop().create_future()
+
+    def expired(self, now: Optional[float] = None) -> bool:
+        return self.deadline is not None and (now or time.time()) > self.deadline
+
+    def resolve(self, outcome: str):
+        """Sinaliza o resultado ao produtor (idempotente)"""
+        if not self.done.done():
+            self.done.set_result(outcome)
+
+    async def wait(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Aguarda o resultado desta tarefa; retorna None em caso de timeout"""
+        try:
+            return await asyncio.wait_for(asyncio.shield(self.done), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class RecognitionRetryQueue:
+    """
+    Fila de retentativas com atraso
+    Uma falha transitória reagenda a tarefa para daqui a `base_delay` *
+    2^tentativa segundos (até `max_delay`) e o worker segue para o próximo
+    segmento. `run` devolve as tarefas vencidas à fila de reconhecimento.
+    Tarefas que esgotariam `max_attempts` ou passariam do prazo não são aceitas.
+    """
+
+    def __init__(
+        self, max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 30.0
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._heap: List[Tuple[float, int, RecognitionJob]] = []
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self.stats = {"scheduled": 0, "requeued": 0, "exhausted": 0, "expired": 0}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, job: RecognitionJob) -> Optional[float]:
+        """Reagenda a tarefa; retorna o atraso ou None se ela deve ser abandonada"""
+        if job.attempt + 1 >= self.max_attempts:
+            self.stats["exhausted"] += 1
+            return None
+        delay = min(self.base_delay * 2**job.attempt, self.max_delay)
+        due = time.time() + delay
+        if job.deadline is not None and due > job.deadline:
+            self.stats["expired"] += 1
+            return None
+        job.attempt += 1
+        heapq.heappush(self._heap, (due, next(self._sequence), job))
+        self.stats["scheduled"] += 1
+        self._wakeup.set()
+        return delay
+
+    async def run(self, queue: asyncio.Queue):
+        """Devolve à `queue` as tarefas cujo atraso terminou"""
+        while True:
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, job = heapq.heappop(self._heap)
+                queue.put_nowait(job)
+                self.stats["requeued"] += 1
+            timeout = self._heap[0][0] - now if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._heap),
+            "next_due_in": (
+                round(max(0.0, self._heap[0][0] - time.time()), 1)
+                if self._heap
+                else None
+            ),
+            **self.stats,
+        }
+
+
+class SkippedSegmentCounter:
+    """
+    Contagem, por stream e por motivo, dos segmentos descartados sem reconhecimento
+    `on_record(stream, motivo)` é chamado a cada descarte (ex.: contabilidade do orçamento)
+    """
+
+    def __init__(self, on_record: Optional[Callable[[str, str], None]] = None):
+        self.counts: Dict[str, collections.Counter] = collections.defaultdict(
+            collections.Counter
+        )
+        self.on_record = on_record
+
+    def record(self, stream_name: str, reason: str):
+        self.counts[stream_name][reason] += 1
+        if self.on_record is not None:
+            self.on_record(stream_name, reason)
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        return {name: dict(counter) for name, counter in self.counts.items()}
+
+    def total(self) -> int:
+        return sum(sum(counter.values()) for counter in self.counts.values())
+
+
+def parse_track_metadata(track: Dict[str, Any]) -> Dict[str, Any]:
+    """Extrai os campos gravados no music_log da resposta `track` do Shazam"""
+    label = None
+    genre = None
+    if "sections" in track:
+        for section in track["sections"]:
+            if section.get("type") == "SONG":
+                for metadata in section.get("metadata", []):
+                    if metadata.get("title") == "Label":
+                        label = metadata.get("text")
+    if "genres" in track:
+        genre = track["genres"].get("primary", None)
+    return {
+        "key": track.get("key"),
+        "title": track["title"],
+        "artist": track["subtitle"],
+        "isrc": track.get("isrc", "ISRC não disponível"),
+        "label": label,
+        "genre": genre,
+    }
+
+
+@dataclass
+class _CacheEntry:
+    metadata: Dict[str, Any]
+    postings: List[Tuple[int, int]]  # (hash, frame) na linha do tempo da entrada
+    next_base: int = 0  # Frame inicial do próximo trecho adicionado
+    created_at: float = field(default_factory=time.time)
+    hits: int = 0
+
+
+class RecognitionCache:
+    """
+    Cache local de reconhecimentos indexado por landmarks de áudio
+    Cada música reconhecida guarda os hashes dos trechos capturados; um novo
+    segmento que compartilha hashes alinhados no tempo com uma entrada é
+    resolvido localmente, sem chamar o Shazam. Limitado por LRU e TTL.
+    """
+
+    # Hashes alinhados necessários para aceitar um acerto (evita falsos positivos)
+    MIN_ALIGNED_MATCHES = 25
+    MIN_MATCH_RATIO = 0.05
+    # Um acerto precisa ser claramente melhor que a segunda melhor música
+    MIN_MARGIN = 2.0
+
+    def __init__(
+        self,
+        max_entries: int = 2000,
+        ttl_seconds: int = 86400,
+        max_postings_per_entry: int = 6000,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_postings_per_entry = max_postings_per_entry
+        self._entries: "collections.OrderedDict[str, _CacheEntry]" = (
+            collections.OrderedDict()
+        )
+        self._index: Dict[int, List[Tuple[str, int]]] = {}
+        self.stats = {"lookups": 0, "hits": 0, "stores": 0, "evictions": 0}
+
+    @staticmethod
+    def track_key(metadata: Dict[str, Any]) -> str:
+        return metadata.get("key") or f"{metadata['artist']}|{metadata['title']}"
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for h, _ in entry.postings:
+            postings = self._index.get(h)
+            if not postings:
+                continue
+            postings[:] = [p for p in postings if p[0] != key]
+            if not postings:
+                del self._index[h]
+        self.stats["evictions"] += 1
+
+    def _expire(self):
+        if not self.ttl_seconds:
+            return
+        deadline = time.time() - self.ttl_seconds
+        for key in [k for k, e in self._entries.items() if e.created_at < deadline]:
+            self._remove(key)
+
+    def lookup(self, hashes, frames) -> Optional[Dict[str, Any]]:
+        """Retorna os metadados da música se o áudio corresponder a uma entrada"""
+        self.stats["lookups"] += 1
+        self._expire()
+        if len(hashes) == 0 or not self._entries:
+            return None
+
+        # Histograma de deslocamentos por música: (música, frame_entrada - frame_consulta)
+        votes = collections.Counter()
+        for h, frame in zip(hashes.tolist(), frames.tolist()):
+            for key, entry_frame in self._index.get(h, ()):
+                votes[(key, (entry_frame - frame) // 2)] += 1
+        if not votes:
+            return None
+
+        best_per_track: Dict[str, int] = {}
+        for (key, _), count in votes.items():
+            if count > best_per_track.get(key, 0):
+                best_per_track[key] = count
+        ranked = sorted(best_per_track.items(), key=lambda kv: kv[1], reverse=True)
+        best_key, best_count = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0
+
+        if (
+            best_count < self.MIN_ALIGNED_MATCHES
+            or best_count < self.MIN_MATCH_RATIO * len(hashes)
+            or best_count < self.MIN_MARGIN * runner_up
+        ):
+            return None
+
+        entry = self._entries[best_key]
+        entry.hits += 1
+        self._entries.move_to_end(best_key)
+        self.stats["hits"] += 1
+        logger.debug(
+            f"Cache de reconhecimento: {best_key} com {best_count} hashes alinhados "
+            f"(de {len(hashes)}; segundo melhor: {runner_up})"
+        )
+        return dict(entry.metadata)
+
+    def store(self, metadata: Dict[str, Any], hashes, frames):
+        """Adiciona o trecho reconhecido à entrada da música (criando-a se necessário)"""
+        if len(hashes) == 0 or self.max_entries <= 0:
+            return
+        key = self.track_key(metadata)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = _CacheEntry(metadata=dict(metadata), postings=[])
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+        else:
+            entry.metadata = dict(metadata)
+        self._entries.move_to_end(key)
+
+        room = self.max_postings_per_entry - len(entry.postings)
+        if room <= 0:
+            return
+        # Cada trecho ocupa uma faixa própria (e distante) da linha do tempo da entrada
+        base = entry.next_base
+        new_postings = [
+            (h, base + frame)
+            for h, frame in zip(hashes[:room].tolist(), frames[:room].tolist())
+        ]
+        entry.next_base = base + int(frames.max()) + 1000
+        entry.postings.extend(new_postings)
+        for h, frame in new_postings:
+            self._index.setdefault(h, []).append((key, frame))
+        self.stats["stores"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["lookups"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "hashes": sum(len(e.postings) for e in self._entries.values()),
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
+
+
+class ShazamRateLimiter:
+    """
+    Rate limiter por token bucket para as requisições ao Shazam
+    Reposição fracionária contínua (O(1) por chamada) e pausa com backoff
+    exponencial após erros 429. Uma única instância deve ser compartilhada por
+    todos os workers do loop: a contabilidade não tem `await` entre leitura e
+    escrita, e quem precisa esperar reserva o token antes de dormir, sem
+    bloquear os demais chamadores.
+    """
+
+    def __init__(
+        self,
+        max_requests_per_minute: float = 20,
+        burst: Optional[int] = None,
+        pause_duration: int = 120,
+        max_pause_duration: int = 1800,
+    ):
+        self.max_requests_per_minute = max_requests_per_minute
+        self.rate_per_second = max_requests_per_minute / 60.0
+        self.capacity = float(burst if burst else max(1, int(max_requests_per_minute)))
+        self.pause_duration = pause_duration  # em segundos
+        self.max_pause_duration = max_pause_duration
+        self.tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self.pause_until_timestamp = 0.0
+        self.consecutive_429_count = 0
+        self.metrics = {
+            "acquired": 0,
+            "rejected": 0,
+            "paused_rejections": 0,
+            "total_wait_time": 0.0,
+            "max_wait_time": 0.0,
+            "waiting": 0,
+            "total_429": 0,
+        }
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate_per_second)
+
+    def is_paused(self) -> bool:
+        return time.time() < self.pause_until_timestamp
+
+    def pause_until_str(self) -> str:
+        return dt.datetime.fromtimestamp(self.pause_until_timestamp).strftime(
+            "%H:%M:%S"
+        )
+
+    def try_acquire(self) -> bool:
+        """Consome um token se houver um disponível agora (não bloqueia)"""
+        if self.is_paused():
+            self.metrics["paused_rejections"] += 1
+            return False
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.metrics["acquired"] += 1
+            return True
+        self.metrics["rejected"] += 1
+        return False
+
+    async def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        Aguarda um token por até `timeout` segundos (None = sem limite)
+        Retorna False se o Shazam estiver em pausa ou o tempo de espera exceder o timeout
+        """
+        if self.is_paused():
+            self.metrics["paused_rejections"] += 1
+            return False
+        self._refill()
+        wait_time = max(0.0, (1 - self.tokens) / self.rate_per_second)
+        if timeout is not None and wait_time > timeout:
+            self.metrics["rejected"] += 1
+            return False
+
+        # Reservar o token antes de dormir (o saldo pode ficar negativo)
+        self.tokens -= 1
+        if wait_time > 0:
+            self.metrics["waiting"] += 1
+            try:
+                await asyncio.sleep(wait_time)
+            except asyncio.CancelledError:
+                self.tokens += 1
+                raise
+            finally:
+                self.metrics["waiting"] -= 1
+            self.metrics["total_wait_time"] += wait_time
+            self.metrics["max_wait_time"] = max(
+                self.metrics["max_wait_time"], wait_time
+            )
+            if self.is_paused():
+                # Um 429 ocorreu durante a espera; devolver a reserva
+                self.tokens += 1
+                self.metrics["paused_rejections"] += 1
+                return False
+
+        self.metrics["acquired"] += 1
+        return True
+
+    async def wait_if_needed(self):
+        """Compatibilidade: retorna (True, None) ou (False, horário_fim_da_pausa)"""
+        if await self.acquire():
+            return True, None
+        return False, self.pause_until_str()
+
+    def record_success(self):
+        self.consecutive_429_count = 0  # Resetar contador de erros 429 consecutivos
+
+    def record_429_error(self):
+        self.consecutive_429_count += 1
+        self.metrics["total_429"] += 1
+
+        # Aumentar o tempo de pausa exponencialmente com base no número de erros 429 consecutivos
+        pause_time = min(
+            self.pause_duration * (2 ** (self.consecutive_429_count - 1)),
+            self.max_pause_duration,
+        )
+        self.pause_until_timestamp = time.time() + pause_time
+        # Ao retomar, começar sem rajada acumulada
+        self.tokens = min(self.tokens, 0.0)
+
+        logger.warning(
+            f"Erro 429 consecutivo #{self.consecutive_429_count}. Pausando Shazam por {pause_time}s (até {self.pause_until_str()})"
+        )
+        return pause_time
+
+    def get_metrics(self) -> Dict[str, Any]:
+        self._refill()
+        acquired = self.metrics["acquired"]
+        return {
+            "tokens_available": round(max(self.tokens, 0.0), 2),
+            "capacity": self.capacity,
+            "rate_per_minute": self.max_requests_per_minute,
+            "acquired": acquired,
+            "rejected": self.metrics["rejected"],
+            "paused_rejections": self.metrics["paused_rejections"],
+            "waiting": self.metrics["waiting"],
+            "avg_wait_time": round(
+                self.metrics["total_wait_time"] / acquired if acquired else 0.0, 2
+            ),
+            "max_wait_time": round(self.metrics["max_wait_time"], 2),
+            "paused": self.is_paused(),
+            "pause_until": self.pause_until_str() if self.is_paused() else None,
+            "consecutive_429": self.consecutive_429_count,
+            "total_429": self.metrics["total_429"],
+        }
+
+
+def available_cpus() -> int:
+    """Número de núcleos disponíveis para o container (respeita cpuset/affinity)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def _generate_signature(audio: Union[bytes, str]) -> Tuple[str, int, int]:
+    """
+    Executado nos processos do pool: decodifica o áudio e calcula a assinatura
+    Retorna apenas os campos necessários para a requisição (payload pequeno)
+    """
+    from shazamio_core import Recognizer
+
+    async def run():
+        recognizer = Recognizer()
+        if isinstance(audio, (bytes, bytearray)):
+            return await recognizer.recognize_bytes(value=bytes(audio))
+        return await recognizer.recognize_path(value=audio)
+
+    try:
+        sig = asyncio.run(run())
+    except Exception as e:
+        # Exceções do núcleo em Rust não são serializáveis entre processos
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+    return sig.signature.uri, sig.signature.samples, sig.timestamp
+
+
+def _warmup() -> int:
+    return os.getpid()
+
+
+class SignaturePool:
+    """
+    Pool de processos para geração de assinaturas de áudio
+    Libera o loop asyncio durante a decodificação/fingerprint; apenas a
+    requisição HTTP com a assinatura é feita no processo principal
+    """
+
+    def __init__(self, processes: int):
+        self.processes = processes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.stats = {
+            "signatures": 0,
+            "errors": 0,
+            "pool_failures": 0,
+            "avg_signature_ms": 0.0,
+        }
+
+    def _create_executor(self):
+        # fork evita reimportar o módulo principal (e sua configuração global) nos filhos;
+        # só é seguro enquanto o processo ainda não tem outras threads
+        try:
+            context = multiprocessing.get_context("fork")
+        except ValueError:
+            context = None
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=context
+        )
+
+    async def start(self):
+        """
+        Cria o pool e inicia os processos antecipadamente
+        Deve ser chamado antes de qualquer thread ser criada no processo
+        """
+        if self._executor is None:
+            self._create_executor()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(self._executor, _warmup)
+                for _ in range(self.processes)
+            )
+        )
+        logger.info(f"Pool de assinaturas iniciado com {self.processes} processos")
+
+    async def generate(self, audio: Union[bytes, str]) -> SimpleNamespace:
+        """Gera a assinatura em um processo do pool"""
+        if self._executor is None:
+            raise RuntimeError("Pool de assinaturas não iniciado")
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            uri, samples, timestamp = await loop.run_in_executor(
+                self._executor, _generate_signature, audio
+            )
+        except BrokenProcessPool:
+            self.stats["errors"] += 1
+            self.stats["pool_failures"] += 1
+            # Recriar o pool agora exigiria fork a partir de um processo com threads;
+            # desativa o pool e as próximas assinaturas são geradas no loop principal
+            logger.error(
+                "Pool de assinaturas interrompido; gerando assinaturas no loop principal"
+            )
+            self.shutdown()
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats["signatures"] += 1
+        # Média móvel simples do tempo de geração
+        self.stats["avg_signature_ms"] += (
+            elapsed_ms - self.stats["avg_signature_ms"]
+        ) / min(self.stats["signatures"], 100)
+
+        # Mesma estrutura de shazamio_core.Signature usada por send_recognize_request_v2
+        return SimpleNamespace(
+            timestamp=timestamp,
+            signature=SimpleNamespace(uri=uri, samples=samples, timestamp=timestamp),
+        )
+
+    async def recognize(self, shazam, audio: Union[bytes, str]) -> Dict[str, Any]:
+        """Equivalente a shazam.recognize(audio) com a assinatura gerada no pool"""
+        if self._executor is None:
+            # Pool desativado após falha: assinatura gerada pelo próprio shazamio
+            return await shazam.recognize(audio)
+        sig = await self.generate(audio)
+        return await shazam.send_recognize_request_v2(sig=sig)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "avg_signature_ms": round(self.stats["avg_signature_ms"], 1),
+            "processes": self.processes,
+            "active": self._executor is not None,
+        }
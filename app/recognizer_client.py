@@ -0,0 +1,182 @@
+"""
+Cliente HTTP compartilhado para as requisições de reconhecimento
+Substitui o cliente padrão do shazamio (uma sessão e um handshake TLS por
+requisição) por uma sessão aiohttp de longa duração com keep-alive, conexões
+limitadas e cache de DNS, e mede cada requisição por fase.
+"""
+
+import logging
+import time
+from types import SimpleNamespace
+from typing import Dict, Any, List, Optional, Union
+
+import aiohttp
+from shazamio.exceptions import BadMethod
+from shazamio.interfaces.client import HTTPClientInterface
+from shazamio.utils import validate_json
+
+logger = logging.getLogger(__name__)
+
+# Fases medidas em cada requisição (ms)
+TIMING_PHASES = ("queue", "dns", "connect", "send", "wait", "read", "total")
+# Marcas registradas pelos sinais de trace do aiohttp
+_TIMING_MARKS = (
+    "queued_start",
+    "queued_end",
+    "dns_start",
+    "dns_end",
+    "connect_start",
+    "connect_end",
+    "reused",
+    "sent",
+    "response",
+)
+
+
+class RecognizerHttpClient(HTTPClientInterface):
+    """
+    Implementação de HTTPClientInterface do shazamio (Shazam(http_client=...))
+
+    - uma única sessão para todos os workers; conexões reaproveitadas por
+      `keepalive_timeout` segundos, até `max_connections` simultâneas
+    - sem retentativas internas: 429 e demais erros HTTP são levantados como
+      ClientResponseError para o tratamento do worker (pausa, fila de retentativas)
+    - fases: fila do pool, DNS, conexão (TCP + TLS; zero quando reaproveitada),
+      envio, espera pela resposta e leitura do corpo
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 10,
+        keepalive_timeout: float = 60.0,
+        dns_ttl: int = 300,
+        connect_timeout: float = 10.0,
+        timeout: float = 20.0,
+    ):
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_ttl = dns_ttl
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._trace = aiohttp.TraceConfig()
+        for signal, mark in (
+            (self._trace.on_connection_queued_start, "queued_start"),
+            (self._trace.on_connection_queued_end, "queued_end"),
+            (self._trace.on_dns_resolvehost_start, "dns_start"),
+            (self._trace.on_dns_resolvehost_end, "dns_end"),
+            (self._trace.on_connection_create_start, "connect_start"),
+            (self._trace.on_connection_create_end, "connect_end"),
+            (self._trace.on_connection_reuseconn, "reused"),
+            (self._trace.on_request_chunk_sent, "sent"),
+            (self._trace.on_request_end, "response"),
+        ):
+            signal.append(self._mark(mark))
+        self.requests = 0
+        self.errors = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self._totals = {phase: 0.0 for phase in TIMING_PHASES}
+        self._max = {phase: 0.0 for phase in TIMING_PHASES}
+        self.last_timing: Optional[Dict[str, float]] = None
+
+    @staticmethod
+    def _mark(name: str):
+        async def on_signal(session, trace_config_ctx, params):
+            timing = trace_config_ctx.trace_request_ctx
+            if isinstance(timing, SimpleNamespace):
+                setattr(timing, name, time.perf_counter())
+
+        return on_signal
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_connections,
+                    keepalive_timeout=self.keepalive_timeout,
+                    ttl_dns_cache=self.dns_ttl,
+                ),
+                timeout=aiohttp.ClientTimeout(
+                    total=self.timeout, sock_connect=self.connect_timeout
+                ),
+                trace_configs=[self._trace],
+            )
+        return self._session
+
+    def _record(self, timing: SimpleNamespace, finished: float):
+        """Converte as marcas de tempo da requisição em duração por fase"""
+        queued = dns = connect = 0.0
+        if timing.queued_end is not None:
+            queued = timing.queued_end - timing.queued_start
+        if timing.dns_end is not None:
+            dns = timing.dns_end - timing.dns_start
+        connected = timing.connect_end
+        if connected is not None:
+            connect = connected - timing.connect_start - dns  # O DNS ocorre dentro
+        ready = connected or timing.reused or timing.start
+        sent = timing.sent or ready
+        response = timing.response or finished
+        phases = {
+            "queue": queued,
+            "dns": dns,
+            "connect": max(connect, 0.0),
+            "send": max(sent - ready, 0.0),
+            "wait": max(response - sent, 0.0),
+            "read": max(finished - response, 0.0),
+            "total": finished - timing.start,
+        }
+        if connected:
+            self.new_connections += 1
+        else:
+            self.reused_connections += 1
+        self.last_timing = {k: round(v * 1000, 1) for k, v in phases.items()}
+        for phase, value in phases.items():
+            self._totals[phase] += value
+            self._max[phase] = max(self._max[phase], value)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        *args,
+        **kwargs,
+    ) -> Union[List[Any], Dict[str, Any]]:
+        if method.upper() not in ("GET", "POST"):
+            raise BadMethod("Accept only GET/POST")
+        timing = SimpleNamespace(
+            start=time.perf_counter(), **{mark: None for mark in _TIMING_MARKS}
+        )
+        self.requests += 1
+        try:
+            async with self._get_session().request(
+                method.upper(), url, trace_request_ctx=timing, **kwargs
+            ) as response:
+                response.raise_for_status()
+                result = await validate_json(response, *args)
+        except Exception:
+            self.errors += 1
+            raise
+        self._record(timing, time.perf_counter())
+        return result
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        timed = self.new_connections + self.reused_connections
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "new_connections": self.new_connections,
+            "reused_connections": self.reused_connections,
+            "avg_ms": {
+                phase: round(total * 1000 / timed, 1) if timed else 0.0
+                for phase, total in self._totals.items()
+            },
+            "max_ms": {
+                phase: round(value * 1000, 1) for phase, value in self._max.items()
+            },
+            "last_ms": self.last_timing,
+        }
@@ -0,0 +1,184 @@
+"""
+Backends de reconhecimento
+Os workers dependem apenas de `recognize(audio) -> Match | None`; o backend
+Shazam adapta a resposta do shazamio e o backend mock responde localmente, a
+partir de um catálogo, para testes de carga sem rede.
+"""
+
+import asyncio
+import dataclasses
+import json
+import logging
+import random
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Union
+
+from aiohttp import ClientResponseError
+
+from recognition import parse_track_metadata
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitedError(Exception):
+    """O backend recusou a requisição por excesso de uso (HTTP 429 no Shazam)"""
+
+
+@dataclass
+class Match:
+    """Música identificada (mesmos campos gravados no music_log)"""
+
+    title: str
+    artist: str
+    isrc: str = "ISRC não disponível"
+    label: Optional[str] = None
+    genre: Optional[str] = None
+    key: Optional[str] = None
+
+    @classmethod
+    def from_metadata(cls, metadata: Dict[str, Any]) -> "Match":
+        fields = {f.name for f in dataclasses.fields(cls)}
+        return cls(**{k: v for k, v in metadata.items() if k in fields})
+
+    def as_metadata(self) -> Dict[str, Any]:
+        return dataclasses.asdict(self)
+
+
+class RecognizerBackend:
+    """
+    Interface dos backends
+    `recognize` recebe os bytes ou o caminho do segmento e retorna a música ou
+    None (sem match); RateLimitedError indica 429, demais exceções são falhas
+    transitórias (rede, timeout, erro do servidor)
+    """
+
+    name = "base"
+
+    async def recognize(self, audio: Union[bytes, str]) -> Optional[Match]:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+class ShazamBackend(RecognizerBackend):
+    """shazamio.Shazam, com a assinatura gerada no pool de processos quando houver"""
+
+    name = "shazam"
+
+    def __init__(self, shazam, signature_pool=None):
+        self.shazam = shazam
+        self.signature_pool = signature_pool
+        self.requests = 0
+        self.matches = 0
+
+    async def recognize(self, audio: Union[bytes, str]) -> Optional[Match]:
+        self.requests += 1
+        try:
+            if self.signature_pool is not None:
+                out = await self.signature_pool.recognize(self.shazam, audio)
+            else:
+                out = await self.shazam.recognize(audio)
+        except ClientResponseError as e:
+            if e.status == 429:
+                raise RateLimitedError(f"HTTP 429: {e.message}") from e
+            raise
+        if "track" not in out:
+            return None
+        self.matches += 1
+        return Match.from_metadata(parse_track_metadata(out["track"]))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "requests": self.requests,
+            "matches": self.matches,
+        }
+
+
+def default_catalog(size: int = 200) -> List[Match]:
+    """Catálogo sintético usado quando nenhum arquivo de fixtures é informado"""
+    return [
+        Match(
+            title=f"Faixa de teste {i:03d}",
+            artist=f"Artista de teste {i % 40:02d}",
+            isrc=f"BRXTS26{i:05d}",
+            label="Gravadora de teste",
+            genre=("Sertanejo", "Pop", "Rock", "Gospel", "Funk")[i % 5],
+            key=f"mock-{i}",
+        )
+        for i in range(size)
+    ]
+
+
+def load_catalog(path: str) -> List[Match]:
+    """Fixtures em JSON: lista de objetos com title e artist (isrc, label, genre opcionais)"""
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    catalog = [Match.from_metadata(entry) for entry in entries]
+    if not catalog:
+        raise ValueError(f"Catálogo vazio: {path}")
+    return catalog
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class MockRecognizerBackend(RecognizerBackend):
+    """
+    Backend local e determinístico para testes de carga (sem rede)
+    A resposta depende só do conteúdo do áudio (CRC32): o mesmo segmento resulta
+    sempre na mesma música do catálogo, ou em nenhuma na fração `no_match_rate`.
+    `latency` simula o tempo de resposta e `rate_limit_rate` a fração de 429s.
+    """
+
+    name = "mock"
+
+    def __init__(
+        self,
+        catalog: Optional[List[Match]] = None,
+        latency: float = 0.2,
+        rate_limit_rate: float = 0.0,
+        no_match_rate: float = 0.2,
+        seed: Optional[int] = None,
+    ):
+        self.catalog = catalog or default_catalog()
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.no_match_rate = no_match_rate
+        self._random = random.Random(seed)
+        self.requests = 0
+        self.matches = 0
+        self.rate_limited = 0
+
+    async def recognize(self, audio: Union[bytes, str]) -> Optional[Match]:
+        self.requests += 1
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        if self._random.random() < self.rate_limit_rate:
+            self.rate_limited += 1
+            raise RateLimitedError("429 simulado pelo backend mock")
+        if isinstance(audio, (bytes, bytearray)):
+            data = bytes(audio)
+        else:
+            data = await asyncio.to_thread(_read_file, audio)
+        digest = zlib.crc32(data)
+        if digest % 10000 < self.no_match_rate * 10000:
+            return None
+        self.matches += 1
+        return self.catalog[(digest // 10000) % len(self.catalog)]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "catalog": len(self.catalog),
+            "requests": self.requests,
+            "matches": self.matches,
+            "rate_limited": self.rate_limited,
+        }
@@ -0,0 +1,207 @@
+"""
+Detecção de streams em simulcast (afiliadas que retransmitem o mesmo áudio)
+Compara os landmarks de cada segmento com os segmentos recentes dos outros
+streams; pares que coincidem em capturas sucessivas formam um grupo. Apenas o
+líder do grupo é reconhecido e o resultado é replicado para os demais.
+"""
+
+import collections
+import logging
+import threading
+import time
+from typing import Dict, Any, FrozenSet, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SimulcastDetector:
+    """
+    Grupos de streams com o mesmo áudio
+
+    - `observe` registra os landmarks do segmento de um stream e retorna os
+      streams cujo segmento recente (até `max_age` segundos) contém o mesmo
+      trecho (hashes alinhados no tempo, como no RecognitionCache)
+    - `confirmations` coincidências seguidas ligam um par; uma captura quase
+      simultânea (até `overlap_window` segundos) sem coincidência desfaz o par
+    - o líder de cada grupo é escolhido entre os membros capturados nos
+      últimos `leader_timeout` segundos e mantido enquanto estiver ativo
+    """
+
+    MIN_ALIGNED_MATCHES = 25
+    MIN_MATCH_RATIO = 0.05
+
+    def __init__(
+        self,
+        confirmations: int = 3,
+        max_age: float = 60.0,
+        overlap_window: float = 10.0,
+        leader_timeout: float = 600.0,
+    ):
+        self.confirmations = max(1, confirmations)
+        self.max_age = max_age
+        self.overlap_window = overlap_window
+        self.leader_timeout = leader_timeout
+        # observe roda em threads (asyncio.to_thread); reentrante porque leader
+        # e followers chamam group
+        self._lock = threading.RLock()
+        self._fingerprints: Dict[str, Tuple[float, List[Tuple[int, int]]]] = {}
+        self._index: Dict[int, List[Tuple[str, int]]] = {}
+        self._pairs: Dict[FrozenSet[str], int] = {}  # coincidências seguidas por par
+        self._last_seen: Dict[str, float] = {}
+        self._leaders: Set[str] = set()
+        self.observations = 0
+        self.matches = 0
+
+    def _drop_fingerprint(self, stream: str):
+        previous = self._fingerprints.pop(stream, None)
+        if previous is None:
+            return
+        for h, _ in previous[1]:
+            postings = self._index.get(h)
+            if not postings:
+                continue
+            postings[:] = [p for p in postings if p[0] != stream]
+            if not postings:
+                del self._index[h]
+
+    def _expire(self, now: float):
+        for stream in [
+            s for s, (at, _) in self._fingerprints.items() if now - at > self.max_age
+        ]:
+            self._drop_fingerprint(stream)
+
+    def _linked(self, pair: FrozenSet[str]) -> bool:
+        return self._pairs.get(pair, 0) >= self.confirmations
+
+    def observe(self, stream: str, hashes, frames, captured_at: float) -> Set[str]:
+        """Registra o segmento e retorna os streams com o mesmo trecho de áudio"""
+        with self._lock:
+            self.observations += 1
+            self._drop_fingerprint(stream)
+            self._expire(captured_at)
+            hashes = hashes.tolist()
+            frames = frames.tolist()
+
+            # Histograma de deslocamentos por stream: (stream, frame_outro - frame_atual)
+            votes = collections.Counter()
+            for h, frame in zip(hashes, frames):
+                for other, other_frame in self._index.get(h, ()):
+                    votes[(other, (other_frame - frame) // 2)] += 1
+            best: Dict[str, int] = {}
+            for (other, _), count in votes.items():
+                best[other] = max(best.get(other, 0), count)
+
+            matched = set()
+            for other, count in best.items():
+                other_size = len(self._fingerprints[other][1])
+                if (
+                    count >= self.MIN_ALIGNED_MATCHES
+                    and count >= self.MIN_MATCH_RATIO * min(len(hashes), other_size)
+                ):
+                    matched.add(other)
+
+            for other in matched:
+                pair = frozenset((stream, other))
+                was_linked = self._linked(pair)
+                self._pairs[pair] = min(
+                    self._pairs.get(pair, 0) + 1, self.confirmations
+                )
+                if not was_linked and self._linked(pair):
+                    logger.info(f"Simulcast detectado: {stream} e {other}")
+            self.matches += len(matched)
+
+            # Capturas quase simultâneas sem o mesmo áudio desfazem o par
+            for pair in [p for p in self._pairs if stream in p]:
+                (other,) = pair - {stream}
+                fingerprint = self._fingerprints.get(other)
+                if (
+                    other not in matched
+                    and fingerprint is not None
+                    and abs(fingerprint[0] - captured_at) <= self.overlap_window
+                ):
+                    if self._linked(pair):
+                        logger.info(
+                            f"Simulcast desfeito: {stream} e {other} com áudio diferente"
+                        )
+                    del self._pairs[pair]
+
+            postings = list(zip(hashes, frames))
+            self._fingerprints[stream] = (captured_at, postings)
+            for h, frame in postings:
+                self._index.setdefault(h, []).append((stream, frame))
+            self._last_seen[stream] = captured_at
+            return matched
+
+    def _linked_pairs(self) -> List[FrozenSet[str]]:
+        # Chamado com self._lock
+        return [p for p, n in self._pairs.items() if n >= self.confirmations]
+
+    def group(self, stream: str) -> List[str]:
+        """Membros do grupo do stream (incluindo ele), em ordem"""
+        with self._lock:
+            linked = self._linked_pairs()
+            members = {stream}
+            pending = [stream]
+            while pending:
+                current = pending.pop()
+                for pair in linked:
+                    if current in pair:
+                        for member in pair - members:
+                            members.add(member)
+                            pending.append(member)
+            return sorted(members)
+
+    def leader(self, stream: str, now: Optional[float] = None) -> str:
+        """Stream do grupo que é reconhecido em nome dos demais"""
+        with self._lock:
+            members = self.group(stream)
+            if len(members) == 1:
+                return stream
+            now = now or time.time()
+            active = [
+                m
+                for m in members
+                if now - self._last_seen.get(m, 0) <= self.leader_timeout
+            ]
+            current = [m for m in active if m in self._leaders]
+            if current:
+                return current[0]
+            leader = (active or members)[0]
+            self._leaders.difference_update(members)
+            self._leaders.add(leader)
+            return leader
+
+    def followers(self, stream: str) -> List[str]:
+        """Demais membros do grupo quando `stream` é o líder (vazio caso contrário)"""
+        with self._lock:
+            if self.leader(stream) != stream:
+                return []
+            return [m for m in self.group(stream) if m != stream]
+
+    def remove_stream(self, stream: str):
+        with self._lock:
+            self._drop_fingerprint(stream)
+            for pair in [p for p in self._pairs if stream in p]:
+                del self._pairs[pair]
+            self._last_seen.pop(stream, None)
+            self._leaders.discard(stream)
+
+    def get_stats(self) -> Dict[str, Any]:
+        groups = []
+        seen: Set[str] = set()
+        with self._lock:
+            linked = self._linked_pairs()
+            for pair in linked:
+                for stream in pair:
+                    if stream not in seen:
+                        members = self.group(stream)
+                        seen.update(members)
+                        groups.append(members)
+            candidate_pairs = len(self._pairs) - len(linked)
+        return {
+            "groups": groups,
+            "grouped_streams": len(seen),
+            "candidate_pairs": candidate_pairs,
+            "observations": self.observations,
+            "matches": self.matches,
+        }
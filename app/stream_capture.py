@@ -0,0 +1,487 @@
+"""
+Leitores persistentes de streams de áudio
+Mantém uma conexão ffmpeg por stream e um buffer circular em memória com os
+últimos N segundos de áudio, evitando um novo spawn/handshake a cada ciclo
+"""
+
+import asyncio
+import collections
+import io
+import logging
+import os
+import time
+import uuid
+import wave
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, Iterable, Union
+
+logger = logging.getLogger(__name__)
+
+# Formato do PCM mantido em memória (o mesmo consumido pelo gerador de assinaturas)
+PCM_SAMPLE_RATE = 16000
+PCM_CHANNELS = 1
+PCM_SAMPLE_WIDTH = 2  # s16le
+PCM_BYTES_PER_SECOND = PCM_SAMPLE_RATE * PCM_CHANNELS * PCM_SAMPLE_WIDTH
+
+
+# Formatos de captura do ffmpeg por ciclo:
+#   mp3  - reencode libmp3lame 192k (comportamento original)
+#   pcm  - PCM s16le 16 kHz mono, o formato consumido pelo gerador de assinaturas
+#   copy - cópia do codec original sem decodificar (para segmentos apenas enviados ao failover)
+CAPTURE_FORMATS = {
+    "mp3": {
+        "codec_args": [
+            "-ac",
+            "1",
+            "-ar",
+            "44100",
+            "-b:a",
+            "192k",
+            "-acodec",
+            "libmp3lame",
+        ],
+        "container": "mp3",
+        "pipe_container": "mp3",
+        "extension": "mp3",
+    },
+    "pcm": {
+        "codec_args": [
+            "-vn",
+            "-ac",
+            str(PCM_CHANNELS),
+            "-ar",
+            str(PCM_SAMPLE_RATE),
+            "-acodec",
+            "pcm_s16le",
+        ],
+        "container": "wav",
+        # No stdout o cabeçalho WAV é gerado localmente com o tamanho correto
+        "pipe_container": "s16le",
+        "extension": "wav",
+    },
+    "copy": {
+        "codec_args": ["-vn", "-c:a", "copy"],
+        # Matroska aceita qualquer codec de áudio de origem (MP3, AAC, Opus...)
+        "container": "matroska",
+        "pipe_container": "matroska",
+        "extension": "mka",
+    },
+}
+
+
+def ffmpeg_output_args(capture_format: str, output_path: Optional[str] = None):
+    """
+    Argumentos de saída do ffmpeg para o formato de captura
+    Com output_path=None a saída vai para o stdout (pipe:1)
+    """
+    spec = CAPTURE_FORMATS[capture_format]
+    if output_path is None:
+        return [*spec["codec_args"], "-f", spec["pipe_container"], "pipe:1"]
+    return [*spec["codec_args"], "-f", spec["container"], output_path]
+
+
+def segment_from_output(
+    stream_name: str,
+    capture_format: str,
+    stdout: Optional[bytes] = None,
+    output_path: Optional[str] = None,
+) -> "CapturedSegment":
+    """Monta o CapturedSegment a partir da saída do ffmpeg"""
+    extension = CAPTURE_FORMATS[capture_format]["extension"]
+    if output_path is not None:
+        return CapturedSegment(stream_name, extension, path=output_path)
+    if capture_format == "pcm":
+        stdout = pcm_to_wav_bytes(stdout or b"")
+    return CapturedSegment(stream_name, extension, data=stdout)
+
+
+def pcm_to_wav_bytes(
+    pcm: bytes,
+    sample_rate: int = PCM_SAMPLE_RATE,
+    channels: int = PCM_CHANNELS,
+    sample_width: int = PCM_SAMPLE_WIDTH,
+) -> bytes:
+    """Envolve PCM cru em um container WAV (apenas cabeçalho, sem reencode)"""
+    output = io.BytesIO()
+    with wave.open(output, "wb") as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(sample_width)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm)
+    return output.getvalue()
+
+
+@dataclass
+class CapturedSegment:
+    """
+    Segmento de áudio capturado de um stream
+    Carrega os bytes em memória ou, no modo legado, o caminho do arquivo em disco
+    """
+
+    stream_name: str
+    extension: str  # "mp3", "wav", ...
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+    captured_at: float = field(default_factory=time.time)
+
+    @property
+    def size(self) -> int:
+        if self.data is not None:
+            return len(self.data)
+        if self.path and os.path.exists(self.path):
+            return os.path.getsize(self.path)
+        return 0
+
+    @property
+    def label(self) -> str:
+        """Identificação curta para logs"""
+        if self.path:
+            return os.path.basename(self.path)
+        return f"{self.stream_name} ({self.size} bytes em memória)"
+
+    def recognize_input(self) -> Union[bytes, str]:
+        """Entrada aceita pelo reconhecedor (bytes ou caminho)"""
+        return self.data if self.data is not None else self.path
+
+    def wav_data(self) -> Optional[bytes]:
+        """Bytes WAV do segmento (None para formatos comprimidos)"""
+        if self.extension != "wav":
+            return None
+        if self.data is not None:
+            return self.data
+        if self.path and os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                return f.read()
+        return None
+
+    def spool(self, directory: str) -> str:
+        """
+        Grava o segmento em um arquivo único e transfere a posse do arquivo
+        para o chamador (usado apenas quando um arquivo é necessário, ex.: failover)
+        """
+        os.makedirs(directory, exist_ok=True)
+        spool_path = os.path.join(
+            directory,
+            f"{self.stream_name}_{uuid.uuid4().hex[:8]}_segment.{self.extension}",
+        )
+        if self.data is not None:
+            with open(spool_path, "wb") as f:
+                f.write(self.data)
+        else:
+            os.replace(self.path, spool_path)
+            self.path = None
+        return spool_path
+
+    def discard(self):
+        """Libera o segmento (remove o arquivo se ainda pertencer ao segmento)"""
+        self.data = None
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+
+
+class PcmRingBuffer:
+    """Buffer circular de tamanho fixo para áudio PCM"""
+
+    def __init__(self, capacity_bytes: int):
+        # Manter o tamanho alinhado a amostras inteiras
+        capacity_bytes -= capacity_bytes % PCM_SAMPLE_WIDTH
+        self.capacity = max(capacity_bytes, PCM_SAMPLE_WIDTH)
+        self._buffer = bytearray(self.capacity)
+        self._write_pos = 0
+        self._filled = 0
+        self.total_written = 0
+
+    @property
+    def filled(self) -> int:
+        return self._filled
+
+    def write(self, data: bytes):
+        """Escreve dados no buffer, sobrescrevendo os mais antigos"""
+        size = len(data)
+        if size == 0:
+            return
+        self.total_written += size
+
+        if size >= self.capacity:
+            # Apenas o final dos dados cabe no buffer
+            self._buffer[:] = data[-self.capacity :]
+            self._write_pos = 0
+            self._filled = self.capacity
+            return
+
+        first = min(size, self.capacity - self._write_pos)
+        self._buffer[self._write_pos : self._write_pos + first] = data[:first]
+        remaining = size - first
+        if remaining:
+            self._buffer[:remaining] = data[first:]
+        self._write_pos = (self._write_pos + size) % self.capacity
+        self._filled = min(self._filled + size, self.capacity)
+
+    def snapshot(self, size: Optional[int] = None) -> bytes:
+        """Retorna os últimos `size` bytes em ordem cronológica"""
+        if size is None or size > self._filled:
+            size = self._filled
+        size -= size % PCM_SAMPLE_WIDTH
+        if size <= 0:
+            return b""
+
+        start = (self._write_pos - size) % self.capacity
+        if start + size <= self.capacity:
+            return bytes(self._buffer[start : start + size])
+        head = self._buffer[start:]
+        return bytes(head) + bytes(self._buffer[: size - len(head)])
+
+    def clear(self):
+        self._write_pos = 0
+        self._filled = 0
+
+
+class StreamReader:
+    """
+    Conexão de longa duração com um stream de rádio
+    Um processo ffmpeg decodifica o stream continuamente para PCM 16 kHz mono
+    e alimenta o buffer circular; reconecta com backoff exponencial em caso de falha
+    """
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        buffer_seconds: int = 20,
+        stall_timeout: float = 30.0,
+        reconnect_delay: float = 5.0,
+        max_reconnect_delay: float = 120.0,
+        chunk_size: int = 4096,
+    ):
+        self.name = name
+        self.url = url
+        self.buffer_seconds = buffer_seconds
+        self.stall_timeout = stall_timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.chunk_size = chunk_size
+        self.buffer = PcmRingBuffer(buffer_seconds * PCM_BYTES_PER_SECOND)
+        self._data_available = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._stderr_lines = collections.deque(maxlen=20)
+        self.connected = False
+        self.connected_since: Optional[float] = None
+        self.last_data_time: Optional[float] = None
+        self.reconnect_count = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def buffered_seconds(self) -> float:
+        return self.buffer.filled / PCM_BYTES_PER_SECOND
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Inicia a leitura contínua (idempotente)"""
+        if self.is_running():
+            return
+        self._task = asyncio.create_task(self._run(), name=f"reader:{self.name}")
+
+    def stop(self):
+        """Solicita o encerramento da leitura; o processo ffmpeg é finalizado no cancelamento"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    def _build_command(self):
+        return [
+            "ffmpeg",
+            "-nostdin",
+            "-loglevel",
+            "error",
+            "-threads",
+            "1",
+            "-i",
+            self.url,
+            "-vn",
+            "-ac",
+            str(PCM_CHANNELS),
+            "-ar",
+            str(PCM_SAMPLE_RATE),
+            "-f",
+            "s16le",
+            "pipe:1",
+        ]
+
+    async def _drain_stderr(self, stream):
+        """Consome o stderr do ffmpeg para não bloquear o processo"""
+        try:
+            while True:
+                line = await stream.readline()
+                if not line:
+                    break
+                self._stderr_lines.append(line.decode(errors="ignore").strip())
+        except Exception:
+            pass
+
+    async def _run(self):
+        delay = self.reconnect_delay
+        while True:
+            stderr_task = None
+            try:
+                logger.info(f"Abrindo leitor persistente para {self.name}")
+                logger.debug(
+                    f"Comando FFmpeg (leitor): {' '.join(self._build_command())}"
+                )
+                self._process = await asyncio.create_subprocess_exec(
+                    *self._build_command(),
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+                stderr_task = asyncio.create_task(
+                    self._drain_stderr(self._process.stderr)
+                )
+
+                while True:
+                    chunk = await asyncio.wait_for(
+                        self._process.stdout.read(self.chunk_size),
+                        timeout=self.stall_timeout,
+                    )
+                    if not chunk:
+                        break  # EOF: stream encerrado pelo servidor ou erro do ffmpeg
+
+                    if not self.connected:
+                        self.connected = True
+                        self.connected_since = time.time()
+                        self.last_error = None
+                        # Resetar backoff após receber dados
+                        delay = self.reconnect_delay
+                        logger.info(f"Leitor persistente conectado: {self.name}")
+
+                    self.last_data_time = time.time()
+                    async with self._data_available:
+                        self.buffer.write(chunk)
+                        self._data_available.notify_all()
+
+                stderr_text = " | ".join(self._stderr_lines) or "sem saída de erro"
+                self.last_error = f"Stream encerrado (EOF): {stderr_text}"
+            except asyncio.CancelledError:
+                logger.info(f"Leitor persistente de {self.name} encerrado")
+                raise
+            except asyncio.TimeoutError:
+                self.last_error = f"Sem dados há {self.stall_timeout}s"
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+            finally:
+                await self._terminate_process()
+                if stderr_task:
+                    stderr_task.cancel()
+                self.connected = False
+                self.connected_since = None
+                # O áudio após reconexão é descontínuo; descartar o buffer antigo
+                self.buffer.clear()
+
+            self.reconnect_count += 1
+            logger.warning(
+                f"Leitor persistente de {self.name} desconectado ({self.last_error}). "
+                f"Reconectando em {delay:.0f}s (reconexão #{self.reconnect_count})"
+            )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _terminate_process(self):
+        process = self._process
+        self._process = None
+        if process is None or process.returncode is not None:
+            return
+        try:
+            process.kill()
+        except ProcessLookupError:
+            return
+        try:
+            await asyncio.wait_for(process.wait(), timeout=5)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            pass
+
+    async def snapshot(self, duration: float, timeout: float) -> Optional[bytes]:
+        """
+        Retorna os últimos `duration` segundos de PCM do buffer
+
+        Aguarda até `timeout` segundos se o buffer ainda não tiver áudio
+        suficiente (ex.: logo após conectar). Retorna None se não houver dados.
+        """
+        self.start()
+        needed = int(min(duration, self.buffer_seconds) * PCM_BYTES_PER_SECOND)
+        try:
+            async with self._data_available:
+                await asyncio.wait_for(
+                    self._data_available.wait_for(lambda: self.buffer.filled >= needed),
+                    timeout=timeout,
+                )
+        except asyncio.TimeoutError:
+            logger.debug(
+                f"Buffer de {self.name} com {self.buffered_seconds:.1f}s após {timeout}s de espera "
+                f"(necessário {duration}s)"
+            )
+            return None
+        return self.buffer.snapshot(needed)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "connected": self.connected,
+            "buffered_seconds": round(self.buffered_seconds, 1),
+            "last_data_age": (
+                round(time.time() - self.last_data_time, 1)
+                if self.last_data_time
+                else None
+            ),
+            "reconnect_count": self.reconnect_count,
+            "last_error": self.last_error,
+        }
+
+
+class StreamReaderManager:
+    """Gerencia um leitor persistente por stream"""
+
+    def __init__(self, buffer_seconds: int = 20, stall_timeout: float = 30.0):
+        self.buffer_seconds = buffer_seconds
+        self.stall_timeout = stall_timeout
+        self.readers: Dict[str, StreamReader] = {}
+
+    def get_reader(self, name: str, url: str) -> StreamReader:
+        """Retorna o leitor do stream, criando-o (ou recriando se a URL mudou)"""
+        reader = self.readers.get(name)
+        if reader is not None and reader.url != url:
+            logger.info(f"URL do stream {name} mudou; recriando leitor persistente")
+            reader.stop()
+            reader = None
+        if reader is None:
+            reader = StreamReader(
+                name,
+                url,
+                buffer_seconds=self.buffer_seconds,
+                stall_timeout=self.stall_timeout,
+            )
+            self.readers[name] = reader
+        reader.start()
+        return reader
+
+    def sync_streams(self, active_names: Iterable[str]):
+        """Encerra leitores de streams que não estão mais atribuídos a este servidor"""
+        active = set(active_names)
+        for name in list(self.readers):
+            if name not in active:
+                self.readers.pop(name).stop()
+                logger.info(
+                    f"Leitor persistente de {name} removido (stream não atribuído)"
+                )
+
+    def stop_all(self):
+        for reader in self.readers.values():
+            reader.stop()
+        self.readers.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "readers": len(self.readers),
+            "connected": sum(1 for r in self.readers.values() if r.connected),
+            "reconnects": sum(r.reconnect_count for r in self.readers.values()),
+        }
@@ -0,0 +1,304 @@
+"""
+Pré-verificação dos streams e circuit breakers por stream
+Uma sondagem barata (primeiros bytes via HTTP) verifica todos os streams em
+paralelo; falhas consecutivas abrem o circuito do stream e as capturas ficam
+suspensas até o fim do período de espera (que dobra a cada reabertura).
+Depois dele, uma única captura real (meio-aberto) decide se o stream volta.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, Any, Callable, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+PROBE_BYTES = 1024  # Bytes lidos para considerar o stream vivo
+
+
+def _status_error(data: bytes) -> Optional[str]:
+    """Erro indicado pela linha de status ("HTTP/1.0 404", "ICY 401"), se houver"""
+    parts = data.split(b"\r\n", 1)[0].split()
+    if len(parts) >= 2 and parts[1].isdigit() and int(parts[1]) >= 400:
+        return f"{parts[0].decode(errors='replace')} {int(parts[1])}"
+    return None
+
+
+class CircuitBreaker:
+    """
+    Circuito de um stream
+    - fechado: capturas normais; `failure_threshold` falhas seguidas abrem o circuito
+    - aberto: sem capturas por `base_open` * 2^(aberturas - 1) segundos (até `max_open`)
+    - meio-aberto: uma tentativa; sucesso fecha, falha reabre com espera maior
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        base_open: float = 60.0,
+        max_open: float = 3600.0,
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_open = base_open
+        self.max_open = max_open
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.open_count = 0
+        self.retry_at = 0.0
+        self.last_error: Optional[str] = None
+
+    def retry_after(self, now: Optional[float] = None) -> float:
+        """Segundos até o circuito aceitar uma nova tentativa (0 se já aceita)"""
+        if self.state != BREAKER_OPEN:
+            return 0.0
+        return max(0.0, self.retry_at - (now or time.time()))
+
+    def try_half_open(self, now: Optional[float] = None) -> bool:
+        """Passa de aberto para meio-aberto quando o período de espera terminou"""
+        if self.state == BREAKER_OPEN and self.retry_after(now) == 0:
+            self.state = BREAKER_HALF_OPEN
+            return True
+        return False
+
+    def record_success(self) -> bool:
+        """Registra um sucesso; retorna True se o circuito estava aberto/meio-aberto"""
+        recovered = self.state != BREAKER_CLOSED
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.open_count = 0
+        self.last_error = None
+        return recovered
+
+    def record_failure(self, error: Optional[str] = None) -> bool:
+        """Registra uma falha; retorna True se o circuito abriu agora"""
+        self.failures += 1
+        self.last_error = error
+        if self.state == BREAKER_OPEN:
+            return False
+        if self.state == BREAKER_HALF_OPEN or self.failures >= self.failure_threshold:
+            self.open_count += 1
+            self.state = BREAKER_OPEN
+            self.retry_at = time.time() + min(
+                self.base_open * 2 ** (self.open_count - 1), self.max_open
+            )
+            return True
+        return False
+
+
+class StreamHealthMonitor:
+    """
+    Sondagem concorrente dos streams e um CircuitBreaker por stream
+    `on_open(key, segundos)` é chamado quando um circuito abre (ex.: adiar a
+    próxima captura no agendador)
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        base_open: float = 60.0,
+        max_open: float = 3600.0,
+        probe_timeout: float = 10.0,
+        concurrency: int = 100,
+        on_open: Optional[Callable[[str, float], None]] = None,
+    ):
+        self.failure_threshold = failure_threshold
+        self.base_open = base_open
+        self.max_open = max_open
+        self.probe_timeout = probe_timeout
+        self.concurrency = max(1, concurrency)
+        self.on_open = on_open
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.probes = 0
+        self.probe_failures = 0
+        self.last_sweep: Optional[Dict[str, Any]] = None
+
+    def breaker(self, key: str) -> CircuitBreaker:
+        breaker = self.breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                self.failure_threshold, self.base_open, self.max_open
+            )
+            self.breakers[key] = breaker
+        return breaker
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.probe_timeout),
+                headers={"User-Agent": "Mozilla/5.0"},
+            )
+        return self._session
+
+    async def _raw_probe(self, url: str) -> Optional[str]:
+        """
+        Sondagem por socket para servidores que o aiohttp rejeita (SHOUTcast v1
+        responde "ICY 200 OK"); qualquer resposta sem status de erro é vivo
+        """
+        parts = urlsplit(url)
+        secure = parts.scheme == "https"
+        path = parts.path or "/"
+        if parts.query:
+            path += f"?{parts.query}"
+        request = (
+            f"GET {path} HTTP/1.0\r\nHost: {parts.netloc}\r\n"
+            "User-Agent: Mozilla/5.0\r\nIcy-MetaData: 0\r\n\r\n"
+        )
+        reader, writer = await asyncio.open_connection(
+            parts.hostname, parts.port or (443 if secure else 80), ssl=secure or None
+        )
+        try:
+            writer.write(request.encode())
+            await writer.drain()
+            data = await reader.read(PROBE_BYTES)
+        finally:
+            writer.close()
+        if not data:
+            return "conexão sem dados"
+        return _status_error(data)
+
+    async def _http_probe(self, url: str) -> Optional[str]:
+        try:
+            async with self._get_session().get(url) as response:
+                if response.status >= 400:
+                    return f"HTTP {response.status}"
+                data = await response.content.read(PROBE_BYTES)
+                return None if data else "conexão sem dados"
+        except aiohttp.ClientResponseError:
+            # O status HTTP é verificado acima: aqui a resposta não pôde ser
+            # interpretada (linha de status ICY); ler pelo socket
+            return await self._raw_probe(url)
+
+    async def probe(self, url: str) -> Optional[str]:
+        """Lê os primeiros bytes do stream; retorna None se vivo ou o motivo da falha"""
+        self.probes += 1
+        try:
+            error = await asyncio.wait_for(
+                self._http_probe(url), timeout=self.probe_timeout
+            )
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            error = f"sem resposta em {self.probe_timeout}s"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        if error:
+            self.probe_failures += 1
+        return error
+
+    def _opened(self, key: str, breaker: CircuitBreaker):
+        delay = breaker.retry_after()
+        logger.warning(
+            f"Circuito do stream {key} aberto ({breaker.last_error}); "
+            f"capturas suspensas por {delay:.0f}s (abertura #{breaker.open_count})"
+        )
+        if self.on_open is not None:
+            try:
+                self.on_open(key, delay)
+            except Exception as e:
+                logger.error(f"Erro ao notificar abertura do circuito de {key}: {e}")
+
+    def record_success(self, key: str):
+        if self.breaker(key).record_success():
+            logger.info(f"Circuito do stream {key} fechado; capturas retomadas")
+
+    def record_failure(self, key: str, error: Optional[str] = None) -> Optional[float]:
+        """Registra uma falha (sondagem ou captura); retorna a espera se o circuito abriu"""
+        breaker = self.breaker(key)
+        if breaker.record_failure(error):
+            self._opened(key, breaker)
+            return breaker.retry_after()
+        return None
+
+    async def check(self, key: str, url: str) -> Optional[str]:
+        """Sonda o stream e registra o resultado no circuito"""
+        error = await self.probe(url)
+        if error is None:
+            self.record_success(key)
+        else:
+            self.record_failure(key, error)
+        return error
+
+    def gate(self, key: str) -> Optional[float]:
+        """
+        Decide se uma captura pode ocorrer agora
+        Retorna None para capturar ou os segundos até a próxima tentativa; no
+        meio-aberto a captura é a tentativa, e o seu resultado (record_success
+        ou record_failure) fecha ou reabre o circuito
+        """
+        breaker = self.breaker(key)
+        if breaker.state == BREAKER_OPEN and not breaker.try_half_open():
+            return breaker.retry_after()
+        return None
+
+    async def sweep(self, streams: Iterable[Tuple[str, str]]) -> Dict[str, Any]:
+        """
+        Sonda em paralelo os streams (chave, url) com circuito fechado
+        Circuitos abertos ou meio-abertos não são sondados: a volta é decidida
+        pela captura liberada por `gate`
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        started = time.monotonic()
+
+        async def _check(key: str, url: str) -> bool:
+            async with semaphore:
+                breaker = self.breaker(key)
+                if breaker.state != BREAKER_CLOSED:
+                    return True
+                error = await self.probe(url)
+                # O circuito pode ter mudado durante a sondagem (falhas de captura)
+                if breaker.state == BREAKER_CLOSED:
+                    if error is None:
+                        self.record_success(key)
+                    else:
+                        self.record_failure(key, error)
+                return error is None
+
+        pending = [(key, url) for key, url in streams]
+        results = await asyncio.gather(*(_check(key, url) for key, url in pending))
+        failed = sum(1 for ok in results if not ok)
+        self.last_sweep = {
+            "streams": len(pending),
+            "failed": failed,
+            "open": sum(1 for b in self.breakers.values() if b.state == BREAKER_OPEN),
+            "duration": round(time.monotonic() - started, 2),
+            "at": time.time(),
+        }
+        logger.info(
+            f"Pré-verificação de {len(pending)} streams em {self.last_sweep['duration']}s: "
+            f"{failed} falharam, {self.last_sweep['open']} circuitos abertos"
+        )
+        return self.last_sweep
+
+    def sync_streams(self, keys: Iterable[str]):
+        active = set(keys)
+        for key in list(self.breakers):
+            if key not in active:
+                del self.breakers[key]
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        breakers = self.breakers.values()
+        return {
+            "streams": len(self.breakers),
+            "open": sum(1 for b in breakers if b.state == BREAKER_OPEN),
+            "half_open": sum(1 for b in breakers if b.state == BREAKER_HALF_OPEN),
+            "open_streams": {
+                key: round(b.retry_after())
+                for key, b in self.breakers.items()
+                if b.state == BREAKER_OPEN
+            },
+            "probes": self.probes,
+            "probe_failures": self.probe_failures,
+            "last_sweep": self.last_sweep,
+        }
@@ -0,0 +1,256 @@
+"""
+Cache de resolução das URLs dos streams
+Segue playlists (.pls/.m3u) e redirecionamentos uma vez e guarda a URL final
+de mídia, o Content-Type, a dica de codec e os endereços resolvidos (DNS) com
+TTL, para que cada captura não refaça essas idas e voltas. Uma falha de
+captura invalida a entrada; uma falha de resolução também fica em cache (por
+um período que dobra a cada falha seguida), e a URL original é usada.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import socket
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+import aiohttp
+
+from http_capture import CONTENT_TYPE_CODECS
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST_CONTENT_TYPES = (
+    "audio/x-scpls",
+    "audio/scpls",
+    "audio/x-mpegurl",
+    "audio/mpegurl",
+    "application/x-mpegurl",
+    "application/vnd.apple.mpegurl",
+    "application/pls+xml",
+)
+PLAYLIST_EXTENSIONS = (".pls", ".m3u", ".m3u8")
+MAX_PLAYLIST_BYTES = 64 * 1024
+
+CODEC_HLS = "hls"
+# Dica de formato para o ffmpeg pular a detecção (-f antes de -i)
+FFMPEG_INPUT_FORMATS = {"mp3": "mp3", "aac": "aac", CODEC_HLS: "hls"}
+# Codecs de stream contínuo (uma única conexão), onde fixar o endereço é seguro
+PROGRESSIVE_CODECS = ("mp3", "aac")
+
+
+def parse_playlist(text: str, base_url: str) -> List[str]:
+    """URLs de uma playlist PLS ou M3U simples (na ordem em que aparecem)"""
+    urls = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith(("#", "[")):
+            continue
+        if "=" in line and line.split("=", 1)[0].lower().startswith("file"):
+            line = line.split("=", 1)[1].strip()  # PLS: FileN=url
+        elif "=" in line:
+            continue  # Outras chaves PLS (Title, Length, NumberOfEntries...)
+        urls.append(urljoin(base_url, line))
+    return [url for url in urls if url.lower().startswith(("http://", "https://"))]
+
+
+@dataclass
+class ResolvedStream:
+    """Resultado da resolução de uma URL de stream"""
+
+    url: str
+    media_url: str
+    content_type: Optional[str] = None
+    codec: Optional[str] = None
+    bitrate: Optional[int] = None  # kbps (icy-br), se informado
+    addresses: List[str] = field(default_factory=list)
+    resolved_at: float = field(default_factory=time.time)
+
+    def ffmpeg_input(self, pin_dns: bool = True) -> List[str]:
+        """
+        Argumentos de entrada do ffmpeg (-f, -headers, -i) para a URL resolvida
+        Com `pin_dns`, streams HTTP contínuos usam o endereço já resolvido e o
+        nome original vai no cabeçalho Host
+        """
+        args = []
+        input_format = FFMPEG_INPUT_FORMATS.get(self.codec)
+        if input_format:
+            args += ["-f", input_format]
+        url = self.media_url
+        parts = urlsplit(url)
+        if (
+            pin_dns
+            and self.addresses
+            and self.codec in PROGRESSIVE_CODECS
+            and parts.scheme == "http"
+            and not parts.username
+        ):
+            address = self.addresses[0]
+            host = f"[{address}]" if ":" in address else address
+            if parts.port:
+                host += f":{parts.port}"
+            args += ["-headers", f"Host: {parts.netloc}\r\n"]
+            url = urlunsplit(parts._replace(netloc=host))
+        return args + ["-i", url]
+
+
+class StreamResolver:
+    """
+    Resolve e guarda em cache a URL final de mídia de cada stream
+    `resolve` retorna None em caso de falha (o chamador usa a URL original);
+    depois de uma falha a URL não é resolvida de novo por `failure_backoff` *
+    2^(falhas - 1) segundos (até `ttl`)
+    """
+
+    def __init__(
+        self,
+        ttl: float = 3600.0,
+        max_depth: int = 3,
+        timeout: float = 15.0,
+        failure_backoff: float = 300.0,
+    ):
+        self.ttl = ttl
+        self.max_depth = max_depth
+        self.timeout = timeout
+        self.failure_backoff = failure_backoff
+        self._cache: Dict[str, ResolvedStream] = {}
+        self._failed: Dict[str, Tuple[float, int]] = {}  # url -> (retry_at, falhas)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.negative_hits = 0
+        self.invalidations = 0
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"User-Agent": "Mozilla/5.0"},
+            )
+        return self._session
+
+    async def resolve(self, url: str) -> Optional[ResolvedStream]:
+        entry = self._cache.get(url)
+        if entry is not None and time.time() - entry.resolved_at < self.ttl:
+            self.hits += 1
+            return entry
+        failed = self._failed.get(url)
+        if failed is not None and time.time() < failed[0]:
+            self.negative_hits += 1
+            return None
+        self.misses += 1
+        try:
+            entry = await self._resolve(url)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failures += 1
+            self._cache.pop(url, None)
+            count = failed[1] + 1 if failed is not None else 1
+            backoff = min(self.failure_backoff * 2 ** (count - 1), self.ttl)
+            self._failed[url] = (time.time() + backoff, count)
+            logger.warning(
+                f"Falha ao resolver a URL {url}: {type(e).__name__}: {e}. "
+                f"Usando a URL original por {backoff:.0f}s"
+            )
+            return None
+        self._failed.pop(url, None)
+        self._cache[url] = entry
+        if entry.media_url != url:
+            logger.info(f"URL {url} resolvida para {entry.media_url}")
+        return entry
+
+    def invalidate(self, url: str):
+        """Descarta a resolução de uma URL (ex.: após falha de captura)"""
+        if self._cache.pop(url, None) is not None:
+            self.invalidations += 1
+            logger.debug(f"Resolução da URL {url} invalidada")
+
+    async def _resolve(self, url: str) -> ResolvedStream:
+        current = url
+        for _ in range(self.max_depth):
+            async with self._get_session().get(current) as response:
+                response.raise_for_status()
+                media_url = str(response.url)  # Após redirecionamentos
+                content_type = (
+                    response.headers.get("Content-Type", "").split(";")[0].strip()
+                ).lower()
+                bitrate = response.headers.get("icy-br", "").split(",")[0].strip()
+                is_playlist = content_type in PLAYLIST_CONTENT_TYPES or urlsplit(
+                    media_url
+                ).path.lower().endswith(PLAYLIST_EXTENSIONS)
+                if not is_playlist:
+                    # Stream de mídia: a conexão é fechada sem ler o corpo
+                    codec = CONTENT_TYPE_CODECS.get(content_type)
+                    break
+                body = await response.content.read(MAX_PLAYLIST_BYTES)
+            text = body.decode("utf-8", errors="ignore")
+            if "#EXT-X-" in text:
+                codec = CODEC_HLS  # HLS: o ffmpeg trata a playlist
+                break
+            entries = parse_playlist(text, media_url)
+            if not entries:
+                raise ValueError("playlist sem URLs de stream")
+            current = entries[0]
+        else:
+            raise ValueError(f"mais de {self.max_depth} playlists encadeadas")
+
+        return ResolvedStream(
+            url=url,
+            media_url=media_url,
+            content_type=content_type or None,
+            codec=codec,
+            bitrate=int(bitrate) if bitrate.isdigit() else None,
+            addresses=await self._lookup(media_url),
+        )
+
+    async def _lookup(self, url: str) -> List[str]:
+        """Endereços do host da URL (IPv4 primeiro); vazio se já for um IP"""
+        parts = urlsplit(url)
+        if not parts.hostname:
+            return []
+        try:
+            ipaddress.ip_address(parts.hostname)
+            return []
+        except ValueError:
+            pass
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            parts.hostname, port, type=socket.SOCK_STREAM
+        )
+        addresses = []
+        for family, _, _, _, sockaddr in sorted(
+            infos, key=lambda info: info[0] != socket.AF_INET
+        ):
+            if sockaddr[0] not in addresses:
+                addresses.append(sockaddr[0])
+        return addresses
+
+    def sync_streams(self, urls):
+        """Remove do cache as URLs que não pertencem mais a streams ativos"""
+        active = set(urls)
+        for url in list(self._cache):
+            if url not in active:
+                del self._cache[url]
+        for url in list(self._failed):
+            if url not in active:
+                del self._failed[url]
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "failures": self.failures,
+            "failed_urls": len(self._failed),
+            "negative_hits": self.negative_hits,
+            "invalidations": self.invalidations,
+            "redirected": sum(1 for e in self._cache.values() if e.media_url != e.url),
+        }
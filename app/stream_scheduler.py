@@ -0,0 +1,235 @@
+"""
+Agendador central de capturas
+Um único heap de prazos para todos os streams despacha os streams vencidos
+para um pool limitado de workers, no lugar de uma tarefa com laço e sleep
+próprio por stream
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Ciclo de um stream: recebe (stream, estado persistente) e retorna o atraso até o próximo
+CycleHandler = Callable[[Dict[str, Any], Dict[str, Any]], Awaitable[float]]
+
+
+@dataclass
+class ScheduledStream:
+    """Stream registrado no agendador"""
+
+    key: str
+    stream: Dict[str, Any]
+    due: float
+    version: int = 0  # Invalida entradas antigas do heap (remoção preguiçosa)
+    running: bool = False
+    pending_delay: Optional[float] = None  # Reagendamento pedido durante a execução
+    state: Dict[str, Any] = field(default_factory=dict)  # Preservado entre ciclos
+
+
+class StreamScheduler:
+    """
+    Heap de (prazo, seq, chave, versão) com remoção preguiçosa
+    add/reschedule: O(log n); remove: O(1) + descarte da entrada obsoleta ao sair do heap
+    """
+
+    def __init__(
+        self,
+        handler: CycleHandler,
+        workers: int = 50,
+        error_delay: float = 60.0,
+    ):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.error_delay = error_delay
+        self._entries: Dict[str, ScheduledStream] = {}
+        self._heap: List[Tuple[float, int, str, int]] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._ready: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.dispatched = 0
+        self.errors = 0
+        self.max_lateness = 0.0
+        self._lateness_total = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def _push(self, entry: ScheduledStream):
+        entry.version += 1
+        item = (entry.due, next(self._seq), entry.key, entry.version)
+        heapq.heappush(self._heap, item)
+        if self._heap[0] is item:
+            self._wakeup.set()  # Novo prazo mais próximo: reavaliar a espera
+        # Compactar quando as entradas obsoletas dominam o heap
+        if len(self._heap) > 64 and len(self._heap) > 4 * len(self._entries):
+            self._heap = [
+                (e.due, next(self._seq), e.key, e.version)
+                for e in self._entries.values()
+                if not e.running
+            ]
+            heapq.heapify(self._heap)
+
+    def add(
+        self,
+        key: str,
+        stream: Dict[str, Any],
+        delay: float = 0.0,
+        jitter: float = 0.0,
+    ):
+        """
+        Registra um stream (ou atualiza seus dados, se já registrado)
+        `jitter` soma um atraso aleatório de até N segundos à primeira execução
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.stream = stream
+            return
+        if jitter > 0:
+            delay += random.uniform(0, jitter)
+        entry = ScheduledStream(key, stream, time.monotonic() + delay)
+        self._entries[key] = entry
+        self._push(entry)
+
+    def remove(self, key: str) -> Optional[Dict[str, Any]]:
+        """Remove um stream; um ciclo em andamento termina sem ser reagendado"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        entry.version += 1
+        return entry.stream
+
+    def reschedule(self, key: str, delay: float) -> bool:
+        """Antecipa ou adia o próximo ciclo de um stream"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        if entry.running:
+            if entry.pending_delay is None or delay < entry.pending_delay:
+                entry.pending_delay = delay
+            return True
+        entry.due = time.monotonic() + delay
+        self._push(entry)
+        return True
+
+    def get_state(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        return entry.state if entry is not None else None
+
+    def sync(
+        self,
+        streams: Iterable[Dict[str, Any]],
+        key_fn: Callable[[Dict[str, Any]], str],
+        jitter: float = 0.0,
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Sincroniza com a lista atual de streams sem recriar os existentes
+        Streams novos começam espalhados em até `jitter` segundos
+        Retorna (quantidade adicionada, streams removidos)
+        """
+        wanted = {key_fn(stream): stream for stream in streams}
+        removed = [self.remove(key) for key in list(self._entries) if key not in wanted]
+        added = 0
+        for key, stream in wanted.items():
+            if key not in self._entries:
+                added += 1
+            self.add(key, stream, jitter=jitter)
+        return added, removed
+
+    def start(self) -> List[asyncio.Task]:
+        """Inicia o despachante e os workers; retorna as tarefas criadas"""
+        if self._tasks:
+            return self._tasks
+        # Fila mínima: o despachante só retira do heap quando há worker livre
+        self._ready = asyncio.Queue(maxsize=1)
+        self._tasks = [
+            asyncio.create_task(self._dispatcher(), name="scheduler:dispatcher")
+        ] + [
+            asyncio.create_task(self._worker(worker_id), name=f"scheduler:{worker_id}")
+            for worker_id in range(1, self.workers + 1)
+        ]
+        logger.info(f"Agendador de capturas iniciado com {self.workers} workers")
+        return self._tasks
+
+    def stop(self):
+        for task in self._tasks:
+            if not task.done():
+                task.cancel()
+        self._tasks = []
+
+    async def _dispatcher(self):
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                due, _, key, version = heapq.heappop(self._heap)
+                entry = self._entries.get(key)
+                if entry is None or entry.version != version or entry.running:
+                    continue  # Entrada obsoleta (removida ou reagendada)
+                entry.running = True
+                await self._ready.put((entry, due))
+                now = time.monotonic()
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self, worker_id: int):
+        while True:
+            entry, due = await self._ready.get()
+            if self._entries.get(entry.key) is not entry:
+                entry.running = False
+                continue  # Removido enquanto aguardava um worker livre
+            lateness = max(0.0, time.monotonic() - due)
+            self.dispatched += 1
+            self._lateness_total += lateness
+            self.max_lateness = max(self.max_lateness, lateness)
+            delay = self.error_delay
+            try:
+                delay = await self.handler(entry.stream, entry.state)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.error(
+                    f"Erro no ciclo do stream {entry.key} (worker {worker_id}): {e}",
+                    exc_info=True,
+                )
+            finally:
+                entry.running = False
+
+            if self._entries.get(entry.key) is not entry:
+                continue  # Removido durante o ciclo
+            if entry.pending_delay is not None:
+                delay = min(delay, entry.pending_delay)
+                entry.pending_delay = None
+            entry.due = time.monotonic() + delay
+            self._push(entry)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "streams": len(self._entries),
+            "in_flight": sum(1 for e in self._entries.values() if e.running),
+            "workers": self.workers,
+            "heap_size": len(self._heap),
+            "dispatched": self.dispatched,
+            "errors": self.errors,
+            "avg_lateness": (
+                round(self._lateness_total / self.dispatched, 2)
+                if self.dispatched
+                else 0.0
+            ),
+            "max_lateness": round(self.max_lateness, 2),
+        }